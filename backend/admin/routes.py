@@ -1,15 +1,27 @@
 from flask import Blueprint, request, jsonify, current_app
-from shared.models import execute_query
+from shared.models import execute_query, transaction, ReviewModel
 from shared.auth import admin_token_required
+from shared.idempotency import idempotent
 from shared.file_service import file_service
 from shared.image_utils import convert_products_images, convert_product_images, convert_image_url
 from datetime import datetime, timedelta
-from cache_utils import invalidate_product_cache
+import logging
+from shared.hot_stock_service import HotStockService
+from shared.job_queue import JobQueue, job_metrics
+from shared.outbox import Outbox
+from shared.order_history_service import OrderHistoryService
+from shared.order_status_service import OrderStatusService, ORDER_STATUS_TRANSITIONS
+from shared.token_revocation import TokenRevocation
+from shared.token_verifier import token_verifier
+from shared.password_service import PasswordService, PasswordServiceBusy
+from shared.session_store import SessionStore
+from shared.rate_limits import RateLimitMonitor
 admin_bp = Blueprint('admin', __name__)
+logger = logging.getLogger(__name__)
 
 @admin_bp.route('/auth/login', methods=['POST'])
 def admin_login():
-    from shared.utils import generate_token, hash_password, verify_password
+    from shared.utils import generate_token
     
     data = request.get_json()
     username = data.get('username', '').strip()
@@ -28,8 +40,11 @@ def admin_login():
         return jsonify({'error': 'Invalid credentials'}), 401
     
     # Handle password verification with error handling for hash type issues
+    new_hash = None
     try:
-        password_valid = verify_password(password, admin['password_hash'])
+        password_valid, new_hash = PasswordService.verify(admin['password_hash'], password)
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
         current_app.logger.error(f"Password verification error: {e}")
         # If hash verification fails due to incompatible format, check for plain text match (temporary fix)
@@ -38,6 +53,12 @@ def admin_login():
     if not password_valid:
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    if new_hash:
+        execute_query("""
+            UPDATE admin_users SET password_hash = %s
+            WHERE admin_id = %s AND password_hash = %s
+        """, (new_hash, admin['admin_id'], admin['password_hash']))
+    
     token = generate_token(admin['admin_id'], 'admin')
     
     return jsonify({
@@ -126,17 +147,6 @@ def get_dashboard_stats(admin_id):
         LIMIT 5
     """, fetch_all=True)
     
-    # Format recent orders
-    formatted_recent_orders = []
-    for order in recent_orders:
-        formatted_recent_orders.append({
-            'order_id': order['order_id'],
-            'total': float(order['total']),
-            'status': order['status'],
-            'customer_name': order['customer_name'],
-            'created_at': order['created_at'].strftime('%Y-%m-%d %H:%M:%S') if order['created_at'] else ''
-        })
-    
     # Return data in the format expected by frontend
     return jsonify({
         'stats': {
@@ -154,17 +164,17 @@ def get_dashboard_stats(admin_id):
                 'total_orders': total_orders['count'] if total_orders else 0,
                 'orders_this_week': orders_week['count'] if orders_week else 0,
                 'pending_orders': pending_orders['count'] if pending_orders else 0,
-                'total_revenue': float(total_revenue['revenue']) if total_revenue else 0.0,
-                'revenue_this_month': float(revenue_month['revenue']) if revenue_month else 0.0
+                'total_revenue': total_revenue['revenue'] if total_revenue else 0,
+                'revenue_this_month': revenue_month['revenue'] if revenue_month else 0
             },
             'referrals': {
                 'total_codes': referral_stats['total_codes'] if referral_stats else 0,
                 'total_uses': referral_stats['total_uses'] if referral_stats else 0,
                 'successful_referrals': referral_stats['successful_referrals'] if referral_stats else 0,
-                'total_rewards_paid': float(referral_stats['total_rewards_paid']) if referral_stats else 0.0
+                'total_rewards_paid': (referral_stats['total_rewards_paid'] or 0) if referral_stats else 0
             }
         },
-        'recent_orders': formatted_recent_orders
+        'recent_orders': recent_orders
     }), 200
 
 @admin_bp.route('/products', methods=['GET'])
@@ -334,20 +344,28 @@ def update_product(admin_id, product_id):
     params.append(datetime.now())
     params.append(product_id)
     
-    query = f"UPDATE products SET {', '.join(update_fields)} WHERE product_id = %s"
-    execute_query(query, params)
+    stock_quantity = data.get('stock_quantity')
+    is_hot = stock_quantity is not None and product_id in HotStockService.get_hot_products()
+    if is_hot:
+        # Write queued sales first so the new figure is not decremented twice
+        HotStockService.flush()
     
-    # Update inventory if stock_quantity is provided
-    stock_quantity = None
-    if 'stock_quantity' in data:
-        stock_quantity = data['stock_quantity']
-        execute_query("""
-            UPDATE inventory SET quantity = %s 
-            WHERE product_id = %s
-        """, (stock_quantity, product_id))
+    with transaction() as tx:
+        tx.execute(f"UPDATE products SET {', '.join(update_fields)} WHERE product_id = %s", params)
+        
+        # Update inventory if stock_quantity is provided
+        if stock_quantity is not None:
+            tx.execute("""
+                UPDATE inventory SET quantity = %s 
+                WHERE product_id = %s
+            """, (stock_quantity, product_id))
+        
+        # The relay clears the product caches and broadcasts the new stock
+        Outbox.add(tx, 'product_updated', {'product_id': product_id, 'quantity': stock_quantity})
     
-    # FIXED: Pass stock_quantity for WebSocket broadcast
-    invalidate_product_cache(product_id, stock_quantity)
+    if is_hot:
+        HotStockService.sync()
+    Outbox.notify()
     
     return jsonify({'message': 'Product updated successfully'}), 200
 
@@ -517,7 +535,7 @@ def delete_category(admin_id, category_id):
     # Get force parameter from query string
     force = request.args.get('force', 'false').lower() == 'true'
     
-    print(f"Delete category request: category_id={category_id}, force={force}, admin_id={admin_id}")
+    logger.info(f"Delete category request: category_id={category_id}, force={force}, admin_id={admin_id}")
     
     # Validate category exists
     existing_category = execute_query("""
@@ -533,7 +551,7 @@ def delete_category(admin_id, category_id):
         WHERE category_id = %s AND status != 'inactive'
     """, (category_id,), fetch_one=True)
     
-    print(f"Category {category_id} has {product_count['count']} products")
+    logger.info(f"Category {category_id} has {product_count['count']} products")
     
     if product_count['count'] > 0:
         if not force:
@@ -544,7 +562,7 @@ def delete_category(admin_id, category_id):
             }), 400
         else:
             # Force delete - MAKE PRODUCTS INACTIVE INSTEAD OF MOVING TO UNCATEGORIZED
-            print(f"Force deleting category {category_id} with {product_count['count']} products")
+            logger.info(f"Force deleting category {category_id} with {product_count['count']} products")
             
             # Set all products in this category to inactive status
             try:
@@ -554,7 +572,7 @@ def delete_category(admin_id, category_id):
                     WHERE category_id = %s AND status != 'inactive'
                 """, (datetime.now(), category_id))
                 
-                print(f"Set {product_count['count']} products to inactive status")
+                logger.info(f"Set {product_count['count']} products to inactive status")
                 
                 # Clean up related data for inactive products
                 inactive_products = execute_query("""
@@ -568,10 +586,10 @@ def delete_category(admin_id, category_id):
                     execute_query("DELETE FROM cart WHERE product_id = %s", (product_id,))
                     execute_query("DELETE FROM wishlist WHERE product_id = %s", (product_id,))
                 
-                print(f"Cleaned up cart and wishlist entries for inactive products")
+                logger.info(f"Cleaned up cart and wishlist entries for inactive products")
                 
             except Exception as e:
-                print(f"Error setting products inactive: {e}")
+                logger.error(f"Error setting products inactive: {e}")
                 return jsonify({'error': 'Failed to update products status'}), 500
     
     # Now delete the category (change status to inactive)
@@ -582,10 +600,10 @@ def delete_category(admin_id, category_id):
             WHERE category_id = %s
         """, (datetime.now(), category_id))
         
-        print(f"Successfully deleted category {category_id}")
+        logger.info(f"Successfully deleted category {category_id}")
         
     except Exception as e:
-        print(f"Error deleting category: {e}")
+        logger.error(f"Error deleting category: {e}")
         return jsonify({'error': 'Failed to delete category'}), 500
     
     # Clear cache
@@ -750,13 +768,90 @@ def update_order_status(admin_id, order_id):
     if new_status not in valid_statuses:
         return jsonify({'error': 'Invalid status'}), 400
     
+    order = execute_query("""
+        SELECT user_id FROM orders WHERE order_id = %s
+    """, (order_id,), fetch_one=True)
+    
     execute_query("""
         UPDATE orders SET status = %s, updated_at = %s 
         WHERE order_id = %s
     """, (new_status, datetime.now(), order_id))
     
+    if order:
+        OrderHistoryService.invalidate(order['user_id'])
+    
     return jsonify({'message': 'Order status updated successfully'}), 200
 
+@admin_bp.route('/orders/status', methods=['PUT'])
+@admin_token_required
+@idempotent
+def bulk_update_order_status(admin_id):
+    """Move many orders to one status; invalid moves are skipped and reported"""
+    data = request.get_json() or {}
+    order_ids = data.get('order_ids')
+    new_status = data.get('status')
+    
+    if new_status not in ORDER_STATUS_TRANSITIONS:
+        return jsonify({'error': 'Invalid status'}), 400
+    
+    if not isinstance(order_ids, list) or not order_ids:
+        return jsonify({'error': 'order_ids must be a non-empty list'}), 400
+    
+    max_bulk = current_app.config.get('ORDER_STATUS_MAX_BULK', 5000)
+    if len(order_ids) > max_bulk:
+        return jsonify({'error': f'At most {max_bulk} orders can be updated at once'}), 400
+    
+    order_ids = [str(order_id) for order_id in order_ids]
+    note = (data.get('note') or '').strip()[:255] or None
+    
+    result = OrderStatusService.bulk_update(
+        admin_id, order_ids, new_status, note,
+        notify=data.get('notify_customers', True)
+    )
+    
+    return jsonify({
+        'message': f"{len(result['updated'])} orders updated, {len(result['skipped'])} skipped",
+        **result
+    }), 200
+
+@admin_bp.route('/reviews/<int:review_id>/status', methods=['PUT'])
+@admin_token_required
+def update_review_status(admin_id, review_id):
+    """Approve, hide or reject a review and keep the rating summary in step"""
+    data = request.get_json() or {}
+    new_status = data.get('status', '').strip().lower()
+    
+    if new_status not in ['approved', 'pending', 'rejected']:
+        return jsonify({'error': 'Invalid status. Must be approved, pending, or rejected'}), 400
+    
+    with transaction() as tx:
+        review = tx.execute("""
+            SELECT review_id, product_id, rating, status FROM reviews 
+            WHERE review_id = %s
+            FOR UPDATE
+        """, (review_id,), fetch_one=True)
+        
+        if not review:
+            return jsonify({'error': 'Review not found'}), 404
+        
+        if review['status'] != new_status:
+            tx.execute("""
+                UPDATE reviews SET status = %s WHERE review_id = %s
+            """, (new_status, review_id))
+            
+            was_approved = review['status'] == 'approved'
+            is_approved = new_status == 'approved'
+            if was_approved != is_approved:
+                ReviewModel.apply_rating_change(
+                    tx, review['product_id'], review['rating'], 1 if is_approved else -1
+                )
+            
+            Outbox.add(tx, 'review_changed', {'product_id': review['product_id'], 'review_id': review_id})
+    
+    Outbox.notify()
+    
+    return jsonify({'message': f'Review status updated to {new_status}'}), 200
+
 @admin_bp.route('/analytics/sales', methods=['GET'])
 @admin_token_required
 def get_sales_analytics(admin_id):
@@ -797,6 +892,78 @@ def get_sales_analytics(admin_id):
         'period': period
     }), 200
 
+@admin_bp.route('/hot-stock', methods=['GET'])
+@admin_token_required
+def get_hot_stock(admin_id):
+    return jsonify({
+        'enabled': HotStockService.is_enabled(),
+        'products': HotStockService.get_status()
+    }), 200
+
+@admin_bp.route('/products/<int:product_id>/hot-stock', methods=['PUT'])
+@admin_token_required
+def set_hot_stock(admin_id, product_id):
+    if not HotStockService.is_enabled():
+        return jsonify({'error': 'Hot stock mode is disabled'}), 400
+    
+    data = request.get_json() or {}
+    if data.get('enabled', True):
+        stock = HotStockService.enable(product_id)
+        if stock is None:
+            return jsonify({'error': 'Product has no inventory row'}), 404
+        return jsonify({'message': 'Product stock moved to Redis', 'stock_quantity': stock}), 200
+    
+    HotStockService.disable(product_id)
+    return jsonify({'message': 'Product stock moved back to MySQL'}), 200
+
+@admin_bp.route('/hot-stock/reconcile', methods=['POST'])
+@admin_token_required
+def reconcile_hot_stock(admin_id):
+    drifts = HotStockService.sync()
+    return jsonify({
+        'message': 'Hot stock reconciled',
+        'drift': {str(product_id): drift for product_id, drift in drifts.items()}
+    }), 200
+
+@admin_bp.route('/jobs', methods=['GET'])
+@admin_token_required
+def get_job_stats(admin_id):
+    return jsonify({
+        'queue': JobQueue.get_queue_stats(),
+        'outbox': Outbox.get_backlog(),
+        'metrics': job_metrics.snapshot(),
+        'dead_jobs': JobQueue.get_dead_jobs()
+    }), 200
+
+@admin_bp.route('/jobs/<int:job_id>/retry', methods=['POST'])
+@admin_token_required
+def retry_job(admin_id, job_id):
+    if not JobQueue.retry_dead(job_id):
+        return jsonify({'error': 'Job not found in dead letters'}), 404
+    JobQueue.notify()
+    return jsonify({'message': 'Job queued for retry'}), 200
+
+@admin_bp.route('/auth/tokens', methods=['GET'])
+@admin_token_required
+def get_token_stats(admin_id):
+    return jsonify({'verifier': token_verifier.get_stats()}), 200
+
+@admin_bp.route('/auth/tokens/revoke', methods=['POST'])
+@admin_token_required
+def revoke_all_tokens(admin_id):
+    """Sign everyone out (including this admin), e.g. after a leaked token"""
+    revoked_before = token_verifier.revoke_all()
+    return jsonify({
+        'message': 'All existing tokens revoked',
+        'revoked_before': revoked_before
+    }), 200
+
+@admin_bp.route('/rate-limits', methods=['GET'])
+@admin_token_required
+def get_rate_limit_status(admin_id):
+    """Limiter health, breach counts and, with ?key=<client IP>, that client's budget"""
+    return jsonify(RateLimitMonitor.get_status(request.args.get('key'))), 200
+
 @admin_bp.route('/cache/clear', methods=['POST'])
 @admin_token_required
 def clear_cache(admin_id):
@@ -893,7 +1060,7 @@ def get_all_referrals(admin_id):
             'referred_name': f"{ref['referred_name']} {ref['referred_last_name']}",
             'referred_email': ref['referred_email'],
             'code': ref['code'],
-            'date': ref['date'].strftime('%Y-%m-%d') if ref['date'] else '',
+            'date': ref['date'],
             'status': ref['status'],
             'reward': ref['reward']
         })
@@ -920,6 +1087,7 @@ def get_all_referrals(admin_id):
 
 @admin_bp.route('/referrals/<int:referral_id>/status', methods=['PUT'])
 @admin_token_required
+@idempotent
 def update_referral_status(admin_id, referral_id):
     """Update referral status (approve/reject)"""
     data = request.get_json()
@@ -942,6 +1110,8 @@ def update_referral_status(admin_id, referral_id):
         SET status = %s, updated_at = NOW()
         WHERE user_id = %s AND referred_by IS NOT NULL
     """, (db_status, referral_id))
+    if db_status != 'active':
+        TokenRevocation.revoke_user(referral_id)
     
     # If approved, add wallet bonus
     if new_status == 'approved':
@@ -951,11 +1121,13 @@ def update_referral_status(admin_id, referral_id):
         """, (referral_id,), fetch_one=True)
         
         if referrer:
-            execute_query("""
+            credited = execute_query("""
                 UPDATE wallet 
                 SET balance = balance + 50, updated_at = NOW()
                 WHERE user_id = %s
             """, (referrer['referred_by'],))
+            if credited:
+                SessionStore.invalidate(referrer['referred_by'])
             
             # Log the transaction
             execute_query("""
@@ -986,5 +1158,5 @@ def get_referral_stats(admin_id):
         'approved_referrals': stats['approved_referrals'] or 0,
         'rejected_referrals': stats['rejected_referrals'] or 0, 
         'pending_referrals': stats['pending_referrals'] or 0,
-        'total_rewards_paid': float(stats['total_rewards_paid'] or 0)
+        'total_rewards_paid': stats['total_rewards_paid'] or 0
     }), 200
\ No newline at end of file
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: encoding a large product page
+
+Compares the old path (a float()/strftime() pass over every row, then
+Flask's default JSON provider) with OrjsonProvider encoding the rows as they
+come from MySQL, Decimal and datetime included:
+    python benchmark_json_encoding.py [products] [iterations]
+"""
+
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from shared.json_provider import OrjsonProvider
+
+def make_rows(count):
+    created = datetime(2025, 1, 1, 9, 30)
+    return [{
+        'product_id': i,
+        'product_name': f"Organic Green Tea {i}",
+        'price': Decimal('499.00') + i,
+        'discount_price': Decimal('449.50') + i,
+        'brand': 'WellnessNest',
+        'category_name': 'Beverages',
+        'primary_image': f"http://localhost:5000/static/uploads/products/{i}.jpg",
+        'stock_quantity': i % 50,
+        'avg_rating': Decimal('4.3'),
+        'total_reviews': i % 120,
+        'created_at': created + timedelta(minutes=i)
+    } for i in range(count)]
+
+def convert_rows(rows):
+    """What the routes did before handing rows to jsonify"""
+    converted = []
+    for row in rows:
+        row = dict(row)
+        row['price'] = float(row['price'])
+        row['discount_price'] = float(row['discount_price'])
+        row['savings'] = round(row['price'] - row['discount_price'], 2)
+        row['avg_rating'] = round(float(row['avg_rating']), 1)
+        row['created_at'] = row['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+        converted.append(row)
+    return converted
+
+def time_per_call(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1000
+
+def run_benchmark(products, iterations):
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    orjson_provider = OrjsonProvider(app)
+    rows = make_rows(products)
+
+    def before():
+        return default_provider.dumps({'products': convert_rows(rows)})
+
+    def after():
+        page = []
+        for row in rows:
+            row = dict(row)
+            row['savings'] = row['price'] - row['discount_price']
+            page.append(row)
+        return orjson_provider.dumps({'products': page})
+
+    old = time_per_call(before, iterations)
+    new = time_per_call(after, iterations)
+    print(f"Products per page: {products}, iterations: {iterations}")
+    print(f"float()/strftime() + default provider: {old:8.2f} ms")
+    print(f"OrjsonProvider on raw rows:            {new:8.2f} ms")
+    print(f"Speed-up:                              {old / new:8.1f}x")
+
+if __name__ == "__main__":
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run_benchmark(products, iterations)
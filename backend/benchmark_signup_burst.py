@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: burst signups and login credential lookups against the database
+
+Fires a burst of concurrent signups, a share of them for emails already in
+the burst, first the old way (look the email up, then insert) and then with
+UserModel.create (insert, the unique email key rejects duplicates). The old
+way lets two racing signups both pass the lookup; the loser then fails with
+a duplicate-key error instead of a clean "already registered". Afterwards it
+times the login lookup: SELECT * (get_by_email) against get_credentials.
+    python benchmark_signup_burst.py [signups] [threads] [duplicate_ratio]
+
+Needs migration 014 and the DB_* settings; rows are removed at the end.
+"""
+
+import sys
+import os
+import time
+import uuid
+import random
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import mysql.connector
+from shared.models import execute_query, UserModel
+
+EMAIL_DOMAIN = 'benchmark.invalid'
+# Hashing is not what is measured here; every signup reuses one hash
+PASSWORD_HASH = 'scrypt:32768:8:1$benchmark$' + '0' * 128
+
+def burst_emails(run, signups, duplicate_ratio):
+    unique = max(int(signups * (1 - duplicate_ratio)), 1)
+    emails = [f"burst-{run}-{i}@{EMAIL_DOMAIN}" for i in range(unique)]
+    emails += [random.choice(emails) for _ in range(signups - unique)]
+    random.shuffle(emails)
+    return emails
+
+def signup_lookup_first(email):
+    if execute_query("SELECT user_id FROM users WHERE email = %s", (email,), fetch_one=True):
+        return 'duplicate'
+    try:
+        execute_query("""
+            INSERT INTO users (user_id, email, password_hash, first_name, last_name, phone, created_at)
+            VALUES (%s, %s, %s, 'Burst', 'Signup', '9000000000', NOW())
+        """, (str(uuid.uuid4()), email, PASSWORD_HASH))
+        return 'created'
+    except mysql.connector.IntegrityError:
+        return 'race error'
+
+def signup_insert(email):
+    user_id = UserModel.create(email, PASSWORD_HASH, 'Burst', 'Signup', '9000000000')
+    return 'created' if user_id else 'duplicate'
+
+def run_burst(label, signup, emails, threads):
+    def timed(email):
+        started = time.perf_counter()
+        outcome = signup(email)
+        return outcome, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(timed, emails))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    print(f"{label}")
+    print(f"  throughput:   {len(emails) / elapsed:8.0f} signups/s")
+    print(f"  p50 / p95:    {latencies[len(latencies) // 2] * 1000:8.2f} / "
+          f"{latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms")
+    print(f"  outcomes:     {outcomes}")
+
+def time_lookup(label, lookup, emails):
+    started = time.perf_counter()
+    for email in emails:
+        lookup(email)
+    print(f"{label}: {(time.perf_counter() - started) / len(emails) * 1000:8.3f} ms per login lookup")
+
+def cleanup():
+    removed = execute_query("DELETE FROM users WHERE email LIKE %s", (f"burst-%@{EMAIL_DOMAIN}",))
+    print(f"Removed {removed} benchmark users")
+
+if __name__ == "__main__":
+    signups = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    duplicate_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+
+    print(f"Signups: {signups}, threads: {threads}, duplicates: {duplicate_ratio:.0%}")
+    try:
+        run_burst("Lookup, then insert", signup_lookup_first,
+                  burst_emails('lookup', signups, duplicate_ratio), threads)
+        run_burst("Insert on unique key", signup_insert,
+                  burst_emails('insert', signups, duplicate_ratio), threads)
+
+        emails = [f"burst-insert-{i}@{EMAIL_DOMAIN}" for i in range(min(signups, 1000))]
+        time_lookup("get_by_email (SELECT *)", UserModel.get_by_email, emails)
+        time_lookup("get_credentials        ", UserModel.get_credentials, emails)
+    finally:
+        cleanup()
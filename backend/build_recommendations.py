@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Rebuild the related-products and frequently-bought-together tables
+
+Meant to run periodically (e.g. nightly from cron):
+    python build_recommendations.py
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import create_app
+from shared.recommendation_service import RecommendationService
+from shared.cache_service import CacheService
+
+def build_recommendations():
+    app = create_app()
+    with app.app_context():
+        print("Building product recommendations...")
+        start_time = time.time()
+        
+        stored = RecommendationService.rebuild(
+            lookback_days=app.config.get('RECOMMENDATIONS_LOOKBACK_DAYS', 365),
+            top_k=app.config.get('RECOMMENDATIONS_TOP_K', 8)
+        )
+        
+        # Served lists are cached per product; drop them so the new ones show up
+        cleared = CacheService.invalidate_pattern('user_product_related_')
+        
+        print(f"SUCCESS Stored {stored} recommendations in {time.time() - start_time:.2f}s")
+        print(f"   Cleared {cleared} cached recommendation lists")
+
+if __name__ == "__main__":
+    try:
+        build_recommendations()
+    except Exception as e:
+        print(f"ERROR building recommendations: {e}")
+        sys.exit(1)
@@ -1,4 +1,7 @@
 from flask import current_app
+import logging
+
+logger = logging.getLogger(__name__)
 
 def invalidate_product_cache(product_id, stock_quantity=None):
     """Clear cache AND broadcast WebSocket update"""
@@ -8,9 +11,11 @@ def invalidate_product_cache(product_id, stock_quantity=None):
         # Clear specific product caches
         keys_to_clear = [
             f'user_product_detail_{product_id}',
+            f'user_product_tile_{product_id}',
             'user_featured_products',
             'user_products',
-            'user_categories'
+            'user_categories',
+            'user_category_top_sellers'
         ]
         
         cleared_count = 0
@@ -18,7 +23,9 @@ def invalidate_product_cache(product_id, stock_quantity=None):
             if cache.delete(key):
                 cleared_count += 1
         
-        print(f"✅ Cache cleared for product {product_id}: {cleared_count} keys removed")
+        bump_home_section_versions('featured', 'categories', 'top_sellers')
+        
+        logger.debug(f"Cache cleared for product {product_id}: {cleared_count} keys removed")
         
         # BROADCAST WEBSOCKET UPDATE for stock changes
         if hasattr(current_app, 'websocket_manager') and stock_quantity is not None:
@@ -26,14 +33,49 @@ def invalidate_product_cache(product_id, stock_quantity=None):
                 product_id, 
                 {'quantity': stock_quantity, 'product_id': product_id}
             )
-            print(f"📡 WebSocket stock broadcast sent for product {product_id}: {stock_quantity} units")
+            logger.debug(f"WebSocket stock broadcast sent for product {product_id}: {stock_quantity} units",
+                         extra={'sampled': True})
         
         return cleared_count
         
     except Exception as e:
-        print(f"❌ Cache invalidation error: {str(e)}")
+        logger.error(f"Cache invalidation error: {str(e)}")
         return 0
 
+def invalidate_products_cache(stock_by_product, product_ids=()):
+    """
+    Batched form of invalidate_product_cache for many products at once
+
+    Shared listing keys and /home versions are cleared once for the whole
+    batch; stock is broadcast for products in stock_by_product. Errors are
+    raised, not swallowed, so the outbox relay can retry the batch.
+    """
+    cache = current_app.cache
+    product_ids = set(product_ids) | set(stock_by_product)
+    if not product_ids:
+        return 0
+    
+    keys_to_clear = [f'user_product_detail_{product_id}' for product_id in sorted(product_ids)]
+    keys_to_clear += [f'user_product_tile_{product_id}' for product_id in sorted(product_ids)]
+    keys_to_clear += [
+        'user_featured_products',
+        'user_products',
+        'user_categories',
+        'user_category_top_sellers'
+    ]
+    cache.delete_many(*keys_to_clear)
+    bump_home_section_versions('featured', 'categories', 'top_sellers')
+    
+    if hasattr(current_app, 'websocket_manager'):
+        for product_id, quantity in stock_by_product.items():
+            current_app.websocket_manager.broadcast_stock_update(
+                product_id,
+                {'quantity': quantity, 'product_id': product_id}
+            )
+    
+    logger.debug(f"Cache cleared for {len(product_ids)} products")
+    return len(product_ids)
+
 def invalidate_review_cache(product_id):
     """Clear cache for review updates"""
     try:
@@ -49,9 +91,26 @@ def invalidate_review_cache(product_id):
             if cache.delete(key):
                 cleared_count += 1
         
-        print(f"✅ Review cache cleared for product {product_id}: {cleared_count} keys")
+        logger.debug(f"Review cache cleared for product {product_id}: {cleared_count} keys")
         return cleared_count
         
     except Exception as e:
-        print(f"❌ Review cache invalidation error: {str(e)}")
-        return 0
\ No newline at end of file
+        logger.error(f"Review cache invalidation error: {str(e)}")
+        return 0
+
+def get_home_section_versions(sections):
+    """Current version of each /home section (0 until first invalidated)"""
+    sections = list(sections)
+    values = current_app.cache.get_many(*[f'home_section_version_{name}' for name in sections])
+    return {name: int(value or 0) for name, value in zip(sections, values)}
+
+def bump_home_section_versions(*sections):
+    """Mark /home sections stale; only those sections get rebuilt on the next request"""
+    try:
+        cache = current_app.cache
+        for name in sections:
+            key = f'home_section_version_{name}'
+            if cache.inc(key) is None:
+                cache.set(key, 1, timeout=0)
+    except Exception as e:
+        logger.error(f"Home section version bump error: {str(e)}")
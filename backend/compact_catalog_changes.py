@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Compact catalog_change_log
+
+Delta sync only needs the latest change per product, so older rows for the
+same product can go. Safe to run at any time, e.g. daily from cron:
+    python compact_catalog_changes.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import create_app
+from shared.catalog_sync_service import CatalogSyncService
+
+def compact_catalog_changes():
+    app = create_app()
+    with app.app_context():
+        print("Compacting catalog change log...")
+        removed = CatalogSyncService.compact()
+        print(f"SUCCESS Removed {removed} superseded change rows")
+
+if __name__ == "__main__":
+    try:
+        compact_catalog_changes()
+    except Exception as e:
+        print(f"ERROR compacting catalog changes: {e}")
+        sys.exit(1)
@@ -43,6 +43,21 @@ class Config:
     CACHE_DEFAULT_TIMEOUT = 300
     CACHE_KEY_PREFIX = 'ecommerce_v2_'
     
+    # Rate limits shared by all workers (shared/rate_limits.py)
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', CACHE_REDIS_URL)
+    RATELIMIT_STRATEGY = 'sliding-window-counter'
+    RATELIMIT_DEFAULT = '1000 per hour;100 per minute'
+    RATELIMIT_HEADERS_ENABLED = True
+    RATELIMIT_SWALLOW_ERRORS = True
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True
+    RATELIMIT_WEIGHTED_BUDGET = '300 per minute'
+    RATELIMIT_COSTS = {
+        'listing': 1,
+        'search': 5,
+        'create_order': 10,
+        'login': 10
+    }
+    
     CACHE_TIMEOUT_HEALTH = 60
     CACHE_TIMEOUT_PRODUCTS = 120
     CACHE_TIMEOUT_CATEGORIES = 600
@@ -50,6 +65,95 @@ class Config:
     CACHE_TIMEOUT_PRODUCT_DETAIL = 180
     CACHE_TIMEOUT_USER_SESSION = 1800
     
+    # Email verification / password reset links (shared/auth_tokens.py)
+    EMAIL_VERIFICATION_TOKEN_TTL = 24 * 3600
+    PASSWORD_RESET_TOKEN_TTL = 2 * 3600
+    
+    # Active user/admin lookups in the token decorators (shared/principal_cache.py)
+    PRINCIPAL_CACHE_TTL = 60
+    PRINCIPAL_LOCAL_TTL = 5
+    PRINCIPAL_LOCAL_MAX_ENTRIES = 10000
+    
+    # Verified JWTs kept per process (shared/token_verifier.py)
+    JWT_VERIFY_CACHE_SIZE = 10000
+    JWT_REVOCATION_REFRESH_SECONDS = 2
+    
+    # Revoked tokens and users (shared/token_revocation.py)
+    JWT_MAX_LIFETIME_HOURS = 24 * 7
+    TOKEN_REVOCATION_LISTENER_ENABLED = os.environ.get('TOKEN_REVOCATION_LISTENER_ENABLED', 'true').lower() == 'true'
+    TOKEN_REVOCATION_REBUILD_INTERVAL = 300
+    TOKEN_REVOCATION_BLOOM_BITS = 1 << 20
+    TOKEN_REVOCATION_BLOOM_HASHES = 3
+    
+    # Password hashing pool (shared/password_service.py)
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_PENDING = 16
+    PASSWORD_HASH_QUEUE_TIMEOUT = 2
+    PASSWORD_HASH_TIMEOUT = 10
+    
+    # Reviews embedded in product detail; later pages come from /products/<id>/reviews
+    REVIEWS_PAGE_SIZE = 10
+    REVIEWS_MAX_PAGE_SIZE = 50
+    
+    # Recommendations (rebuilt offline by build_recommendations.py)
+    CACHE_TIMEOUT_RELATED = 600
+    RECOMMENDATIONS_TOP_K = 8
+    RECOMMENDATIONS_LOOKBACK_DAYS = 365
+    
+    # Home page aggregate (/api/user/home)
+    CACHE_TIMEOUT_HOME = 900
+    HOME_TOP_SELLERS_PER_CATEGORY = 4
+    HOME_TOP_SELLERS_DAYS = 90
+    
+    # Delta catalog sync for the mobile app (/api/user/catalog/changes)
+    CATALOG_SYNC_BATCH_SIZE = 200
+    CATALOG_SYNC_MAX_BATCH_SIZE = 1000
+    CATALOG_SYNC_SETTLE_SECONDS = 5
+    
+    # Order history pages (/api/user/orders/history)
+    CACHE_TIMEOUT_ORDER_HISTORY = 600
+    ORDER_HISTORY_PAGE_SIZE = 10
+    ORDER_HISTORY_MAX_PAGE_SIZE = 50
+    
+    # Bulk order status changes (/api/admin/orders/status)
+    ORDER_STATUS_CHUNK_SIZE = 500
+    ORDER_STATUS_MAX_BULK = 5000
+    
+    # Checkout stock holds (/api/user/cart/hold), released by the hold sweeper
+    CART_HOLD_TTL_SECONDS = 900
+    INVENTORY_HOLD_SWEEP_INTERVAL = 30
+    INVENTORY_HOLD_SWEEP_BATCH_SIZE = 500
+    INVENTORY_HOLD_SWEEPER_ENABLED = os.environ.get('INVENTORY_HOLD_SWEEPER_ENABLED', 'true').lower() == 'true'
+    
+    # Flash-sale mode: flagged products keep stock in Redis, written behind to MySQL
+    HOT_STOCK_ENABLED = os.environ.get('HOT_STOCK_ENABLED', 'false').lower() == 'true'
+    HOT_STOCK_FLUSH_INTERVAL = 2
+    HOT_STOCK_RECONCILE_INTERVAL = 30
+    
+    # Background jobs (background_jobs table, shared/job_queue.py)
+    JOB_WORKERS_ENABLED = os.environ.get('JOB_WORKERS_ENABLED', 'true').lower() == 'true'
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+    JOB_POLL_INTERVAL = 1.0
+    JOB_VISIBILITY_TIMEOUT = 300
+    JOB_KEEP_DAYS = 7
+    
+    # Outbox relay (outbox table, shared/outbox.py)
+    OUTBOX_RELAY_ENABLED = os.environ.get('OUTBOX_RELAY_ENABLED', 'true').lower() == 'true'
+    OUTBOX_RELAY_INTERVAL = 1.0
+    OUTBOX_BATCH_SIZE = 100
+    
+    # Idempotency-Key replay for retried POSTs (shared/idempotency.py)
+    IDEMPOTENCY_TTL_SECONDS = 86400
+    IDEMPOTENCY_LOCK_SECONDS = 60
+    IDEMPOTENCY_WAIT_SECONDS = 10
+    
+    # Carts live in Redis hashes and are written back to the cart table
+    CART_REDIS_TTL = 30 * 24 * 3600
+    CART_PERSIST_ENABLED = os.environ.get('CART_PERSIST_ENABLED', 'true').lower() == 'true'
+    CART_PERSIST_INTERVAL = 5
+    CART_PERSIST_BATCH_SIZE = 200
+    
     # Email configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', '587'))
@@ -79,6 +183,18 @@ class Config:
     
     CORS_ORIGINS = ['http://localhost:3000', 'http://localhost:5173', 'http://127.0.0.1:3000']
     
+    # Logging (shared/logging_config.py): level for everything, per-module
+    # overrides, and the share of busy-path DEBUG records (extra={'sampled': True}) kept
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+    LOG_LEVELS = {
+        'werkzeug': 'WARNING',
+        'websocket_manager': 'INFO',
+        'user.auth': 'INFO',
+        'shared.email_service': 'INFO'
+    }
+    
     @staticmethod
     def allowed_file(filename):
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
@@ -88,6 +204,7 @@ class DevelopmentConfig(Config):
     TESTING = False
     CACHE_TIMEOUT_PRODUCTS = 300
     CACHE_TIMEOUT_CATEGORIES = 600
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -110,6 +227,7 @@ class TestingConfig(Config):
     DB_NAME = 'test_ecommerce_db'
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 60
+    RATELIMIT_STORAGE_URI = 'memory://'
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_uploads')
 
 config = {
@@ -17,7 +17,7 @@ if sys.platform.startswith('win'):
     # Set environment variables for UTF-8
     os.environ['PYTHONIOENCODING'] = 'utf-8'
 
-from flask import Flask, send_from_directory
+from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
 from flask_caching import Cache
 from config import get_config
@@ -26,16 +26,28 @@ from websocket_manager import WebSocketManager  # ADD THIS IMPORT
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
+def record_rate_limit_breach(request_limit):
+    from shared.rate_limits import RateLimitMonitor
+    return RateLimitMonitor.record_breach(request_limit)
+
+# Storage, strategy and default limits come from the RATELIMIT_* config keys
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["1000 per hour", "100 per minute"]
+    on_breach=record_rate_limit_breach
     )
 def create_app():
     app = Flask(__name__)
+    # Decimal, datetime and date are encoded by orjson (shared/json_provider.py)
+    from shared.json_provider import OrjsonProvider
+    app.json = OrjsonProvider(app)
     
     config_class = get_config()
     app.config.from_object(config_class)
     
+    # Before anything logs: handlers run on a listener thread, not the request
+    from shared.logging_config import setup_logging
+    setup_logging(app)
+    
     app.url_map.strict_slashes = False
     
     cors_origins = app.config.get('CORS_ORIGINS', ['http://localhost:3000'])
@@ -43,7 +55,8 @@ def create_app():
     CORS(app, 
         origins=cors_origins,
         supports_credentials=True,  # Keep this as True for now
-        allow_headers=['Content-Type', 'Authorization'],
+        allow_headers=['Content-Type', 'Authorization', 'Idempotency-Key'],
+        expose_headers=['Idempotent-Replayed'],
         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
     
     cache = Cache(app)
@@ -70,6 +83,68 @@ def create_app():
     websocket_manager = WebSocketManager(app)
     app.websocket_manager = websocket_manager
     
+    # Release expired checkout holds in the background
+    if app.config.get('INVENTORY_HOLD_SWEEPER_ENABLED') and not app.config.get('TESTING'):
+        from shared.inventory_service import HoldSweeper
+        app.hold_sweeper = HoldSweeper(
+            app,
+            interval_seconds=app.config.get('INVENTORY_HOLD_SWEEP_INTERVAL', 30),
+            batch_size=app.config.get('INVENTORY_HOLD_SWEEP_BATCH_SIZE', 500)
+        )
+        app.hold_sweeper.start()
+    
+    # Write hot-product stock counters behind to MySQL
+    if app.config.get('HOT_STOCK_ENABLED') and not app.config.get('TESTING'):
+        from shared.hot_stock_service import HotStockWorker
+        app.hot_stock_worker = HotStockWorker(
+            app,
+            interval_seconds=app.config.get('HOT_STOCK_FLUSH_INTERVAL', 2),
+            reconcile_every=app.config.get('HOT_STOCK_RECONCILE_INTERVAL', 30)
+        )
+        app.hot_stock_worker.start()
+    
+    # Run queued side effects (emails, alerts, cache refreshes) off the request path
+    import shared.order_jobs  # registers the job handlers
+    if app.config.get('JOB_WORKERS_ENABLED') and not app.config.get('TESTING'):
+        from shared.job_queue import JobWorkerPool
+        app.job_workers = JobWorkerPool(
+            app,
+            workers=app.config.get('JOB_WORKERS', 4),
+            poll_interval=app.config.get('JOB_POLL_INTERVAL', 1.0),
+            visibility_timeout=app.config.get('JOB_VISIBILITY_TIMEOUT', 300),
+            keep_days=app.config.get('JOB_KEEP_DAYS', 7)
+        )
+        app.job_workers.start()
+    
+    # Relay committed outbox events to caches, sockets and the job queue
+    if app.config.get('OUTBOX_RELAY_ENABLED') and not app.config.get('TESTING'):
+        from shared.outbox import OutboxRelay
+        app.outbox_relay = OutboxRelay(
+            app,
+            interval_seconds=app.config.get('OUTBOX_RELAY_INTERVAL', 1.0),
+            batch_size=app.config.get('OUTBOX_BATCH_SIZE', 100)
+        )
+        app.outbox_relay.start()
+    
+    # Write changed Redis carts back to the cart table
+    if app.config.get('CART_PERSIST_ENABLED') and not app.config.get('TESTING'):
+        from shared.cart_service import CartPersistWorker
+        app.cart_persist_worker = CartPersistWorker(
+            app,
+            interval_seconds=app.config.get('CART_PERSIST_INTERVAL', 5),
+            batch_size=app.config.get('CART_PERSIST_BATCH_SIZE', 200)
+        )
+        app.cart_persist_worker.start()
+    
+    # Keep this process's revoked-token filter in step with the others
+    if app.config.get('TOKEN_REVOCATION_LISTENER_ENABLED') and not app.config.get('TESTING'):
+        from shared.token_revocation import RevocationListener
+        app.revocation_listener = RevocationListener(
+            app,
+            rebuild_interval=app.config.get('TOKEN_REVOCATION_REBUILD_INTERVAL', 300)
+        )
+        app.revocation_listener.start()
+    
     from admin.routes import admin_bp
     from user.routes import user_bp
     from shared.routes import shared_bp
@@ -98,6 +173,15 @@ def create_app():
     @app.route('/websocket/status')
     def websocket_status():
         return app.websocket_manager.get_status(), 200
+    # Password hashing pool is saturated (shared/password_service.py)
+    from shared.password_service import PasswordServiceBusy
+    @app.errorhandler(PasswordServiceBusy)
+    def password_service_busy(error):
+        response = jsonify({'error': str(error)})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    
     @app.after_request
     def security_headers(response):
         response.headers['X-Frame-Options'] = 'DENY'
@@ -0,0 +1,18 @@
+-- Maintained per-product rating aggregate.
+-- Product detail reads the summary from here instead of running
+-- AVG/COUNT over every approved review on each cache miss.
+CREATE TABLE IF NOT EXISTS product_rating_summary (
+    product_id INT NOT NULL PRIMARY KEY,
+    rating_sum INT NOT NULL DEFAULT 0,
+    rating_count INT NOT NULL DEFAULT 0,
+    star_1 INT NOT NULL DEFAULT 0,
+    star_2 INT NOT NULL DEFAULT 0,
+    star_3 INT NOT NULL DEFAULT 0,
+    star_4 INT NOT NULL DEFAULT 0,
+    star_5 INT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Serves the paginated "approved reviews, newest first" query.
+CREATE INDEX idx_reviews_product_status_created
+    ON reviews (product_id, status, created_at);
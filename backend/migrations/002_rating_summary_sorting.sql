@@ -0,0 +1,9 @@
+-- Stored average so product listings can sort and filter by rating
+-- through an index instead of aggregating reviews per request.
+ALTER TABLE product_rating_summary
+    ADD COLUMN rating_avg DECIMAL(3,2)
+        AS (IF(rating_count > 0, rating_sum / rating_count, 0)) STORED,
+    ADD INDEX idx_rating_summary_avg (rating_avg, rating_count);
+
+-- After applying, backfill rows for products reviewed before the
+-- aggregate existed:  python rebuild_rating_summary.py
@@ -0,0 +1,12 @@
+-- Top-K neighbours per product, rebuilt by build_recommendations.py.
+-- kind = 'bought_together' (co-purchase counts) or 'related'
+-- (same category, cosine similarity of purchase vectors).
+CREATE TABLE IF NOT EXISTS product_recommendations (
+    product_id INT NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    rank_position SMALLINT NOT NULL,
+    related_product_id INT NOT NULL,
+    score DOUBLE NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, kind, rank_position)
+);
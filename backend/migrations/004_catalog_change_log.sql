@@ -0,0 +1,32 @@
+-- Monotonic change sequence for delta catalog sync (/api/user/catalog/changes).
+-- Triggers append a row whenever a product, its price/status, its stock or
+-- its images change, so every write path is covered without app changes.
+CREATE TABLE IF NOT EXISTS catalog_change_log (
+    change_seq BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_catalog_change_product (product_id, change_seq)
+);
+
+CREATE TRIGGER trg_catalog_products_insert AFTER INSERT ON products
+FOR EACH ROW INSERT INTO catalog_change_log (product_id) VALUES (NEW.product_id);
+
+CREATE TRIGGER trg_catalog_products_update AFTER UPDATE ON products
+FOR EACH ROW INSERT INTO catalog_change_log (product_id) VALUES (NEW.product_id);
+
+-- Stock changes only matter to clients when the quantity actually moved
+CREATE TRIGGER trg_catalog_inventory_update AFTER UPDATE ON inventory
+FOR EACH ROW INSERT INTO catalog_change_log (product_id)
+    SELECT NEW.product_id FROM DUAL WHERE NOT (NEW.quantity <=> OLD.quantity);
+
+CREATE TRIGGER trg_catalog_images_insert AFTER INSERT ON product_images
+FOR EACH ROW INSERT INTO catalog_change_log (product_id) VALUES (NEW.product_id);
+
+CREATE TRIGGER trg_catalog_images_update AFTER UPDATE ON product_images
+FOR EACH ROW INSERT INTO catalog_change_log (product_id) VALUES (NEW.product_id);
+
+CREATE TRIGGER trg_catalog_images_delete AFTER DELETE ON product_images
+FOR EACH ROW INSERT INTO catalog_change_log (product_id) VALUES (OLD.product_id);
+
+-- Seed one entry per existing product so a sync from 0 returns the whole catalog
+INSERT INTO catalog_change_log (product_id) SELECT product_id FROM products;
@@ -0,0 +1,17 @@
+-- Checkout stock holds (see shared/inventory_service.py).
+-- inventory.reserved_quantity is the sum of live holds for a product, so
+-- available stock is quantity - reserved_quantity without a join.
+ALTER TABLE inventory
+    ADD COLUMN reserved_quantity INT NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS inventory_holds (
+    hold_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_inventory_holds_user_product (user_id, product_id),
+    KEY idx_inventory_holds_product_expiry (product_id, expires_at),
+    KEY idx_inventory_holds_expiry (expires_at)
+);
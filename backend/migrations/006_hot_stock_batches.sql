@@ -0,0 +1,9 @@
+-- Write-behind batches applied from the Redis hot-stock counters
+-- (see shared/hot_stock_service.py). A batch ID is inserted in the same
+-- transaction as its inventory update, so a retried batch is skipped.
+CREATE TABLE IF NOT EXISTS hot_stock_batches (
+    batch_id VARCHAR(36) NOT NULL PRIMARY KEY,
+    product_count INT NOT NULL DEFAULT 0,
+    applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_hot_stock_batches_applied (applied_at)
+);
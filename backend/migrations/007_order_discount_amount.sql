@@ -0,0 +1,3 @@
+-- Wallet credit applied at checkout (see shared/pricing_service.py).
+ALTER TABLE orders
+    ADD COLUMN discount_amount DECIMAL(10, 2) NOT NULL DEFAULT 0 AFTER shipping_amount;
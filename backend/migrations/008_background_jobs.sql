@@ -0,0 +1,20 @@
+-- Durable queue for background jobs (see shared/job_queue.py).
+-- status: pending -> running -> done, or back to pending for a retry,
+-- or dead once max_attempts is used up.
+CREATE TABLE IF NOT EXISTS background_jobs (
+    job_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(100) NULL,
+    locked_at DATETIME NULL,
+    duration_ms INT NULL,
+    last_error TEXT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME NULL,
+    KEY idx_background_jobs_due (status, run_after),
+    KEY idx_background_jobs_finished (status, finished_at)
+);
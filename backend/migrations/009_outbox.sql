@@ -0,0 +1,8 @@
+-- Transactional outbox (see shared/outbox.py). Rows are written in the same
+-- transaction as the change they describe and deleted once relayed.
+CREATE TABLE IF NOT EXISTS outbox (
+    outbox_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    event_type VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
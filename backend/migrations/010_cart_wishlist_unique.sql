@@ -0,0 +1,34 @@
+-- Unique (user_id, product_id) keys so cart and wishlist writes can use
+-- INSERT ... ON DUPLICATE KEY UPDATE (see shared/cart_service.py).
+
+-- Fold duplicate cart lines into the oldest row first
+UPDATE cart c
+JOIN (
+    SELECT user_id, product_id, MIN(cart_id) as keep_id, SUM(quantity) as total
+    FROM cart
+    GROUP BY user_id, product_id
+    HAVING COUNT(*) > 1
+) d ON c.cart_id = d.keep_id
+SET c.quantity = d.total;
+
+DELETE c FROM cart c
+JOIN (
+    SELECT user_id, product_id, MIN(cart_id) as keep_id
+    FROM cart
+    GROUP BY user_id, product_id
+    HAVING COUNT(*) > 1
+) d ON c.user_id = d.user_id AND c.product_id = d.product_id AND c.cart_id <> d.keep_id;
+
+ALTER TABLE cart
+    ADD UNIQUE KEY uq_cart_user_product (user_id, product_id);
+
+DELETE w FROM wishlist w
+JOIN (
+    SELECT user_id, product_id, MIN(wishlist_id) as keep_id
+    FROM wishlist
+    GROUP BY user_id, product_id
+    HAVING COUNT(*) > 1
+) d ON w.user_id = d.user_id AND w.product_id = d.product_id AND w.wishlist_id <> d.keep_id;
+
+ALTER TABLE wishlist
+    ADD UNIQUE KEY uq_wishlist_user_product (user_id, product_id);
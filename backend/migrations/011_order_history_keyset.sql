@@ -0,0 +1,4 @@
+-- Keyset paging for /api/user/orders/history (see shared/order_history_service.py).
+-- Each page is an index range scan on (user_id, created_at, order_id).
+ALTER TABLE orders
+    ADD INDEX idx_orders_user_created (user_id, created_at, order_id);
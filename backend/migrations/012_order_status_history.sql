@@ -0,0 +1,11 @@
+-- Audit trail for admin order status changes (see shared/order_status_service.py).
+CREATE TABLE IF NOT EXISTS order_status_history (
+    history_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    order_id VARCHAR(36) NOT NULL,
+    from_status VARCHAR(20) NOT NULL,
+    to_status VARCHAR(20) NOT NULL,
+    changed_by VARCHAR(36) NULL,
+    note VARCHAR(255) NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_order_status_history_order (order_id, created_at)
+);
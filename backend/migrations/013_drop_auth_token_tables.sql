@@ -0,0 +1,5 @@
+-- Verification and password reset tokens now live in Redis with a TTL
+-- (see shared/auth_tokens.py). Links issued before this migration stop
+-- working; users can request a new one.
+DROP TABLE IF EXISTS email_verifications;
+DROP TABLE IF EXISTS password_reset_tokens;
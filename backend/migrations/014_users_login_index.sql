@@ -0,0 +1,7 @@
+-- Login reads user_id, password_hash and status by email
+-- (UserModel.get_credentials); this index answers it without touching the
+-- row (user_id is the primary key, so every secondary index carries it).
+-- Registration relies on the unique email key instead of a lookup first.
+ALTER TABLE users
+    ADD UNIQUE KEY uq_users_email (email),
+    ADD INDEX idx_users_login (email, status, password_hash);
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Rebuild product_rating_summary from the reviews table
+
+add_review and review moderation keep the aggregate up to date inside their
+own transactions; this script repairs any rows that drifted anyway (manual
+SQL edits, restores, rows created before the table existed).
+
+Usage:
+    python rebuild_rating_summary.py            # repair drifted rows
+    python rebuild_rating_summary.py --dry-run  # only report them
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import create_app
+from shared.models import ReviewModel
+from cache_utils import invalidate_review_cache
+
+def rebuild_rating_summary(dry_run=False):
+    app = create_app()
+    with app.app_context():
+        print("Checking product rating summaries...")
+        
+        drifted = ReviewModel.rebuild_rating_summaries(dry_run=dry_run)
+        
+        if not drifted:
+            print("All rating summaries match the reviews table")
+            return
+        
+        print(f"{len(drifted)} product(s) drifted: {', '.join(str(pid) for pid in drifted)}")
+        
+        if dry_run:
+            print("Dry run - nothing was changed")
+            return
+        
+        for product_id in drifted:
+            invalidate_review_cache(product_id)
+        
+        print(f"SUCCESS Rebuilt {len(drifted)} rating summaries")
+
+if __name__ == "__main__":
+    try:
+        rebuild_rating_summary(dry_run='--dry-run' in sys.argv)
+    except Exception as e:
+        print(f"ERROR rebuilding rating summaries: {e}")
+        sys.exit(1)
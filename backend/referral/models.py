@@ -1,8 +1,12 @@
 from shared.models import BaseModel, execute_query
+from shared.session_store import SessionStore
 import random
 import string
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class ReferralModel(BaseModel):
     @staticmethod
     def generate_code(user_id):
@@ -23,10 +27,11 @@ class ReferralModel(BaseModel):
                 WHERE user_id = %s
             """, (code, current_time, user_id))
             
-            print(f"Generated referral code {code} for user {user_id}")
+            SessionStore.set_fields(user_id, referral_code=code)
+            logger.info("Referral code generated", extra={'user_id': user_id, 'code': code})
             return code
         except Exception as e:
-            print(f"Error generating referral code for user {user_id}: {str(e)}")
+            logger.error("Referral code generation failed", extra={'user_id': user_id, 'error': str(e)})
             # Return a simple code as fallback to prevent registration from failing
             simple_code = f"REF{user_id[-6:].upper()}"
             return simple_code
@@ -118,6 +123,8 @@ class ReferralModel(BaseModel):
              description, reference_type, created_at)
             VALUES (%s, %s, 'credit', %s, %s, %s, 'referral', %s)
         """, (transaction_id, user_id, amount, new_balance, description, ReferralModel.current_time()))
+        
+        SessionStore.invalidate(user_id)
     
     @staticmethod
     def validate_code(code):
@@ -1,7 +1,8 @@
 import jwt
 from functools import wraps
-from flask import request, jsonify, current_app
-from shared.models import execute_query
+from flask import request, jsonify
+from shared.principal_cache import PrincipalCache
+from shared.token_verifier import verify_token
 
 def user_token_required(f):
     """Decorator to require user authentication"""
@@ -15,16 +16,11 @@ def user_token_required(f):
             token = token[7:]
         
         try:
-            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            current_user_id = data['user_id']
+            data = verify_token(token)
+            current_user_id = data.get('user_id')
             
-            # Verify user exists and is active
-            user = execute_query("""
-                SELECT user_id, status FROM users 
-                WHERE user_id = %s AND status = 'active'
-            """, (current_user_id,), fetch_one=True)
-            
-            if not user:
+            # Deactivated users have their tokens revoked, so the claims can be trusted
+            if not current_user_id:
                 return jsonify({'error': 'Invalid token or user not found'}), 401
                 
             return f(current_user_id, *args, **kwargs)
@@ -49,17 +45,14 @@ def admin_token_required(f):
             token = token[7:]
         
         try:
-            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+            data = verify_token(token)
             admin_id = data.get('admin_id')
             
             if not admin_id:
                 return jsonify({'error': 'Admin access required'}), 403
             
             # Verify admin exists and is active
-            admin = execute_query("""
-                SELECT admin_id, status, role FROM admin_users 
-                WHERE admin_id = %s AND status = 'active'
-            """, (admin_id,), fetch_one=True)
+            admin = PrincipalCache.get('admin', admin_id)
             
             if not admin:
                 return jsonify({'error': 'Invalid admin token or admin not found'}), 403
@@ -84,18 +77,8 @@ def optional_user_token(f):
         if token and token.startswith('Bearer '):
             token = token[7:]
             try:
-                data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+                data = verify_token(token)
                 user_id = data.get('user_id')
-                
-                # Verify user exists and is active
-                user = execute_query("""
-                    SELECT user_id FROM users 
-                    WHERE user_id = %s AND status = 'active'
-                """, (user_id,), fetch_one=True)
-                
-                if not user:
-                    user_id = None
-                    
             except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
                 user_id = None
         
@@ -0,0 +1,132 @@
+"""
+Email verification and password reset tokens
+
+Tokens used to be rows in email_verifications and password_reset_tokens that
+were marked used but never deleted, so both tables only grew. They now live
+in Redis under a TTL equal to their validity, so expired tokens disappear on
+their own, and redeeming one is a single script call that reads and deletes
+it atomically (a token cannot be redeemed twice by concurrent requests).
+
+Keys (all under CACHE_KEY_PREFIX):
+    auth_token:{kind}:{token}         -> user_id, expires with the token
+    auth_token_user:verify:{user_id}  -> the user's current verification token
+    auth_token_user:reset:{user_id}   -> set of the user's open reset tokens
+    auth_token_requests:reset:{user_id} -> reset emails sent in the last hour
+"""
+from flask import current_app
+import uuid
+from shared.cache_service import CacheService
+
+VERIFY = 'verify'
+RESET = 'reset'
+
+# KEYS[1] = token key, KEYS[2] = user pointer
+# ARGV = user_id, token, ttl, token key prefix
+# A new verification token replaces the user's previous one
+ISSUE_VERIFY_SCRIPT = """
+local previous = redis.call('GET', KEYS[2])
+if previous then
+    redis.call('DEL', ARGV[4] .. previous)
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+# KEYS[1] = token key, KEYS[2] = user token set, KEYS[3] = hourly request counter
+# ARGV = user_id, token, ttl
+ISSUE_RESET_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+local requests = redis.call('INCR', KEYS[3])
+if requests == 1 then
+    redis.call('EXPIRE', KEYS[3], 3600)
+end
+return requests
+"""
+
+# KEYS[1] = token key; ARGV[1] = kind, ARGV[2] = key prefix
+# Returns the user_id and drops the token together with the user's other
+# tokens of the same kind, or nil when the token is unknown or expired
+CONSUME_SCRIPT = """
+local user_id = redis.call('GET', KEYS[1])
+if not user_id then
+    return false
+end
+redis.call('DEL', KEYS[1])
+local user_key = ARGV[2] .. 'auth_token_user:' .. ARGV[1] .. ':' .. user_id
+if ARGV[1] == 'reset' then
+    for _, other in ipairs(redis.call('SMEMBERS', user_key)) do
+        redis.call('DEL', ARGV[2] .. 'auth_token:reset:' .. other)
+    end
+end
+redis.call('DEL', user_key)
+return user_id
+"""
+
+class AuthTokenStore:
+    @staticmethod
+    def prefix():
+        return current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+
+    @staticmethod
+    def token_key(kind, token):
+        return f"{AuthTokenStore.prefix()}auth_token:{kind}:{token}"
+
+    @staticmethod
+    def user_key(kind, user_id):
+        return f"{AuthTokenStore.prefix()}auth_token_user:{kind}:{user_id}"
+
+    @staticmethod
+    def requests_key(kind, user_id):
+        return f"{AuthTokenStore.prefix()}auth_token_requests:{kind}:{user_id}"
+
+    @staticmethod
+    def ttl(kind):
+        if kind == VERIFY:
+            return current_app.config.get('EMAIL_VERIFICATION_TOKEN_TTL', 24 * 3600)
+        return current_app.config.get('PASSWORD_RESET_TOKEN_TTL', 2 * 3600)
+
+    @staticmethod
+    def issue_verification(user_id):
+        token = str(uuid.uuid4())
+        CacheService.get_redis().register_script(ISSUE_VERIFY_SCRIPT)(
+            keys=[AuthTokenStore.token_key(VERIFY, token), AuthTokenStore.user_key(VERIFY, user_id)],
+            args=[user_id, token, AuthTokenStore.ttl(VERIFY), AuthTokenStore.token_key(VERIFY, '')]
+        )
+        return token
+
+    @staticmethod
+    def issue_reset(user_id):
+        token = str(uuid.uuid4())
+        CacheService.get_redis().register_script(ISSUE_RESET_SCRIPT)(
+            keys=[
+                AuthTokenStore.token_key(RESET, token),
+                AuthTokenStore.user_key(RESET, user_id),
+                AuthTokenStore.requests_key(RESET, user_id)
+            ],
+            args=[user_id, token, AuthTokenStore.ttl(RESET)]
+        )
+        return token
+
+    @staticmethod
+    def peek(kind, token):
+        """user_id the token belongs to, without redeeming it, or None"""
+        user_id = CacheService.get_redis().get(AuthTokenStore.token_key(kind, token))
+        return user_id.decode() if user_id else None
+
+    @staticmethod
+    def consume(kind, token):
+        """Redeem the token: user_id, or None when unknown, expired or already used"""
+        user_id = CacheService.get_redis().register_script(CONSUME_SCRIPT)(
+            keys=[AuthTokenStore.token_key(kind, token)],
+            args=[kind, AuthTokenStore.prefix()]
+        )
+        return user_id.decode() if user_id else None
+
+    @staticmethod
+    def recent_requests(kind, user_id):
+        """Tokens of this kind issued to the user in the last hour"""
+        count = CacheService.get_redis().get(AuthTokenStore.requests_key(kind, user_id))
+        return int(count) if count else 0
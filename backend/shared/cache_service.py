@@ -4,7 +4,19 @@ import time
 import hashlib
 from datetime import datetime
 
+_redis_clients = {}
+
 class CacheService:
+    @staticmethod
+    def get_redis():
+        """Shared Redis client (one connection pool per URL) for direct commands"""
+        import redis
+        url = current_app.config['CACHE_REDIS_URL']
+        client = _redis_clients.get(url)
+        if client is None:
+            client = _redis_clients.setdefault(url, redis.Redis.from_url(url))
+        return client
+    
     @staticmethod
     def generate_key(*args, **kwargs):
         key_data = str(args) + str(sorted(kwargs.items()))
@@ -0,0 +1,348 @@
+"""
+Cart storage
+
+Each user's cart lives in a Redis hash (product_id -> quantity) so adding,
+changing and removing items is a single atomic command. The `cart` table is
+kept as the durable copy: changed carts are marked dirty and CartPersistWorker
+writes them back in the background. When Redis is unavailable every operation
+falls back to reading and writing the table directly.
+
+Product names, prices and images for the cart page come from cached product
+tiles (one cache round trip, one IN query for misses) instead of a JOIN.
+"""
+from flask import current_app
+from datetime import datetime
+import logging
+import threading
+from shared.models import execute_query, transaction
+from shared.cache_service import CacheService
+from shared.image_utils import convert_image_url
+
+logger = logging.getLogger(__name__)
+
+LOADED_FIELD = '_loaded'
+
+# Copy the user's cart from MySQL into Redis unless another request already did.
+# KEYS[1] = cart hash; ARGV = ttl, then product_id, quantity pairs
+HYDRATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], '_loaded', '1')
+    for i = 2, #ARGV, 2 do
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+class CartService:
+    @staticmethod
+    def key(user_id):
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        return f"{prefix}cart:{user_id}"
+
+    @staticmethod
+    def dirty_key():
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        return f"{prefix}cart_dirty"
+
+    @staticmethod
+    def ttl():
+        return current_app.config.get('CART_REDIS_TTL', 30 * 24 * 3600)
+
+    @staticmethod
+    def redis():
+        return CacheService.get_redis()
+
+    @staticmethod
+    def load_from_db(user_id):
+        rows = execute_query("""
+            SELECT product_id, quantity FROM cart WHERE user_id = %s
+        """, (user_id,), fetch_all=True)
+        return {row['product_id']: row['quantity'] for row in rows}
+
+    @staticmethod
+    def ensure_loaded(redis_client, user_id):
+        """Make sure the Redis hash exists, hydrating it from MySQL on first use"""
+        key = CartService.key(user_id)
+        if redis_client.exists(key):
+            return key
+
+        args = [CartService.ttl()]
+        for product_id, quantity in CartService.load_from_db(user_id).items():
+            args.extend([product_id, quantity])
+        redis_client.register_script(HYDRATE_SCRIPT)(keys=[key], args=args)
+        return key
+
+    @staticmethod
+    def mark_dirty(pipe, user_id, key):
+        pipe.expire(key, CartService.ttl())
+        pipe.sadd(CartService.dirty_key(), user_id)
+
+    @staticmethod
+    def get_items(user_id):
+        """{product_id: quantity} for the user's cart"""
+        try:
+            redis_client = CartService.redis()
+            key = CartService.ensure_loaded(redis_client, user_id)
+            raw = redis_client.hgetall(key)
+        except Exception as e:
+            logger.warning(f"Cart store unavailable, reading MySQL: {str(e)}")
+            return CartService.load_from_db(user_id)
+
+        return {
+            int(field): int(value)
+            for field, value in raw.items()
+            if field.decode() != LOADED_FIELD and int(value) > 0
+        }
+
+    @staticmethod
+    def add(user_id, product_id, quantity):
+        """Add to the quantity already in the cart"""
+        try:
+            redis_client = CartService.redis()
+            key = CartService.ensure_loaded(redis_client, user_id)
+            pipe = redis_client.pipeline()
+            pipe.hincrby(key, product_id, quantity)
+            CartService.mark_dirty(pipe, user_id, key)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.warning(f"Cart store unavailable, writing MySQL: {str(e)}")
+
+        CartService.upsert_rows(user_id, {product_id: quantity}, increment=True)
+
+    @staticmethod
+    def upsert_rows(user_id, items, increment=False, tx=None):
+        """
+        Write {product_id: quantity} to the cart table in one statement
+
+        Relies on the unique (user_id, product_id) key: new lines are inserted,
+        existing ones have the quantity added (increment) or replaced.
+        """
+        if not items:
+            return 0
+
+        update = 'quantity + VALUES(quantity)' if increment else 'VALUES(quantity)'
+        now = datetime.now()
+        values = ', '.join(['(%s, %s, %s, %s)'] * len(items))
+        params = []
+        for product_id, quantity in sorted(items.items()):
+            params.extend([user_id, product_id, quantity, now])
+
+        query = f"""
+            INSERT INTO cart (user_id, product_id, quantity, created_at)
+            VALUES {values}
+            ON DUPLICATE KEY UPDATE quantity = {update}, updated_at = VALUES(created_at)
+        """
+        if tx is not None:
+            return tx.execute(query, tuple(params))
+        return execute_query(query, tuple(params))
+
+    @staticmethod
+    def merge(user_id, guest_items):
+        """
+        Fold a guest cart ([{product_id, quantity}]) into the user's cart at login
+
+        Unknown or inactive products are skipped. The table gets one bulk upsert;
+        a cart already loaded in Redis gets the same increments so the next
+        persist does not undo them. Returns the number of lines merged.
+        """
+        merged = {}
+        for item in guest_items or []:
+            try:
+                product_id = int(item['product_id'])
+                quantity = int(item.get('quantity', 1))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if quantity > 0:
+                merged[product_id] = merged.get(product_id, 0) + quantity
+
+        active = CartService.get_product_tiles(merged.keys())
+        merged = {pid: qty for pid, qty in merged.items() if pid in active}
+        if not merged:
+            return 0
+
+        CartService.upsert_rows(user_id, merged, increment=True)
+
+        try:
+            redis_client = CartService.redis()
+            key = CartService.key(user_id)
+            if redis_client.exists(key):
+                pipe = redis_client.pipeline()
+                for product_id, quantity in merged.items():
+                    pipe.hincrby(key, product_id, quantity)
+                CartService.mark_dirty(pipe, user_id, key)
+                pipe.execute()
+        except Exception as e:
+            logger.warning(f"Cart store unavailable while merging guest cart: {str(e)}")
+
+        return len(merged)
+
+    @staticmethod
+    def set_quantity(user_id, product_id, quantity):
+        """Set an item's quantity; 0 removes it. Callers check the product is active"""
+        try:
+            redis_client = CartService.redis()
+            key = CartService.ensure_loaded(redis_client, user_id)
+            pipe = redis_client.pipeline()
+            if quantity > 0:
+                pipe.hset(key, product_id, quantity)
+            else:
+                pipe.hdel(key, product_id)
+            CartService.mark_dirty(pipe, user_id, key)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.warning(f"Cart store unavailable, writing MySQL: {str(e)}")
+
+        if quantity > 0:
+            CartService.upsert_rows(user_id, {product_id: quantity})
+        else:
+            execute_query("""
+                DELETE FROM cart WHERE user_id = %s AND product_id = %s
+            """, (user_id, product_id))
+
+    @staticmethod
+    def remove(user_id, product_id):
+        CartService.set_quantity(user_id, product_id, 0)
+
+    @staticmethod
+    def clear(user_id):
+        """
+        Empty the Redis cart after checkout has deleted the table rows
+
+        The hash is reset to an empty, dirty cart rather than dropped, so a
+        flush that read the old contents just before is overwritten by the next.
+        """
+        try:
+            redis_client = CartService.redis()
+            key = CartService.key(user_id)
+            pipe = redis_client.pipeline()
+            pipe.delete(key)
+            pipe.hset(key, LOADED_FIELD, '1')
+            CartService.mark_dirty(pipe, user_id, key)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Cart store unavailable while clearing cart: {str(e)}")
+
+    @staticmethod
+    def persist(user_id):
+        """Write one user's Redis cart to the cart table"""
+        redis_client = CartService.redis()
+        raw = redis_client.hgetall(CartService.key(user_id))
+        if not raw:
+            # Expired or never loaded: the table is already the latest copy
+            return
+        items = {
+            int(field): int(value)
+            for field, value in raw.items()
+            if field.decode() != LOADED_FIELD and int(value) > 0
+        }
+
+        with transaction() as tx:
+            if items:
+                # A product that no longer exists would fail the whole write
+                placeholders = ', '.join(['%s'] * len(items))
+                rows = tx.execute(f"""
+                    SELECT product_id FROM products WHERE product_id IN ({placeholders})
+                """, tuple(sorted(items)), fetch_all=True)
+                known = {row['product_id'] for row in rows}
+                skipped = set(items) - known
+                if skipped:
+                    logger.warning(f"Cart of user {user_id} has unknown products {sorted(skipped)}, not persisted")
+                    redis_client.hdel(CartService.key(user_id), *skipped)
+                    items = {pid: qty for pid, qty in items.items() if pid in known}
+
+            if items:
+                placeholders = ', '.join(['%s'] * len(items))
+                tx.execute(f"""
+                    DELETE FROM cart WHERE user_id = %s AND product_id NOT IN ({placeholders})
+                """, (user_id, *sorted(items)))
+            else:
+                tx.execute("""
+                    DELETE FROM cart WHERE user_id = %s
+                """, (user_id,))
+
+            CartService.upsert_rows(user_id, items, tx=tx)
+
+    @staticmethod
+    def persist_dirty(batch_size=200):
+        """Persist a batch of changed carts; returns how many were written"""
+        redis_client = CartService.redis()
+        user_ids = redis_client.spop(CartService.dirty_key(), batch_size) or []
+
+        persisted = 0
+        for user_id in user_ids:
+            user_id = user_id.decode()
+            try:
+                CartService.persist(user_id)
+                persisted += 1
+            except Exception as e:
+                # Keep it dirty so the next pass tries again
+                redis_client.sadd(CartService.dirty_key(), user_id)
+                logger.error(f"Cart persist failed for user {user_id}: {str(e)}")
+        return persisted
+
+    @staticmethod
+    def get_product_tiles(product_ids):
+        """Name, prices and primary image per active product, served from cache"""
+        if not product_ids:
+            return {}
+
+        cache = current_app.cache
+        product_ids = sorted(product_ids)
+        cached = cache.get_many(*[f'user_product_tile_{pid}' for pid in product_ids])
+        tiles = {pid: tile for pid, tile in zip(product_ids, cached) if tile is not None}
+
+        missing = [pid for pid in product_ids if pid not in tiles]
+        if missing:
+            placeholders = ', '.join(['%s'] * len(missing))
+            rows = execute_query(f"""
+                SELECT p.product_id, p.product_name, p.price, p.discount_price, p.status,
+                       (SELECT pi.image_url FROM product_images pi
+                        WHERE pi.product_id = p.product_id AND pi.is_primary = 1
+                        LIMIT 1) as image_url
+                FROM products p
+                WHERE p.product_id IN ({placeholders})
+            """, tuple(missing), fetch_all=True)
+
+            fresh = {}
+            for row in rows:
+                row['image_url'] = convert_image_url(row['image_url'])
+                fresh[f"user_product_tile_{row['product_id']}"] = row
+                tiles[row['product_id']] = row
+            if fresh:
+                cache.set_many(fresh, timeout=current_app.config.get('CACHE_TIMEOUT_PRODUCT_DETAIL', 180))
+
+        return {pid: tile for pid, tile in tiles.items() if tile['status'] == 'active'}
+
+class CartPersistWorker:
+    """Background thread that writes changed Redis carts to MySQL"""
+
+    def __init__(self, app, interval_seconds=5, batch_size=200):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run, name='cart-persist', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                with self.app.app_context():
+                    while CartService.persist_dirty(self.batch_size) == self.batch_size:
+                        pass
+            except Exception as e:
+                logger.error(f"Cart persist worker failed: {str(e)}")
+
+cart_service = CartService()
@@ -0,0 +1,129 @@
+"""
+Delta catalog sync for offline clients (the mobile app)
+
+catalog_change_log gets a row from database triggers whenever a product, its
+stock or its images change (see migrations/004_catalog_change_log.sql).
+Clients keep the last change_seq they applied and ask only for what moved
+after it, instead of re-paging through /products.
+"""
+from shared.models import execute_query
+from shared.image_utils import convert_image_url
+
+class CatalogSyncService:
+    @staticmethod
+    def get_changed_products(since, limit, settle_seconds=5):
+        """
+        Latest change_seq per product changed after `since`, oldest first
+
+        Rows younger than settle_seconds are held back: AUTO_INCREMENT values
+        can commit out of order, and skipping a young row would lose it forever
+        once a client has moved past its sequence number.
+        """
+        return execute_query("""
+            SELECT product_id, MAX(change_seq) as change_seq
+            FROM catalog_change_log
+            WHERE change_seq > %s
+              AND created_at <= NOW() - INTERVAL %s SECOND
+            GROUP BY product_id
+            ORDER BY change_seq
+            LIMIT %s
+        """, (since, settle_seconds, limit), fetch_all=True)
+
+    @staticmethod
+    def load_products(product_ids):
+        """Current state of the given products, with stock, in one query"""
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        return execute_query(f"""
+            SELECT p.product_id, p.product_name, p.category_id, p.brand,
+                   p.price, p.discount_price, p.status, p.is_featured,
+                   i.quantity as stock_quantity
+            FROM products p
+            LEFT JOIN inventory i ON p.product_id = i.product_id
+            WHERE p.product_id IN ({placeholders})
+        """, tuple(product_ids), fetch_all=True)
+
+    @staticmethod
+    def load_images(product_ids):
+        """Image URLs for the given products, primary first, in one query"""
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        rows = execute_query(f"""
+            SELECT product_id, image_url
+            FROM product_images
+            WHERE product_id IN ({placeholders})
+            ORDER BY product_id, is_primary DESC, sort_order ASC
+        """, tuple(product_ids), fetch_all=True)
+
+        images = {}
+        for row in rows:
+            images.setdefault(row['product_id'], []).append(convert_image_url(row['image_url']))
+        return images
+
+    @staticmethod
+    def get_changes(since=0, limit=200, settle_seconds=5):
+        """
+        One batch of catalog changes after `since`
+
+        Active products come back as compact records; deactivated or removed
+        products come back only as IDs in `deleted` (tombstones). Clients store
+        `next_since` and call again while `has_more` is true.
+        """
+        changed = CatalogSyncService.get_changed_products(since, limit + 1, settle_seconds)
+        has_more = len(changed) > limit
+        changed = changed[:limit]
+
+        if not changed:
+            return {'since': since, 'next_since': since, 'has_more': False, 'products': [], 'deleted': []}
+
+        product_ids = [row['product_id'] for row in changed]
+        products = {row['product_id']: row for row in CatalogSyncService.load_products(product_ids)}
+        live_ids = [pid for pid in product_ids if products.get(pid) and products[pid]['status'] == 'active']
+        images = CatalogSyncService.load_images(live_ids) if live_ids else {}
+
+        records = []
+        deleted = []
+        for row in changed:
+            product = products.get(row['product_id'])
+            if not product or product['status'] != 'active':
+                deleted.append(row['product_id'])
+                continue
+
+            record = {
+                'id': product['product_id'],
+                'seq': row['change_seq'],
+                'name': product['product_name'],
+                'category_id': product['category_id'],
+                'price': float(product['price']),
+                'stock': product['stock_quantity'] or 0,
+                'images': images.get(product['product_id'], [])
+            }
+            # Optional fields are left out when empty to keep mobile payloads small
+            if product['discount_price'] is not None:
+                record['discount_price'] = float(product['discount_price'])
+            if product['brand']:
+                record['brand'] = product['brand']
+            if product['is_featured']:
+                record['featured'] = True
+            records.append(record)
+
+        return {
+            'since': since,
+            'next_since': changed[-1]['change_seq'],
+            'has_more': has_more,
+            'products': records,
+            'deleted': deleted
+        }
+
+    @staticmethod
+    def compact():
+        """Drop log rows superseded by a later change to the same product"""
+        return execute_query("""
+            DELETE l FROM catalog_change_log l
+            JOIN (
+                SELECT product_id, MAX(change_seq) as latest_seq
+                FROM catalog_change_log
+                GROUP BY product_id
+            ) latest ON l.product_id = latest.product_id
+            WHERE l.change_seq < latest.latest_seq
+        """)
+
+catalog_sync_service = CatalogSyncService()
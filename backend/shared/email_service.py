@@ -4,8 +4,14 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from config import Config
 from shared.models import execute_query
-from datetime import datetime, timedelta
-import uuid
+from shared.utils import get_order_status_color
+from shared.token_revocation import TokenRevocation
+from shared.session_store import SessionStore
+from shared.auth_tokens import AuthTokenStore, VERIFY, RESET
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 class EmailService:
     def __init__(self):
@@ -15,37 +21,22 @@ class EmailService:
         self.password = getattr(Config, 'MAIL_PASSWORD', "rxeysnootgqklxam")
         self.sender_name = getattr(Config, 'COMPANY_NAME', 'WellnessNest')
         
-        print(f"Email service initialized:")
-        print(f"   SMTP: {self.smtp_server}:{self.smtp_port}")
-        print(f"   From: {self.email}")
-        print(f"   Password configured: {bool(self.password)}")
+        logger.info("Email service initialized", extra={
+            'smtp': f"{self.smtp_server}:{self.smtp_port}",
+            'sender': self.email,
+            'password_configured': bool(self.password)
+        })
     
     def send_email(self, to_email, subject, html_content, text_content=None):
         if not self.email or not self.password:
-            print(f"ERROR Email not configured - Missing email/password")
-            print(f"   Would send: {subject} to {to_email}")
-            print(f"   Please set MAIL_USERNAME and MAIL_PASSWORD in .env")
+            logger.error("Email not configured, set MAIL_USERNAME and MAIL_PASSWORD",
+                         extra={'to': to_email, 'subject': subject})
             return False
         
-        print(f"EMAIL Sending email:")
-        print(f"   To: {to_email}")
-        print(f"   Subject: {subject}")
-        print(f"   From: {self.email}")
+        logger.debug("Sending email", extra={'to': to_email, 'subject': subject})
         
         try:
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = self.email
-            message["To"] = to_email
-            
-            if not text_content:
-                text_content = "Please view this email in HTML format."
-            
-            text_part = MIMEText(text_content, "plain")
-            html_part = MIMEText(html_content, "html")
-            
-            message.attach(text_part)
-            message.attach(html_part)
+            message = self.build_message(to_email, subject, html_content, text_content)
             
             context = ssl.create_default_context()
             
@@ -54,19 +45,72 @@ class EmailService:
                 server.login(self.email, self.password)
                 server.sendmail(self.email, to_email, message.as_string())
             
-            print(f"SUCCESS Email sent successfully to {to_email}")
+            logger.info("Email sent", extra={'to': to_email, 'subject': subject})
             return True
             
         except smtplib.SMTPAuthenticationError:
-            print(f"ERROR SMTP Authentication failed - Check email/password")
+            logger.error("SMTP authentication failed, check MAIL_USERNAME and MAIL_PASSWORD")
             return False
         except smtplib.SMTPException as e:
-            print(f"ERROR SMTP Error: {str(e)}")
+            logger.error("SMTP error", extra={'to': to_email, 'error': str(e)})
             return False
         except Exception as e:
-            print(f"ERROR Email sending failed: {str(e)}")
+            logger.error("Email sending failed", extra={'to': to_email, 'error': str(e)})
             return False
     
+    def build_message(self, to_email, subject, html_content, text_content=None):
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = self.email
+        message["To"] = to_email
+        
+        if not text_content:
+            text_content = "Please view this email in HTML format."
+        
+        message.attach(MIMEText(text_content, "plain"))
+        message.attach(MIMEText(html_content, "html"))
+        return message
+    
+    def send_emails(self, emails):
+        """
+        Send many (to_email, subject, html_content) emails over one SMTP session
+        
+        Returns the list of addresses that could not be sent to.
+        """
+        if not emails:
+            return []
+        if not self.email or not self.password:
+            logger.error("Email not configured, batch not sent", extra={'count': len(emails)})
+            return [to_email for to_email, _, _ in emails]
+        
+        logger.debug("Sending email batch", extra={'count': len(emails)})
+        
+        failed = []
+        position = 0
+        try:
+            context = ssl.create_default_context()
+            
+            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+                server.starttls(context=context)
+                server.login(self.email, self.password)
+                for to_email, subject, html_content in emails:
+                    try:
+                        message = self.build_message(to_email, subject, html_content)
+                        server.sendmail(self.email, to_email, message.as_string())
+                    except smtplib.SMTPRecipientsRefused:
+                        failed.append(to_email)
+                    position += 1
+        except smtplib.SMTPAuthenticationError:
+            logger.error("SMTP authentication failed, check MAIL_USERNAME and MAIL_PASSWORD")
+            return [to_email for to_email, _, _ in emails]
+        except Exception as e:
+            # The session broke: everything not yet handed over counts as failed
+            logger.error("Email batch failed", extra={'sent': position, 'count': len(emails), 'error': str(e)})
+            return failed + [to_email for to_email, _, _ in emails[position:]]
+        
+        logger.info("Email batch sent", extra={'sent': len(emails) - len(failed), 'count': len(emails)})
+        return failed
+    
     def send_welcome_email(self, user_email, user_name, referral_code=None):
         subject = f"Welcome to {self.sender_name}!"
         
@@ -99,19 +143,7 @@ class EmailService:
         return self.send_email(user_email, subject, html_content)
     
     def generate_verification_token(self, user_id):
-        token = str(uuid.uuid4())
-        expires_at = datetime.now() + timedelta(hours=24)
-        
-        execute_query("""
-            INSERT INTO email_verifications (user_id, token, expires_at, created_at)
-            VALUES (%s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE 
-            token = VALUES(token), 
-            expires_at = VALUES(expires_at), 
-            created_at = VALUES(created_at)
-        """, (user_id, token, expires_at, datetime.now()))
-        
-        return token
+        return AuthTokenStore.issue_verification(user_id)
     
     def send_verification_email(self, user_email, user_name, user_id):
         token = self.generate_verification_token(user_id)
@@ -151,38 +183,21 @@ class EmailService:
         return self.send_email(user_email, subject, html_content, text_content)
     
     def verify_email_token(self, token):
-        verification = execute_query("""
-            SELECT user_id FROM email_verifications 
-            WHERE token = %s AND expires_at > NOW() AND used_at IS NULL
-        """, (token,), fetch_one=True)
+        user_id = AuthTokenStore.consume(VERIFY, token)
         
-        if verification:
-            user_id = verification['user_id']
-            
+        if user_id:
             execute_query("""
                 UPDATE users SET email_verified = TRUE, updated_at = %s 
                 WHERE user_id = %s
             """, (datetime.now(), user_id))
             
-            execute_query("""
-                UPDATE email_verifications SET used_at = %s 
-                WHERE token = %s
-            """, (datetime.now(), token))
-            
+            SessionStore.set_fields(user_id, email_verified=True)
             return user_id
         
         return None
     
     def generate_password_reset_token(self, user_id):
-        token = str(uuid.uuid4())
-        expires_at = datetime.now() + timedelta(hours=2)
-        
-        execute_query("""
-            INSERT INTO password_reset_tokens (user_id, token, expires_at, created_at)
-            VALUES (%s, %s, %s, %s)
-        """, (user_id, token, expires_at, datetime.now()))
-        
-        return token
+        return AuthTokenStore.issue_reset(user_id)
     
     def send_password_reset_email(self, user_email, user_name, user_id):
         token = self.generate_password_reset_token(user_id)
@@ -213,40 +228,33 @@ class EmailService:
         return self.send_email(user_email, subject, html_content)
     
     def verify_reset_token(self, token):
-        reset_request = execute_query("""
-            SELECT pr.user_id, pr.expires_at, u.email, u.first_name
-            FROM password_reset_tokens pr
-            JOIN users u ON pr.user_id = u.user_id
-            WHERE pr.token = %s AND pr.expires_at > NOW() AND pr.used_at IS NULL
-        """, (token,), fetch_one=True)
-        
-        return reset_request
+        user_id = AuthTokenStore.peek(RESET, token)
+        if not user_id:
+            return None
+        
+        return execute_query("""
+            SELECT user_id, email, first_name
+            FROM users WHERE user_id = %s
+        """, (user_id,), fetch_one=True)
     
     def reset_password(self, token, new_password_hash):
-        reset_request = self.verify_reset_token(token)
-        if not reset_request:
+        # Redeeming the token also drops the user's other open reset links
+        user_id = AuthTokenStore.consume(RESET, token)
+        if not user_id:
             return False
         
         execute_query("""
             UPDATE users 
             SET password_hash = %s, updated_at = %s 
             WHERE user_id = %s
-        """, (new_password_hash, datetime.now(), reset_request['user_id']))
-        
-        execute_query("""
-            UPDATE password_reset_tokens 
-            SET used_at = %s 
-            WHERE token = %s
-        """, (datetime.now(), token))
-        
-        execute_query("""
-            UPDATE password_reset_tokens 
-            SET used_at = %s 
-            WHERE user_id = %s AND used_at IS NULL AND token != %s
-        """, (datetime.now(), reset_request['user_id'], token))
+        """, (new_password_hash, datetime.now(), user_id))
         
+        TokenRevocation.revoke_user(user_id)
         return True
     
+    def recent_password_reset_requests(self, user_id):
+        return AuthTokenStore.recent_requests(RESET, user_id)
+    
     def send_order_confirmation(self, order_id, user_email, user_name):
         order = execute_query("""
             SELECT o.*, COUNT(oi.item_id) as item_count
@@ -287,6 +295,30 @@ class EmailService:
         
         return self.send_email(user_email, subject, html_content)
     
+    def build_order_status_email(self, order, user_name, status):
+        """(subject, html_content) telling a customer their order moved to status"""
+        subject = f"Order {order['order_number']} is {status}"
+        
+        html_content = f"""
+        <html>
+        <body style="font-family: Arial; padding: 20px;">
+            <div style="max-width: 600px; margin: 0 auto;">
+                <h1 style="color: {get_order_status_color(status)};">Order {status.capitalize()}</h1>
+                <p>Hi {user_name},</p>
+                <p>Your order <strong>{order['order_number']}</strong> is now <strong>{status}</strong>.</p>
+                
+                <div style="background: #f9f9f9; padding: 20px; border-radius: 5px; margin: 20px 0;">
+                    <p><strong>Date:</strong> {order['created_at'].strftime('%B %d, %Y')}</p>
+                    <p><strong>Total:</strong> ₹{order['total_amount']:.2f}</p>
+                </div>
+                
+                <p>Thank you for choosing {self.sender_name}!</p>
+            </div>
+        </body>
+        </html>
+        """
+        return subject, html_content
+    
     def send_referral_reward_notification(self, user_email, user_name, amount=50):
         subject = f"You earned ₹{amount} referral reward!"
         
@@ -0,0 +1,369 @@
+"""
+Hot-SKU stock counters in Redis
+
+During flash sales every order for a popular product would queue on the same
+inventory row lock. Products flagged as hot keep a live stock counter in Redis
+instead, decremented atomically by a Lua script, and the decrements are written
+behind to MySQL in batches by HotStockWorker.
+
+MySQL stays the source of truth:
+- each flush batch carries an ID recorded in hot_stock_batches in the same
+  transaction as the stock update, so a batch is never applied twice;
+- reconcile() recomputes what each counter should be from the inventory row
+  and pending decrements, and corrects (and reports) any drift, e.g. after an
+  admin restock.
+"""
+from flask import current_app
+import logging
+import threading
+import uuid
+from shared.models import execute_query, transaction
+from shared.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = pending hash, KEYS[2..] = counters
+# ARGV[1..n] = quantities, ARGV[n+1..2n] = product ids
+# Returns {1, remaining...} on success, {0, current...} when short, {-1} when a counter is missing
+RESERVE_SCRIPT = """
+local n = #KEYS - 1
+local values = {}
+local status = 1
+for i = 1, n do
+    local current = redis.call('GET', KEYS[i + 1])
+    if not current then
+        return {-1}
+    end
+    values[i] = tonumber(current)
+    if values[i] < tonumber(ARGV[i]) then
+        status = 0
+    end
+end
+if status == 1 then
+    for i = 1, n do
+        values[i] = redis.call('DECRBY', KEYS[i + 1], ARGV[i])
+        redis.call('HINCRBY', KEYS[1], ARGV[n + i], ARGV[i])
+    end
+end
+table.insert(values, 1, status)
+return values
+"""
+
+# Same layout as RESERVE_SCRIPT; gives stock back after a failed checkout
+RESTORE_SCRIPT = """
+local n = #KEYS - 1
+for i = 1, n do
+    if redis.call('EXISTS', KEYS[i + 1]) == 1 then
+        redis.call('INCRBY', KEYS[i + 1], ARGV[i])
+        redis.call('HINCRBY', KEYS[1], ARGV[n + i], -tonumber(ARGV[i]))
+    end
+end
+return n
+"""
+
+# KEYS[1] = pending hash, KEYS[2] = inflight hash, ARGV[1] = new batch id
+# An unfinished inflight batch is returned again so it can be retried
+DRAIN_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('HSET', KEYS[2], 'batch_id', ARGV[1])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# KEYS[1] = pending hash, KEYS[2..] = counters
+# ARGV[1..n] = expected available stock from MySQL, ARGV[n+1..2n] = product ids
+# Returns the drift applied to each counter
+RECONCILE_SCRIPT = """
+local n = #KEYS - 1
+local drifts = {}
+for i = 1, n do
+    local pending = tonumber(redis.call('HGET', KEYS[1], ARGV[n + i]) or '0')
+    local expected = tonumber(ARGV[i]) - pending
+    local current = redis.call('GET', KEYS[i + 1])
+    if current then
+        drifts[i] = expected - tonumber(current)
+        if drifts[i] ~= 0 then
+            redis.call('INCRBY', KEYS[i + 1], drifts[i])
+        end
+    else
+        redis.call('SET', KEYS[i + 1], expected)
+        drifts[i] = 0
+    end
+end
+return drifts
+"""
+
+class HotStockService:
+    @staticmethod
+    def key(name):
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        return f"{prefix}hot_stock:{name}"
+
+    @staticmethod
+    def counter_key(product_id):
+        return HotStockService.key(f"qty:{product_id}")
+
+    @staticmethod
+    def is_enabled():
+        return current_app.config.get('HOT_STOCK_ENABLED', False)
+
+    @staticmethod
+    def get_hot_products():
+        """Product IDs currently served from Redis counters"""
+        if not HotStockService.is_enabled():
+            return set()
+        members = CacheService.get_redis().smembers(HotStockService.key('products'))
+        return {int(member) for member in members}
+
+    @staticmethod
+    def run_script(script, keys, args):
+        redis_client = CacheService.get_redis()
+        return redis_client.register_script(script)(keys=keys, args=args)
+
+    @staticmethod
+    def reserve(lines):
+        """
+        Atomically take stock for {product_id: quantity} from the counters
+
+        Returns the per-line results and remaining stock, or None when a counter
+        is missing (e.g. after a Redis restart) and the caller should fall back
+        to the MySQL path.
+        """
+        product_ids = sorted(lines)
+        keys = [HotStockService.key('pending')] + [HotStockService.counter_key(pid) for pid in product_ids]
+        args = [lines[pid] for pid in product_ids] + product_ids
+        result = HotStockService.run_script(RESERVE_SCRIPT, keys, args)
+
+        status = int(result[0])
+        if status == -1:
+            logger.warning(f"Hot stock counter missing for {product_ids}, using MySQL")
+            return None
+
+        values = [int(value) for value in result[1:]]
+        results = []
+        for product_id, value in zip(product_ids, values):
+            results.append({
+                'product_id': product_id,
+                'requested': lines[product_id],
+                'available': value + lines[product_id] if status == 1 else max(value, 0),
+                'success': status == 1 or value >= lines[product_id]
+            })
+
+        stock = dict(zip(product_ids, values)) if status == 1 else {}
+        return {'success': status == 1, 'lines': results, 'stock': stock}
+
+    @staticmethod
+    def restore(lines):
+        """Give back stock taken by reserve() when the order could not be saved"""
+        product_ids = sorted(lines)
+        keys = [HotStockService.key('pending')] + [HotStockService.counter_key(pid) for pid in product_ids]
+        args = [lines[pid] for pid in product_ids] + product_ids
+        HotStockService.run_script(RESTORE_SCRIPT, keys, args)
+
+    @staticmethod
+    def load_available(product_ids):
+        """Available stock (on hand minus holds) from MySQL"""
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        rows = execute_query(f"""
+            SELECT product_id, quantity - reserved_quantity as available
+            FROM inventory
+            WHERE product_id IN ({placeholders})
+        """, tuple(product_ids), fetch_all=True)
+        return {row['product_id']: int(row['available']) for row in rows}
+
+    @staticmethod
+    def enable(product_id):
+        """Flag a product as hot and seed its counter from MySQL"""
+        HotStockService.flush()
+        available = HotStockService.load_available([product_id])
+        if product_id not in available:
+            return None
+
+        redis_client = CacheService.get_redis()
+        redis_client.set(HotStockService.counter_key(product_id), available[product_id])
+        redis_client.sadd(HotStockService.key('products'), product_id)
+        return available[product_id]
+
+    @staticmethod
+    def disable(product_id):
+        """Move a product back to MySQL-only stock once its decrements are written"""
+        redis_client = CacheService.get_redis()
+        redis_client.srem(HotStockService.key('products'), product_id)
+        HotStockService.flush()
+        redis_client.delete(HotStockService.counter_key(product_id))
+
+    @staticmethod
+    def worker_lock(blocking=True):
+        """Redis lock serialising flushes across processes"""
+        return CacheService.get_redis().lock(
+            HotStockService.key('worker_lock'),
+            timeout=60,
+            blocking=blocking,
+            blocking_timeout=10
+        )
+
+    @staticmethod
+    def flush():
+        """Write pending decrements to MySQL now (used when flags change)"""
+        with HotStockService.worker_lock():
+            return HotStockService.apply_pending()
+
+    @staticmethod
+    def sync():
+        """Flush and reconcile now; returns the drift that was corrected"""
+        with HotStockService.worker_lock():
+            HotStockService.apply_pending()
+            return HotStockService.reconcile()
+
+    @staticmethod
+    def apply_pending():
+        """
+        Write pending decrements to MySQL as one batch; hold worker_lock()
+
+        Returns the number of products updated (0 when there was nothing to do
+        or the batch had already been applied before a crash).
+        """
+        from shared.inventory_service import InventoryService
+
+        redis_client = CacheService.get_redis()
+        inflight_key = HotStockService.key('inflight')
+        raw = HotStockService.run_script(
+            DRAIN_SCRIPT,
+            [HotStockService.key('pending'), inflight_key],
+            [str(uuid.uuid4())]
+        )
+        if not raw:
+            return 0
+
+        fields = dict(zip(raw[0::2], raw[1::2]))
+        batch_id = fields.pop(b'batch_id').decode()
+        deltas = {int(pid): -int(value) for pid, value in fields.items() if int(value) != 0}
+
+        applied = 0
+        with transaction() as tx:
+            already_applied = tx.execute("""
+                SELECT batch_id FROM hot_stock_batches WHERE batch_id = %s
+            """, (batch_id,), fetch_one=True)
+
+            if not already_applied:
+                tx.execute("""
+                    INSERT INTO hot_stock_batches (batch_id, product_count, applied_at)
+                    VALUES (%s, %s, NOW())
+                """, (batch_id, len(deltas)))
+                if deltas:
+                    InventoryService.lock_inventory(tx, deltas.keys())
+                    InventoryService.bulk_adjust(tx, deltas, {})
+                    applied = len(deltas)
+
+        redis_client.delete(inflight_key)
+        return applied
+
+    @staticmethod
+    def reconcile(fix=True):
+        """
+        Compare every hot counter with MySQL and correct drift
+
+        Expected counter = MySQL available - decrements not yet flushed.
+        Run under worker_lock() after apply_pending() so no batch is in flight. Returns {product_id: drift}
+        for counters that were off.
+        """
+        product_ids = sorted(HotStockService.get_hot_products())
+        if not product_ids:
+            return {}
+
+        available = HotStockService.load_available(product_ids)
+        product_ids = [pid for pid in product_ids if pid in available]
+        if not product_ids:
+            return {}
+
+        if not fix:
+            redis_client = CacheService.get_redis()
+            counters = redis_client.mget([HotStockService.counter_key(pid) for pid in product_ids])
+            pending = redis_client.hmget(HotStockService.key('pending'), product_ids)
+            drifts = {}
+            for pid, counter, pend in zip(product_ids, counters, pending):
+                expected = available[pid] - int(pend or 0)
+                if counter is not None and expected != int(counter):
+                    drifts[pid] = expected - int(counter)
+            return drifts
+
+        keys = [HotStockService.key('pending')] + [HotStockService.counter_key(pid) for pid in product_ids]
+        args = [available[pid] for pid in product_ids] + product_ids
+        result = HotStockService.run_script(RECONCILE_SCRIPT, keys, args)
+
+        drifts = {pid: int(drift) for pid, drift in zip(product_ids, result) if int(drift) != 0}
+        if drifts:
+            logger.warning(f"Hot stock drift corrected: {drifts}")
+        return drifts
+
+    @staticmethod
+    def get_status():
+        """Counters, pending decrements and MySQL stock for monitoring"""
+        product_ids = sorted(HotStockService.get_hot_products())
+        if not product_ids:
+            return []
+
+        redis_client = CacheService.get_redis()
+        counters = redis_client.mget([HotStockService.counter_key(pid) for pid in product_ids])
+        pending = redis_client.hmget(HotStockService.key('pending'), product_ids)
+        available = HotStockService.load_available(product_ids)
+
+        status = []
+        for pid, counter, pend in zip(product_ids, counters, pending):
+            counter = int(counter) if counter is not None else None
+            pend = int(pend or 0)
+            mysql_available = available.get(pid)
+            status.append({
+                'product_id': pid,
+                'redis_stock': counter,
+                'pending_decrements': pend,
+                'mysql_available': mysql_available,
+                'drift': (mysql_available - pend - counter)
+                         if counter is not None and mysql_available is not None else None
+            })
+        return status
+
+class HotStockWorker:
+    """Background thread that flushes hot stock decrements and reconciles counters"""
+
+    def __init__(self, app, interval_seconds=2, reconcile_every=30):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self.reconcile_every = reconcile_every
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run, name='hot-stock-worker', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        cycles = 0
+        while not self.stop_event.wait(self.interval_seconds):
+            cycles += 1
+            try:
+                with self.app.app_context():
+                    # Only one worker across processes flushes at a time
+                    lock = HotStockService.worker_lock(blocking=False)
+                    if not lock.acquire():
+                        continue
+                    try:
+                        HotStockService.apply_pending()
+                        if cycles * self.interval_seconds >= self.reconcile_every:
+                            cycles = 0
+                            HotStockService.reconcile()
+                    finally:
+                        lock.release()
+            except Exception as e:
+                logger.error(f"Hot stock worker failed: {str(e)}")
+
+hot_stock_service = HotStockService()
@@ -0,0 +1,123 @@
+"""
+Idempotency-Key support for mutating endpoints
+
+A client that may retry (the mobile app on a flaky network) sends the same
+Idempotency-Key header with every attempt of one logical request. The first
+attempt runs; its response is stored in Redis and replayed for the retries,
+so a duplicate checkout costs one Redis round trip instead of a new order.
+
+A retry that arrives while the first attempt is still running waits for it
+and replays its response. Reusing a key for a different request body is
+rejected with 422. 5xx responses are not stored, so those can be retried.
+"""
+from functools import wraps
+from flask import request, jsonify, current_app, make_response
+import hashlib
+import json
+import logging
+import time
+from shared.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+def request_fingerprint():
+    """Hash of what makes a request the same request: method, path and body"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.full_path.encode())
+    digest.update(request.get_data() or b'')
+    return digest.hexdigest()
+
+def replay(record):
+    response = make_response(record['body'], record['status'])
+    response.headers['Content-Type'] = record.get('content_type') or 'application/json'
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def wait_for_record(redis_client, redis_key, timeout):
+    """Poll until the first request stores its response, or give up after timeout"""
+    deadline = time.time() + timeout
+    delay = 0.02
+    while True:
+        raw = redis_client.get(redis_key)
+        record = json.loads(raw) if raw else None
+        if record is None or record['state'] == 'done' or time.time() >= deadline:
+            return record
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+
+def idempotent(f):
+    """
+    Honour an Idempotency-Key header; apply below the token decorator
+
+    Keys are scoped to the endpoint and the authenticated principal (the first
+    argument passed by user_token_required/admin_token_required).
+    """
+    @wraps(f)
+    def decorated(principal_id, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(principal_id, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': 'Idempotency-Key is too long'}), 400
+
+        key_hash = hashlib.sha256(key.encode()).hexdigest()
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        redis_key = f"{prefix}idempotency:{request.endpoint}:{principal_id}:{key_hash}"
+        fingerprint = request_fingerprint()
+
+        ttl = current_app.config.get('IDEMPOTENCY_TTL_SECONDS', 86400)
+        lock_ttl = current_app.config.get('IDEMPOTENCY_LOCK_SECONDS', 60)
+        wait_timeout = current_app.config.get('IDEMPOTENCY_WAIT_SECONDS', 10)
+
+        try:
+            redis_client = CacheService.get_redis()
+            claimed = redis_client.set(
+                redis_key,
+                json.dumps({'state': 'processing', 'fingerprint': fingerprint}),
+                nx=True, ex=lock_ttl
+            )
+        except Exception as e:
+            # Without Redis the request still works, just without duplicate protection
+            logger.warning(f"Idempotency store unavailable: {str(e)}")
+            return f(principal_id, *args, **kwargs)
+
+        if not claimed:
+            record = wait_for_record(redis_client, redis_key, wait_timeout)
+            if record is None:
+                # The first attempt failed and released the key; this one may run
+                return decorated(principal_id, *args, **kwargs)
+            if record['fingerprint'] != fingerprint:
+                return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+            if record['state'] != 'done':
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            return replay(record)
+
+        try:
+            response = make_response(f(principal_id, *args, **kwargs))
+        except Exception:
+            redis_client.delete(redis_key)
+            raise
+
+        if response.status_code >= 500:
+            redis_client.delete(redis_key)
+            return response
+
+        try:
+            redis_client.set(redis_key, json.dumps({
+                'state': 'done',
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'body': response.get_data(as_text=True),
+                'content_type': response.headers.get('Content-Type')
+            }), ex=ttl)
+        except Exception as e:
+            # The handler has committed; its response stands. Retries wait on
+            # the 'processing' claim until it expires after lock_ttl
+            logger.warning(f"Could not store idempotent response: {str(e)}")
+        return response
+
+    return decorated
@@ -6,6 +6,8 @@ from shared.email_service import email_service
 from config import Config
 import logging
 
+logger = logging.getLogger(__name__)
+
 def check_and_send_low_stock_alerts():
     """
     Check for low stock products and send email alerts to admins
@@ -32,7 +34,7 @@ def check_and_send_low_stock_alerts():
         """, fetch_all=True)
         
         if not admin_emails:
-            logging.warning("No admin emails found for low stock alerts")
+            logger.warning("No admin emails found for low stock alerts")
             return False
         
         # Send alerts to each admin
@@ -46,17 +48,17 @@ def check_and_send_low_stock_alerts():
                     )
                     
                     if email_sent:
-                        logging.info(f"Low stock alert sent for {product['product_name']} to {admin['email']}")
+                        logger.info(f"Low stock alert sent for {product['product_name']} to {admin['email']}")
                     else:
-                        logging.warning(f"Failed to send low stock alert for {product['product_name']}")
+                        logger.warning(f"Failed to send low stock alert for {product['product_name']}")
                         
                 except Exception as e:
-                    logging.error(f"Error sending low stock alert: {str(e)}")
+                    logger.error(f"Error sending low stock alert: {str(e)}")
         
         return True
         
     except Exception as e:
-        logging.error(f"Error in low stock check: {str(e)}")
+        logger.error(f"Error in low stock check: {str(e)}")
         return False
 
 def send_low_stock_alert_for_product(product_id, current_stock):
@@ -98,13 +100,13 @@ def send_low_stock_alert_for_product(product_id, current_stock):
                 )
                 
                 if email_sent:
-                    logging.info(f"Low stock alert sent for {product['product_name']} (stock: {current_stock})")
+                    logger.info(f"Low stock alert sent for {product['product_name']} (stock: {current_stock})")
                 
             except Exception as e:
-                logging.error(f"Error sending individual low stock alert: {str(e)}")
+                logger.error(f"Error sending individual low stock alert: {str(e)}")
         
         return True
         
     except Exception as e:
-        logging.error(f"Error sending low stock alert for product {product_id}: {str(e)}")
+        logger.error(f"Error sending low stock alert for product {product_id}: {str(e)}")
         return False
\ No newline at end of file
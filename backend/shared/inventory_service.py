@@ -0,0 +1,324 @@
+"""
+Inventory reservation engine
+
+All stock changes for checkout go through here so that concurrent orders for
+the same products stay correct:
+
+- every operation locks the inventory rows it touches with SELECT ... FOR UPDATE
+  in ascending product_id order (then any hold rows), so two checkouts can
+  never wait on each other in opposite orders;
+- order lines are checked together and decremented with one UPDATE;
+- cart holds set aside stock for a user for a limited time. They are counted
+  in inventory.reserved_quantity and released by HoldSweeper when they expire;
+- products flagged as hot skip the row lock entirely (see hot_stock_service).
+"""
+from datetime import datetime, timedelta
+import logging
+import threading
+from shared.models import transaction
+
+logger = logging.getLogger(__name__)
+
+class InventoryService:
+    @staticmethod
+    def merge_lines(lines):
+        """Collapse order lines into {product_id: quantity}, rejecting bad quantities"""
+        merged = {}
+        for line in lines:
+            product_id = int(line['product_id'])
+            quantity = int(line['quantity'])
+            if quantity <= 0:
+                raise ValueError(f"Invalid quantity {quantity} for product {product_id}")
+            merged[product_id] = merged.get(product_id, 0) + quantity
+        return merged
+
+    @staticmethod
+    def lock_inventory(tx, product_ids):
+        """Lock inventory rows in deterministic (ascending product_id) order"""
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        rows = tx.execute(f"""
+            SELECT product_id, quantity, reserved_quantity
+            FROM inventory
+            WHERE product_id IN ({placeholders})
+            ORDER BY product_id
+            FOR UPDATE
+        """, tuple(product_ids), fetch_all=True)
+        return {row['product_id']: row for row in rows}
+
+    @staticmethod
+    def lock_user_holds(tx, user_id, product_ids):
+        """Lock a user's holds on the given products; call after lock_inventory"""
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        rows = tx.execute(f"""
+            SELECT product_id, quantity
+            FROM inventory_holds
+            WHERE user_id = %s AND product_id IN ({placeholders})
+            ORDER BY product_id
+            FOR UPDATE
+        """, (user_id, *product_ids), fetch_all=True)
+        return {row['product_id']: row['quantity'] for row in rows}
+
+    @staticmethod
+    def check_lines(requested, stock, held):
+        """Per-line availability: what is on hand minus other users' holds"""
+        results = []
+        for product_id in sorted(requested):
+            row = stock.get(product_id)
+            own_hold = held.get(product_id, 0)
+            if row:
+                available = row['quantity'] - row['reserved_quantity'] + own_hold
+            else:
+                available = 0
+            results.append({
+                'product_id': product_id,
+                'requested': requested[product_id],
+                'available': max(available, 0),
+                'success': requested[product_id] <= available
+            })
+        return results
+
+    @staticmethod
+    def bulk_adjust(tx, quantity_deltas, reserved_deltas):
+        """Apply per-product deltas to quantity and reserved_quantity in one UPDATE"""
+        product_ids = sorted(set(quantity_deltas) | set(reserved_deltas))
+        cases = ' '.join(['WHEN %s THEN %s'] * len(product_ids))
+        placeholders = ', '.join(['%s'] * len(product_ids))
+
+        params = []
+        for product_id in product_ids:
+            params.extend([product_id, quantity_deltas.get(product_id, 0)])
+        for product_id in product_ids:
+            params.extend([product_id, reserved_deltas.get(product_id, 0)])
+        params.extend(product_ids)
+
+        tx.execute(f"""
+            UPDATE inventory
+            SET quantity = quantity + CASE product_id {cases} ELSE 0 END,
+                reserved_quantity = GREATEST(
+                    reserved_quantity + CASE product_id {cases} ELSE 0 END, 0
+                )
+            WHERE product_id IN ({placeholders})
+        """, tuple(params))
+
+    @staticmethod
+    def reserve_order_lines(tx, user_id, lines):
+        """
+        Take stock for an order inside the caller's transaction
+
+        Returns {'success': bool, 'lines': [...], 'stock': {product_id: new_quantity},
+        'hot': {product_id: quantity}}. Nothing is written unless every line can be
+        satisfied; the user's holds on the ordered products are consumed.
+
+        Products flagged in HotStockService are taken from their Redis counters
+        without locking MySQL rows. That stock is outside the transaction, so if
+        the order is not saved the caller must hand `hot` to release_hot_lines().
+        """
+        from shared.hot_stock_service import HotStockService
+
+        requested = InventoryService.merge_lines(lines)
+        hot_ids = HotStockService.get_hot_products() & set(requested)
+        cold = {pid: qty for pid, qty in requested.items() if pid not in hot_ids}
+        hot = {pid: qty for pid, qty in requested.items() if pid in hot_ids}
+
+        # Counters first: if they are unavailable the hot lines join the MySQL
+        # lines before any row is locked, so locks are still taken in one
+        # ascending pass
+        hot_reservation = None
+        if hot:
+            hot_reservation = HotStockService.reserve(hot)
+            if hot_reservation is None:
+                cold.update(hot)
+                hot = {}
+
+        try:
+            stock, held, results = {}, {}, []
+            if cold:
+                stock = InventoryService.lock_inventory(tx, cold.keys())
+                held = InventoryService.lock_user_holds(tx, user_id, cold.keys())
+                results = InventoryService.check_lines(cold, stock, held)
+            if hot:
+                results += hot_reservation['lines']
+
+            results.sort(key=lambda line: line['product_id'])
+            if not all(line['success'] for line in results):
+                if hot and hot_reservation['success']:
+                    HotStockService.restore(hot)
+                return {'success': False, 'lines': results, 'stock': {}, 'hot': {}}
+
+            if cold:
+                InventoryService.bulk_adjust(
+                    tx,
+                    {product_id: -quantity for product_id, quantity in cold.items()},
+                    {product_id: -quantity for product_id, quantity in held.items()}
+                )
+
+            if held:
+                placeholders = ', '.join(['%s'] * len(held))
+                tx.execute(f"""
+                    DELETE FROM inventory_holds
+                    WHERE user_id = %s AND product_id IN ({placeholders})
+                """, (user_id, *sorted(held)))
+        except Exception:
+            # The caller never sees `hot` if we raise, so give it back here
+            if hot and hot_reservation['success']:
+                HotStockService.restore(hot)
+            raise
+
+        new_stock = {
+            product_id: stock[product_id]['quantity'] - quantity
+            for product_id, quantity in cold.items()
+        }
+        if hot:
+            new_stock.update(hot_reservation['stock'])
+        return {'success': True, 'lines': results, 'stock': new_stock, 'hot': hot}
+
+    @staticmethod
+    def release_hot_lines(reservation):
+        """Undo the Redis part of a reservation whose order was rolled back"""
+        if reservation and reservation.get('hot'):
+            from shared.hot_stock_service import HotStockService
+            HotStockService.restore(reservation['hot'])
+
+    @staticmethod
+    def hold(user_id, lines, ttl_seconds=900):
+        """
+        Set aside stock for a user's cart until the hold expires
+
+        A new hold replaces the user's previous hold on the same product.
+        Lines that cannot be held are reported and left untouched.
+        """
+        from shared.hot_stock_service import HotStockService
+
+        requested = InventoryService.merge_lines(lines)
+        expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
+
+        # Hot products are first come, first served; they cannot be held
+        hot_ids = HotStockService.get_hot_products() & set(requested)
+        requested = {pid: qty for pid, qty in requested.items() if pid not in hot_ids}
+        if not requested:
+            return {'expires_at': expires_at, 'lines': []}
+
+        with transaction() as tx:
+            stock = InventoryService.lock_inventory(tx, requested.keys())
+            held = InventoryService.lock_user_holds(tx, user_id, requested.keys())
+            results = InventoryService.check_lines(requested, stock, held)
+
+            granted = [line for line in results if line['success']]
+            if granted:
+                InventoryService.bulk_adjust(tx, {}, {
+                    line['product_id']: line['requested'] - held.get(line['product_id'], 0)
+                    for line in granted
+                })
+                tx.execute_many("""
+                    INSERT INTO inventory_holds (user_id, product_id, quantity, expires_at, created_at)
+                    VALUES (%s, %s, %s, %s, NOW())
+                    ON DUPLICATE KEY UPDATE
+                        quantity = VALUES(quantity),
+                        expires_at = VALUES(expires_at)
+                """, [(user_id, line['product_id'], line['requested'], expires_at) for line in granted])
+
+        return {'expires_at': expires_at, 'lines': results}
+
+    @staticmethod
+    def release_holds(user_id, product_ids=None):
+        """Give back a user's held stock (all of it, or for some products)"""
+        with transaction() as tx:
+            if product_ids is None:
+                rows = tx.execute("""
+                    SELECT product_id FROM inventory_holds WHERE user_id = %s
+                """, (user_id,), fetch_all=True)
+                product_ids = [row['product_id'] for row in rows]
+
+            if not product_ids:
+                return 0
+
+            InventoryService.lock_inventory(tx, product_ids)
+            held = InventoryService.lock_user_holds(tx, user_id, product_ids)
+            if not held:
+                return 0
+
+            InventoryService.bulk_adjust(tx, {}, {
+                product_id: -quantity for product_id, quantity in held.items()
+            })
+            placeholders = ', '.join(['%s'] * len(held))
+            tx.execute(f"""
+                DELETE FROM inventory_holds
+                WHERE user_id = %s AND product_id IN ({placeholders})
+            """, (user_id, *sorted(held)))
+
+        return len(held)
+
+    @staticmethod
+    def release_expired_holds(batch_size=500):
+        """Release one batch of expired holds, returns how many were released"""
+        with transaction() as tx:
+            expired = tx.execute("""
+                SELECT DISTINCT product_id FROM inventory_holds
+                WHERE expires_at < NOW()
+                ORDER BY product_id
+                LIMIT %s
+            """, (batch_size,), fetch_all=True)
+            if not expired:
+                return 0
+
+            product_ids = [row['product_id'] for row in expired]
+            InventoryService.lock_inventory(tx, product_ids)
+
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            holds = tx.execute(f"""
+                SELECT hold_id, product_id, quantity FROM inventory_holds
+                WHERE product_id IN ({placeholders}) AND expires_at < NOW()
+                ORDER BY product_id
+                FOR UPDATE
+            """, tuple(product_ids), fetch_all=True)
+            if not holds:
+                return 0
+
+            released = {}
+            for hold in holds:
+                released[hold['product_id']] = released.get(hold['product_id'], 0) - hold['quantity']
+            InventoryService.bulk_adjust(tx, {}, released)
+
+            hold_ids = [hold['hold_id'] for hold in holds]
+            placeholders = ', '.join(['%s'] * len(hold_ids))
+            tx.execute(f"""
+                DELETE FROM inventory_holds WHERE hold_id IN ({placeholders})
+            """, tuple(hold_ids))
+
+        return len(holds)
+
+class HoldSweeper:
+    """Background thread that releases expired cart holds"""
+
+    def __init__(self, app, interval_seconds=30, batch_size=500):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run, name='inventory-hold-sweeper', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                with self.app.app_context():
+                    while InventoryService.release_expired_holds(self.batch_size) == self.batch_size:
+                        pass
+            except Exception as e:
+                logger.error(f"Inventory hold sweep failed: {str(e)}")
+
+inventory_service = InventoryService()
@@ -0,0 +1,298 @@
+"""
+Background jobs
+
+Side effects that do not need to finish before the response (emails, stock
+alerts, cache refreshes) are stored as rows in background_jobs and run by
+JobWorkerPool, a local thread pool fed by a poller. Because jobs are rows they
+can be enqueued inside the same transaction as the data they describe and
+survive restarts.
+
+Failed jobs are retried with exponential backoff; after max_attempts they are
+dead-lettered (status 'dead') and can be retried from the admin API.
+Handlers are registered with @job_handler('type') and must be safe to run
+more than once.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from shared.models import execute_query, transaction
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {}
+
+def job_handler(job_type):
+    """Register the function that runs jobs of this type; it receives the payload dict"""
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+class JobMetrics:
+    """Per job type counters for this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, job_type, outcome, seconds, error=None):
+        with self.lock:
+            stats = self.stats.setdefault(job_type, {
+                'succeeded': 0, 'retried': 0, 'dead_lettered': 0,
+                'total_seconds': 0.0, 'max_seconds': 0.0, 'last_error': None
+            })
+            stats[outcome] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            if error:
+                stats['last_error'] = error
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for job_type, stats in self.stats.items():
+                runs = stats['succeeded'] + stats['retried'] + stats['dead_lettered']
+                result[job_type] = {
+                    **stats,
+                    'total_seconds': round(stats['total_seconds'], 3),
+                    'max_seconds': round(stats['max_seconds'], 3),
+                    'avg_seconds': round(stats['total_seconds'] / runs, 3) if runs else 0
+                }
+            return result
+
+job_metrics = JobMetrics()
+
+class JobQueue:
+    wakeup = threading.Event()
+
+    @staticmethod
+    def enqueue(job_type, payload, tx=None, delay_seconds=0, max_attempts=5):
+        """
+        Add a job; pass the caller's transaction to commit it with the data it is about
+
+        Returns the job_id.
+        """
+        query = """
+            INSERT INTO background_jobs
+            (job_type, payload, status, attempts, max_attempts, run_after, created_at)
+            VALUES (%s, %s, 'pending', 0, %s, NOW() + INTERVAL %s SECOND, NOW())
+        """
+        params = (job_type, json.dumps(payload, default=str), max_attempts, delay_seconds)
+        if tx is not None:
+            job_id = tx.execute(query, params, get_insert_id=True)
+        else:
+            job_id = execute_query(query, params, get_insert_id=True)
+            JobQueue.notify()
+        return job_id
+
+    @staticmethod
+    def notify():
+        """Wake the local poller (call after committing a transaction that enqueued jobs)"""
+        JobQueue.wakeup.set()
+
+    @staticmethod
+    def claim(worker_id, limit):
+        """Lock up to `limit` due jobs for this worker"""
+        with transaction() as tx:
+            jobs = tx.execute("""
+                SELECT job_id, job_type, payload, attempts, max_attempts
+                FROM background_jobs
+                WHERE status = 'pending' AND run_after <= NOW()
+                ORDER BY run_after, job_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (limit,), fetch_all=True)
+            if not jobs:
+                return []
+
+            placeholders = ', '.join(['%s'] * len(jobs))
+            tx.execute(f"""
+                UPDATE background_jobs
+                SET status = 'running', locked_by = %s, locked_at = NOW(),
+                    attempts = attempts + 1
+                WHERE job_id IN ({placeholders})
+            """, (worker_id, *[job['job_id'] for job in jobs]))
+
+        for job in jobs:
+            job['attempts'] += 1
+        return jobs
+
+    @staticmethod
+    def complete(job_id, duration_ms):
+        execute_query("""
+            UPDATE background_jobs
+            SET status = 'done', finished_at = NOW(), duration_ms = %s,
+                last_error = NULL, locked_by = NULL
+            WHERE job_id = %s
+        """, (duration_ms, job_id))
+
+    @staticmethod
+    def fail(job, error, duration_ms, base_backoff=5):
+        """Schedule a retry, or dead-letter the job when it is out of attempts; returns True if dead"""
+        if job['attempts'] >= job['max_attempts']:
+            execute_query("""
+                UPDATE background_jobs
+                SET status = 'dead', finished_at = NOW(), duration_ms = %s,
+                    last_error = %s, locked_by = NULL
+                WHERE job_id = %s
+            """, (duration_ms, error[:2000], job['job_id']))
+            return True
+
+        backoff = base_backoff * (2 ** (job['attempts'] - 1))
+        execute_query("""
+            UPDATE background_jobs
+            SET status = 'pending', run_after = NOW() + INTERVAL %s SECOND,
+                duration_ms = %s, last_error = %s, locked_by = NULL
+            WHERE job_id = %s
+        """, (backoff, duration_ms, error[:2000], job['job_id']))
+        return False
+
+    @staticmethod
+    def reclaim_stale(visibility_timeout=300):
+        """Return jobs whose worker died mid-run to the queue (or dead-letter them)"""
+        execute_query("""
+            UPDATE background_jobs
+            SET status = IF(attempts >= max_attempts, 'dead', 'pending'),
+                last_error = 'Worker stopped while running the job',
+                locked_by = NULL
+            WHERE status = 'running' AND locked_at < NOW() - INTERVAL %s SECOND
+        """, (visibility_timeout,))
+
+    @staticmethod
+    def purge_finished(keep_days=7):
+        """Delete completed jobs older than keep_days; dead jobs are kept for inspection"""
+        return execute_query("""
+            DELETE FROM background_jobs
+            WHERE status = 'done' AND finished_at < NOW() - INTERVAL %s DAY
+        """, (keep_days,))
+
+    @staticmethod
+    def retry_dead(job_id):
+        """Put a dead-lettered job back on the queue with a fresh set of attempts"""
+        return execute_query("""
+            UPDATE background_jobs
+            SET status = 'pending', attempts = 0, run_after = NOW(),
+                finished_at = NULL, last_error = NULL
+            WHERE job_id = %s AND status = 'dead'
+        """, (job_id,))
+
+    @staticmethod
+    def get_queue_stats():
+        """Queue depth per type and status, plus the age of the oldest due job"""
+        rows = execute_query("""
+            SELECT job_type, status, COUNT(*) as jobs,
+                   TIMESTAMPDIFF(SECOND, MIN(run_after), NOW()) as oldest_seconds
+            FROM background_jobs
+            WHERE status != 'done'
+            GROUP BY job_type, status
+        """, fetch_all=True)
+
+        stats = {}
+        for row in rows:
+            entry = stats.setdefault(row['job_type'], {})
+            entry[row['status']] = row['jobs']
+            if row['status'] == 'pending':
+                entry['oldest_pending_seconds'] = max(row['oldest_seconds'] or 0, 0)
+        return stats
+
+    @staticmethod
+    def get_dead_jobs(limit=50):
+        return execute_query("""
+            SELECT job_id, job_type, payload, attempts, last_error, created_at, finished_at
+            FROM background_jobs
+            WHERE status = 'dead'
+            ORDER BY finished_at DESC
+            LIMIT %s
+        """, (limit,), fetch_all=True)
+
+class JobWorkerPool:
+    """Poller thread that claims jobs and runs them on a local thread pool"""
+
+    def __init__(self, app, workers=4, poll_interval=1.0, visibility_timeout=300, keep_days=7):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.keep_days = keep_days
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.executor = None
+        self.slots = threading.Semaphore(workers)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job-worker')
+        self.thread = threading.Thread(target=self.run, name='job-poller', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        JobQueue.notify()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+    def free_slots(self):
+        """Take every free worker slot without blocking"""
+        taken = 0
+        while taken < self.workers and self.slots.acquire(blocking=False):
+            taken += 1
+        return taken
+
+    def run(self):
+        last_maintenance = 0
+        while not self.stop_event.is_set():
+            jobs = []
+            try:
+                with self.app.app_context():
+                    if time.time() - last_maintenance > 60:
+                        last_maintenance = time.time()
+                        JobQueue.reclaim_stale(self.visibility_timeout)
+                        JobQueue.purge_finished(self.keep_days)
+
+                    slots = self.free_slots()
+                    try:
+                        jobs = JobQueue.claim(self.worker_id, slots) if slots else []
+                    finally:
+                        # Hand back the slots no job was claimed for
+                        for _ in range(slots - len(jobs)):
+                            self.slots.release()
+                    for job in jobs:
+                        self.executor.submit(self.run_job, job)
+            except Exception as e:
+                logger.error(f"Job poller failed: {str(e)}")
+
+            if not jobs:
+                JobQueue.wakeup.wait(self.poll_interval)
+                JobQueue.wakeup.clear()
+
+    def run_job(self, job):
+        started = time.time()
+        try:
+            with self.app.app_context():
+                handler = JOB_HANDLERS.get(job['job_type'])
+                try:
+                    if handler is None:
+                        raise LookupError(f"No handler registered for job type {job['job_type']}")
+                    handler(json.loads(job['payload']))
+                except Exception as e:
+                    seconds = time.time() - started
+                    error = f"{type(e).__name__}: {str(e)}"
+                    dead = JobQueue.fail(job, error, int(seconds * 1000))
+                    job_metrics.record(job['job_type'], 'dead_lettered' if dead else 'retried', seconds, error)
+                    logger.warning(f"Job {job['job_id']} ({job['job_type']}) failed "
+                                    f"attempt {job['attempts']}/{job['max_attempts']}: {error}")
+                    return
+
+                seconds = time.time() - started
+                JobQueue.complete(job['job_id'], int(seconds * 1000))
+                job_metrics.record(job['job_type'], 'succeeded', seconds)
+        except Exception as e:
+            logger.error(f"Job {job['job_id']} bookkeeping failed: {str(e)}")
+        finally:
+            self.slots.release()
@@ -0,0 +1,99 @@
+"""
+Application logging
+
+Request threads only put records on an in-memory queue (QueueHandler); one
+QueueListener thread per process formats them and does the blocking stdout
+write. Records are one JSON object per line with the logger name, level,
+message and any `extra={...}` fields, so they can be searched by field.
+
+DEBUG records from busy paths (socket joins, stock broadcasts, failed
+logins) opt in to sampling with extra={'sampled': True}; only
+LOG_DEBUG_SAMPLE_RATE of those are kept. Every other record is subject only
+to the levels: LOG_LEVEL for everything, overridden per module by
+LOG_LEVELS.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else came in through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'taskName'
+}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class DebugSampler(logging.Filter):
+    """Keeps a share of DEBUG records marked sampled; everything else passes"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1 or not getattr(record, 'sampled', False):
+            return True
+        return random.random() < self.rate
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps `extra` fields and the traceback separate"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+listener = None
+
+def setup_logging(app):
+    """Route all logging through the queue; safe to call once per app"""
+    global listener
+    config = app.config
+    root = logging.getLogger()
+
+    if listener is None:
+        stream = logging.StreamHandler(sys.stdout)
+        if config.get('LOG_FORMAT', 'json') == 'json':
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+        log_queue = queue.SimpleQueue()
+        handler = StructuredQueueHandler(log_queue)
+        handler.addFilter(DebugSampler(config.get('LOG_DEBUG_SAMPLE_RATE', 0.01)))
+
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+
+        listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+
+    root.setLevel(config.get('LOG_LEVEL', 'INFO'))
+    for name, level in config.get('LOG_LEVELS', {}).items():
+        logging.getLogger(name).setLevel(level)
+    return listener
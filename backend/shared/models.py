@@ -1,8 +1,13 @@
 import mysql.connector
+from contextlib import contextmanager
 from datetime import datetime
 import uuid
 import os
 import re
+import logging
+
+logger = logging.getLogger(__name__)
+
 # Database connection configuration
 class Config:
     DB_HOST = os.environ.get('DB_HOST', 'localhost')
@@ -102,12 +107,12 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False, get_inse
     except mysql.connector.Error as e:
         if conn:
             conn.rollback()
-        print(f"Database error: {e}")
+        logger.error(f"Database error: {e}")
         raise e
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"Unexpected error: {e}")
+        logger.error(f"Unexpected error: {e}")
         raise e
     finally:
         if cursor:
@@ -115,6 +120,61 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False, get_inse
         if conn:
             conn.close()
 
+class Transaction:
+    """Runs several statements on one connection so they commit or roll back together"""
+    
+    def __init__(self, cursor):
+        self.cursor = cursor
+    
+    def execute(self, query, params=None, fetch_one=False, fetch_all=False, get_insert_id=False):
+        """Same return conventions as execute_query, without committing"""
+        validate_query_security(query, params)
+        
+        if params is None:
+            self.cursor.execute(query)
+        elif isinstance(params, (dict, list, tuple)):
+            self.cursor.execute(query, params)
+        else:
+            self.cursor.execute(query, (params,))
+        
+        if fetch_one:
+            return self.cursor.fetchone()
+        if fetch_all:
+            return self.cursor.fetchall()
+        if get_insert_id:
+            return self.cursor.lastrowid
+        return self.cursor.lastrowid if query.strip().upper().startswith('INSERT') else self.cursor.rowcount
+    
+    def execute_many(self, query, params_list):
+        """Run one statement for every parameter tuple, returns affected rows"""
+        validate_query_security(query, params_list)
+        if not params_list:
+            return 0
+        self.cursor.executemany(query, params_list)
+        return self.cursor.rowcount
+
+@contextmanager
+def transaction():
+    """
+    Open a connection for a multi-statement unit of work
+    
+    Usage:
+        with transaction() as tx:
+            tx.execute("UPDATE ...", params)
+            tx.execute("INSERT ...", params)
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        yield Transaction(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
 class BaseModel:
     """Base model with common utilities"""
     
@@ -173,33 +233,230 @@ class ProductModel(BaseModel):
             WHERE p.product_id = %s AND p.status = 'active'
         """, (product_id,), fetch_one=True)
 
+class ReviewModel(BaseModel):
+    """Review model with rating summary and paginated review access"""
+
+    @staticmethod
+    def format_rating_summary(row):
+        """Turn a product_rating_summary row into the API rating structure"""
+        if not row:
+            row = {}
+
+        rating_count = int(row.get('rating_count') or 0)
+        rating_sum = int(row.get('rating_sum') or 0)
+
+        return {
+            'average': round(rating_sum / rating_count, 1) if rating_count else 0,
+            'total_reviews': rating_count,
+            'histogram': {str(star): int(row.get(f'star_{star}') or 0) for star in range(1, 6)}
+        }
+
+    @staticmethod
+    def refresh_rating_summary(product_id, tx=None):
+        """Recompute the aggregate row for one product from its approved reviews"""
+        run = tx.execute if tx else execute_query
+        run("""
+            INSERT INTO product_rating_summary (
+                product_id, rating_sum, rating_count,
+                star_1, star_2, star_3, star_4, star_5, updated_at
+            )
+            SELECT %s,
+                   COALESCE(SUM(rating), 0), COUNT(*),
+                   COALESCE(SUM(rating = 1), 0), COALESCE(SUM(rating = 2), 0),
+                   COALESCE(SUM(rating = 3), 0), COALESCE(SUM(rating = 4), 0),
+                   COALESCE(SUM(rating = 5), 0), NOW()
+            FROM reviews
+            WHERE product_id = %s AND status = 'approved'
+            ON DUPLICATE KEY UPDATE
+                rating_sum = VALUES(rating_sum),
+                rating_count = VALUES(rating_count),
+                star_1 = VALUES(star_1), star_2 = VALUES(star_2),
+                star_3 = VALUES(star_3), star_4 = VALUES(star_4),
+                star_5 = VALUES(star_5), updated_at = VALUES(updated_at)
+        """, (product_id, product_id))
+    
+    @staticmethod
+    def apply_rating_change(tx, product_id, rating, delta):
+        """
+        Add (delta=1) or remove (delta=-1) one approved rating from the aggregate
+        
+        Must run inside the same transaction as the review write so the summary
+        never disagrees with the reviews table after a commit.
+        """
+        rating = int(rating)
+        if rating < 1 or rating > 5:
+            raise ValueError(f"Rating out of range: {rating}")
+        
+        existing = tx.execute("""
+            SELECT product_id FROM product_rating_summary
+            WHERE product_id = %s
+            FOR UPDATE
+        """, (product_id,), fetch_one=True)
+        
+        # No row yet: build it from reviews, which already include this change
+        if not existing:
+            ReviewModel.refresh_rating_summary(product_id, tx)
+            return
+        
+        star_deltas = [delta if star == rating else 0 for star in range(1, 6)]
+        tx.execute("""
+            UPDATE product_rating_summary
+            SET rating_sum = rating_sum + %s,
+                rating_count = rating_count + %s,
+                star_1 = star_1 + %s, star_2 = star_2 + %s, star_3 = star_3 + %s,
+                star_4 = star_4 + %s, star_5 = star_5 + %s,
+                updated_at = NOW()
+            WHERE product_id = %s
+        """, (rating * delta, delta, *star_deltas, product_id))
+    
+    @staticmethod
+    def rebuild_rating_summaries(dry_run=False):
+        """
+        Recompute every aggregate row from reviews and repair the ones that drifted
+        
+        Returns the list of product IDs whose stored summary was wrong.
+        """
+        fresh_rows = execute_query("""
+            SELECT product_id,
+                   COALESCE(SUM(rating), 0) as rating_sum, COUNT(*) as rating_count,
+                   COALESCE(SUM(rating = 1), 0) as star_1, COALESCE(SUM(rating = 2), 0) as star_2,
+                   COALESCE(SUM(rating = 3), 0) as star_3, COALESCE(SUM(rating = 4), 0) as star_4,
+                   COALESCE(SUM(rating = 5), 0) as star_5
+            FROM reviews
+            WHERE status = 'approved'
+            GROUP BY product_id
+        """, fetch_all=True)
+        
+        stored_rows = execute_query("""
+            SELECT product_id, rating_sum, rating_count, star_1, star_2, star_3, star_4, star_5
+            FROM product_rating_summary
+        """, fetch_all=True)
+        
+        columns = ('rating_sum', 'rating_count', 'star_1', 'star_2', 'star_3', 'star_4', 'star_5')
+        empty = tuple(0 for _ in columns)
+        fresh = {row['product_id']: tuple(int(row[col]) for col in columns) for row in fresh_rows}
+        stored = {row['product_id']: tuple(int(row[col]) for col in columns) for row in stored_rows}
+        
+        drifted = [
+            product_id for product_id in set(fresh) | set(stored)
+            if fresh.get(product_id, empty) != stored.get(product_id)
+        ]
+        
+        if not dry_run:
+            # The scan above is only a candidate list; each product is recomputed
+            # under its summary row lock, the lock apply_rating_change takes, so
+            # a review committed meanwhile is never overwritten with stale counts
+            for product_id in drifted:
+                with transaction() as tx:
+                    tx.execute("""
+                        SELECT product_id FROM product_rating_summary
+                        WHERE product_id = %s
+                        FOR UPDATE
+                    """, (product_id,), fetch_one=True)
+                    ReviewModel.refresh_rating_summary(product_id, tx)
+        
+        return sorted(drifted)
+    
+    @staticmethod
+    def get_rating_summary(product_id):
+        """Get average, count and 1-5 star histogram for a product"""
+        row = execute_query("""
+            SELECT rating_sum, rating_count, star_1, star_2, star_3, star_4, star_5
+            FROM product_rating_summary
+            WHERE product_id = %s
+        """, (product_id,), fetch_one=True)
+
+        # Products reviewed before the aggregate existed get their row on first read
+        if not row:
+            ReviewModel.refresh_rating_summary(product_id)
+            row = execute_query("""
+                SELECT rating_sum, rating_count, star_1, star_2, star_3, star_4, star_5
+                FROM product_rating_summary
+                WHERE product_id = %s
+            """, (product_id,), fetch_one=True)
+
+        return ReviewModel.format_rating_summary(row)
+
+    @staticmethod
+    def get_approved_page(product_id, page=1, per_page=10):
+        """Get one page of approved reviews, newest first"""
+        offset = (page - 1) * per_page
+
+        reviews = execute_query("""
+            SELECT r.review_id, r.rating, r.title, r.comment, r.created_at,
+                   r.helpful_count, u.first_name,
+                   CONCAT(u.first_name, ' ', LEFT(u.last_name, 1), '.') as user_name
+            FROM reviews r
+            JOIN users u ON r.user_id = u.user_id
+            WHERE r.product_id = %s AND r.status = 'approved'
+            ORDER BY r.created_at DESC, r.review_id DESC
+            LIMIT %s OFFSET %s
+        """, (product_id, per_page, offset), fetch_all=True)
+
+        for review in reviews:
+            if review.get('created_at'):
+                review['created_at'] = review['created_at'].strftime('%B %d, %Y')
+
+        return reviews
+
+    @staticmethod
+    def build_pagination(page, per_page, total):
+        """Pagination block shared by product detail and the reviews endpoint"""
+        return {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page,
+            'has_next': page * per_page < total
+        }
+
 class UserModel(BaseModel):
     """User model with database operations"""
     
     @staticmethod
     def create(email, password_hash, first_name, last_name, phone, referral_code=None):
-        """Create new user"""
+        """Create new user; returns None when the email is already registered"""
         user_id = UserModel.create_id()
         
-        execute_query("""
-            INSERT INTO users (user_id, email, password_hash, first_name, last_name, phone, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (user_id, email, password_hash, first_name, last_name, phone, UserModel.current_time()))
-        
-        # Handle referral if provided
-        if referral_code:
-            referrer = execute_query("""
-                SELECT user_id FROM users WHERE referral_code = %s AND status = 'active'
-            """, (referral_code,), fetch_one=True)
+        with transaction() as tx:
+            # The unique key on email decides; a duplicate is a no-op update
+            tx.execute("""
+                INSERT INTO users (user_id, email, password_hash, first_name, last_name, phone, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE user_id = user_id
+            """, (user_id, email, password_hash, first_name, last_name, phone, UserModel.current_time()))
+            if not UserModel.inserted(tx):
+                return None
             
-            if referrer:
-                execute_query("""
-                    INSERT INTO referral_uses (referrer_id, referred_user_id, created_at)
-                    VALUES (%s, %s, %s)
-                """, (referrer['user_id'], user_id, UserModel.current_time()))
+            # Handle referral if provided
+            if referral_code:
+                referrer = tx.execute("""
+                    SELECT user_id FROM users WHERE referral_code = %s AND status = 'active'
+                """, (referral_code,), fetch_one=True)
+                
+                if referrer:
+                    tx.execute("""
+                        INSERT INTO referral_uses (referrer_id, referred_user_id, created_at)
+                        VALUES (%s, %s, %s)
+                    """, (referrer['user_id'], user_id, UserModel.current_time()))
         
         return user_id
     
+    @staticmethod
+    def inserted(tx):
+        """Whether the last INSERT ... ON DUPLICATE KEY UPDATE added a row"""
+        # 1 for an insert, 0 for an unchanged duplicate (connections are opened
+        # without CLIENT_FOUND_ROWS, which would report the duplicate as 1)
+        return tx.execute("SELECT ROW_COUNT() as affected", fetch_one=True)['affected'] == 1
+    
+    @staticmethod
+    def get_credentials(email):
+        """user_id, password_hash and status for a login, read from idx_users_login alone"""
+        return execute_query("""
+            SELECT user_id, password_hash, status
+            FROM users WHERE email = %s
+        """, (email,), fetch_one=True)
+    
     @staticmethod
     def get_by_email(email):
         """Get user by email"""
@@ -0,0 +1,181 @@
+"""
+Order history with items and thumbnails
+
+A page of orders is built from three queries whatever its size: the orders
+themselves, their items (one IN query) and the primary image of every
+product on the page (one IN query). Pages are addressed by a keyset cursor on
+(created_at, order_id), so deep pages cost the same as the first one and an
+order placed while the user scrolls does not shift the rest.
+
+Pages are cached per user. Each user has a history version that is bumped
+whenever one of their orders is created or changes status; the version is
+part of the cache key, so every cached page of that user goes stale at once.
+"""
+from flask import current_app
+from datetime import datetime
+import base64
+import json
+import logging
+from shared.models import execute_query
+from shared.image_utils import convert_image_url
+
+logger = logging.getLogger(__name__)
+
+class InvalidCursor(ValueError):
+    pass
+
+class OrderHistoryService:
+    @staticmethod
+    def encode_cursor(order):
+        raw = json.dumps([order['created_at'].isoformat(), order['order_id']])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """(created_at, order_id) from a cursor, or raise InvalidCursor"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, order_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(created_at), str(order_id)
+        except (ValueError, TypeError):
+            raise InvalidCursor('Invalid cursor')
+
+    @staticmethod
+    def version_key(user_id):
+        return f'user_order_history_version_{user_id}'
+
+    @staticmethod
+    def get_version(user_id):
+        return int(current_app.cache.get(OrderHistoryService.version_key(user_id)) or 0)
+
+    @staticmethod
+    def invalidate(*user_ids):
+        """Mark every cached history page of these users stale"""
+        try:
+            cache = current_app.cache
+            for user_id in set(user_ids):
+                key = OrderHistoryService.version_key(user_id)
+                if cache.inc(key) is None:
+                    cache.set(key, 1, timeout=0)
+        except Exception as e:
+            logger.error(f"Order history invalidation error: {str(e)}")
+
+    @staticmethod
+    def load_orders(user_id, after, limit):
+        """One page of the user's orders, newest first, after the cursor position"""
+        query = """
+            SELECT o.order_id, o.order_number, o.status, o.payment_method, o.payment_status,
+                   o.subtotal, o.shipping_amount, o.discount_amount, o.total_amount,
+                   o.created_at, o.updated_at
+            FROM orders o
+            WHERE o.user_id = %s
+        """
+        params = [user_id]
+        if after:
+            created_at, order_id = after
+            query += """
+              AND (o.created_at < %s OR (o.created_at = %s AND o.order_id < %s))
+            """
+            params.extend([created_at, created_at, order_id])
+        query += """
+            ORDER BY o.created_at DESC, o.order_id DESC
+            LIMIT %s
+        """
+        params.append(limit)
+        return execute_query(query, tuple(params), fetch_all=True)
+
+    @staticmethod
+    def load_items(order_ids):
+        """Items of the given orders, in one query"""
+        placeholders = ', '.join(['%s'] * len(order_ids))
+        rows = execute_query(f"""
+            SELECT order_id, item_id, product_id, product_name, quantity, unit_price, total_price
+            FROM order_items
+            WHERE order_id IN ({placeholders})
+            ORDER BY order_id, item_id
+        """, tuple(order_ids), fetch_all=True)
+
+        items = {}
+        for row in rows:
+            items.setdefault(row.pop('order_id'), []).append(row)
+        return items
+
+    @staticmethod
+    def load_images(product_ids):
+        """Primary image URL per product, in one query"""
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        rows = execute_query(f"""
+            SELECT product_id, image_url
+            FROM product_images
+            WHERE product_id IN ({placeholders}) AND is_primary = 1
+        """, tuple(product_ids), fetch_all=True)
+        return {row['product_id']: convert_image_url(row['image_url']) for row in rows}
+
+    @staticmethod
+    def build_page(user_id, after, limit):
+        orders = OrderHistoryService.load_orders(user_id, after, limit + 1)
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+
+        items = OrderHistoryService.load_items([o['order_id'] for o in orders]) if orders else {}
+        product_ids = {item['product_id'] for lines in items.values() for item in lines}
+        images = OrderHistoryService.load_images(sorted(product_ids)) if product_ids else {}
+
+        records = []
+        for order in orders:
+            lines = []
+            for item in items.get(order['order_id'], []):
+                lines.append({
+                    'item_id': item['item_id'],
+                    'product_id': item['product_id'],
+                    'product_name': item['product_name'],
+                    'quantity': item['quantity'],
+                    'unit_price': float(item['unit_price']),
+                    'total_price': float(item['total_price']),
+                    'image_url': images.get(item['product_id'])
+                })
+            records.append({
+                'order_id': order['order_id'],
+                'order_number': order['order_number'],
+                'status': order['status'],
+                'payment_method': order['payment_method'],
+                'payment_status': order['payment_status'],
+                'subtotal': float(order['subtotal']),
+                'shipping_amount': float(order['shipping_amount']),
+                'discount_amount': float(order['discount_amount'] or 0),
+                'total_amount': float(order['total_amount']),
+                'created_at': order['created_at'].isoformat() if order['created_at'] else None,
+                'updated_at': order['updated_at'].isoformat() if order['updated_at'] else None,
+                'item_count': len(lines),
+                'items': lines
+            })
+
+        return {
+            'orders': records,
+            'next_cursor': OrderHistoryService.encode_cursor(orders[-1]) if has_more else None,
+            'has_more': has_more
+        }
+
+    @staticmethod
+    def get_page(user_id, cursor=None, limit=10):
+        """
+        One page of order history; pass the previous page's next_cursor for the next
+
+        Raises InvalidCursor for a cursor that was not issued by this service.
+        """
+        after = OrderHistoryService.decode_cursor(cursor) if cursor else None
+
+        version = OrderHistoryService.get_version(user_id)
+        cache_key = f"user_order_history_{user_id}_v{version}_{cursor or 'first'}_{limit}"
+        page = current_app.cache.get(cache_key)
+        if page is not None:
+            return page
+
+        page = OrderHistoryService.build_page(user_id, after, limit)
+        current_app.cache.set(
+            cache_key, page,
+            timeout=current_app.config.get('CACHE_TIMEOUT_ORDER_HISTORY', 600)
+        )
+        return page
+
+order_history_service = OrderHistoryService()
@@ -0,0 +1,95 @@
+"""
+Background job handlers for work that follows a committed order
+"""
+from flask import current_app
+import logging
+from shared.models import execute_query
+from shared.job_queue import job_handler
+
+logger = logging.getLogger(__name__)
+
+@job_handler('order_confirmation_email')
+def send_order_confirmation(payload):
+    if not current_app.config.get('SEND_ORDER_EMAILS', True):
+        return
+
+    from shared.email_service import email_service
+
+    user = execute_query("""
+        SELECT email, first_name, last_name FROM users WHERE user_id = %s
+    """, (payload['user_id'],), fetch_one=True)
+    if not user:
+        return
+
+    email_sent = email_service.send_order_confirmation(
+        order_id=payload['order_id'],
+        user_email=user['email'],
+        user_name=f"{user['first_name']} {user['last_name']}"
+    )
+    if not email_sent:
+        # Raising hands the job back to the queue for a retry
+        raise RuntimeError(f"Confirmation email for order {payload['order_number']} was not sent")
+
+@job_handler('low_stock_check')
+def check_low_stock(payload):
+    """Alert admins about products an order took to or below their minimum level"""
+    from shared.inventory_alerts import send_low_stock_alert_for_product
+
+    stock = {int(product_id): quantity for product_id, quantity in payload['stock'].items()}
+    placeholders = ', '.join(['%s'] * len(stock))
+    rows = execute_query(f"""
+        SELECT product_id, min_stock_level FROM inventory
+        WHERE product_id IN ({placeholders})
+    """, tuple(stock), fetch_all=True)
+
+    for row in rows:
+        current_stock = stock[row['product_id']]
+        if current_stock <= (row['min_stock_level'] or 0):
+            if not send_low_stock_alert_for_product(row['product_id'], current_stock):
+                logger.warning(f"Low stock alert not sent for product {row['product_id']}")
+
+@job_handler('order_status_emails')
+def send_order_status_emails(payload):
+    """
+    Tell every customer in a bulk status change, over one SMTP session
+
+    Addresses the mail server could not take are retried as a smaller job.
+    """
+    if not current_app.config.get('SEND_ORDER_EMAILS', True):
+        return
+
+    from shared.email_service import email_service
+    from shared.job_queue import JobQueue
+
+    order_ids = payload['order_ids']
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    rows = execute_query(f"""
+        SELECT o.order_id, o.order_number, o.total_amount, o.created_at,
+               u.email, u.first_name, u.last_name
+        FROM orders o
+        JOIN users u ON o.user_id = u.user_id
+        WHERE o.order_id IN ({placeholders})
+    """, tuple(order_ids), fetch_all=True)
+
+    emails = []
+    order_by_email = {}
+    for row in rows:
+        subject, html_content = email_service.build_order_status_email(
+            row, f"{row['first_name']} {row['last_name']}", payload['status']
+        )
+        emails.append((row['email'], subject, html_content))
+        order_by_email.setdefault(row['email'], []).append(row['order_id'])
+
+    failed = email_service.send_emails(emails)
+    if not failed:
+        return
+    if len(failed) == len(emails):
+        # Nothing went out, so retrying this same job resends nothing twice
+        raise RuntimeError(f"No order status emails were sent ({len(emails)} queued)")
+
+    retry_ids = [order_id for email in dict.fromkeys(failed) for order_id in order_by_email[email]]
+    JobQueue.enqueue('order_status_emails', {
+        'status': payload['status'],
+        'order_ids': retry_ids
+    }, delay_seconds=60)
+    logger.warning(f"{len(retry_ids)} order status emails re-queued after a partial send")
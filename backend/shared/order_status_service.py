@@ -0,0 +1,125 @@
+"""
+Order status changes in bulk
+
+Admins move many orders at once (e.g. everything packed today to 'shipped').
+Orders are processed in chunks; each chunk is one transaction that locks its
+orders, checks every move against ORDER_STATUS_TRANSITIONS, applies the valid
+ones with a single UPDATE, records them in order_status_history and enqueues
+one email job covering all the customers in the chunk. A chunk that fails
+rolls back on its own; its orders are reported as skipped and the remaining
+chunks still run.
+"""
+from flask import current_app
+import logging
+from shared.models import transaction
+from shared.job_queue import JobQueue
+from shared.order_history_service import OrderHistoryService
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATUS_TRANSITIONS = {
+    'pending': {'confirmed', 'processing', 'cancelled'},
+    'confirmed': {'processing', 'shipped', 'cancelled'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set()
+}
+
+class OrderStatusService:
+    @staticmethod
+    def can_transition(current_status, new_status):
+        return new_status in ORDER_STATUS_TRANSITIONS.get(current_status, set())
+
+    @staticmethod
+    def update_chunk(admin_id, order_ids, new_status, note=None, notify=True):
+        """Apply one chunk in its own transaction; returns (updated, skipped)"""
+        placeholders = ', '.join(['%s'] * len(order_ids))
+
+        with transaction() as tx:
+            orders = tx.execute(f"""
+                SELECT order_id, user_id, status FROM orders
+                WHERE order_id IN ({placeholders})
+                ORDER BY order_id
+                FOR UPDATE
+            """, tuple(order_ids), fetch_all=True)
+            found = {order['order_id']: order for order in orders}
+
+            updated = []
+            skipped = []
+            for order_id in order_ids:
+                order = found.get(order_id)
+                if not order:
+                    skipped.append({'order_id': order_id, 'reason': 'not_found'})
+                elif order['status'] == new_status:
+                    skipped.append({'order_id': order_id, 'status': order['status'], 'reason': 'unchanged'})
+                elif not OrderStatusService.can_transition(order['status'], new_status):
+                    skipped.append({'order_id': order_id, 'status': order['status'], 'reason': 'invalid_transition'})
+                else:
+                    updated.append(order)
+
+            if not updated:
+                return [], skipped
+
+            placeholders = ', '.join(['%s'] * len(updated))
+            tx.execute(f"""
+                UPDATE orders SET status = %s, updated_at = NOW()
+                WHERE order_id IN ({placeholders})
+            """, (new_status, *[order['order_id'] for order in updated]))
+
+            tx.execute_many("""
+                INSERT INTO order_status_history
+                (order_id, from_status, to_status, changed_by, note, created_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+            """, [
+                (order['order_id'], order['status'], new_status, admin_id, note)
+                for order in updated
+            ])
+
+            if notify:
+                JobQueue.enqueue('order_status_emails', {
+                    'status': new_status,
+                    'order_ids': [order['order_id'] for order in updated]
+                }, tx=tx)
+
+        return updated, skipped
+
+    @staticmethod
+    def bulk_update(admin_id, order_ids, new_status, note=None, notify=True):
+        """
+        Move many orders to new_status
+
+        Orders that do not exist, are already in new_status, cannot move
+        there or were in a chunk that failed are skipped and reported with a
+        reason; the rest are updated.
+        """
+        chunk_size = current_app.config.get('ORDER_STATUS_CHUNK_SIZE', 500)
+        order_ids = list(dict.fromkeys(order_ids))
+
+        updated = []
+        skipped = []
+        for start in range(0, len(order_ids), chunk_size):
+            chunk = order_ids[start:start + chunk_size]
+            try:
+                chunk_updated, chunk_skipped = OrderStatusService.update_chunk(
+                    admin_id, chunk, new_status, note, notify
+                )
+            except Exception as e:
+                # Earlier chunks are committed already; report this one instead of failing the lot
+                logger.error(f"Bulk status chunk failed: {str(e)}", extra={'orders': len(chunk)})
+                skipped.extend({'order_id': order_id, 'reason': 'error'} for order_id in chunk)
+                continue
+            updated.extend(chunk_updated)
+            skipped.extend(chunk_skipped)
+            OrderHistoryService.invalidate(*[order['user_id'] for order in chunk_updated])
+
+        if updated and notify:
+            JobQueue.notify()
+
+        return {
+            'status': new_status,
+            'updated': [order['order_id'] for order in updated],
+            'skipped': skipped
+        }
+
+order_status_service = OrderStatusService()
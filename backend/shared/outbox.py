@@ -0,0 +1,163 @@
+"""
+Transactional outbox for order, product, stock and review events
+
+Write paths call Outbox.add(tx, ...) inside the transaction that changes the
+data, so an event exists exactly when its change was committed. OutboxRelay
+picks events up in batches and turns them into side effects:
+
+- cache invalidation and stock broadcasts, merged per product for the batch;
+- review broadcasts;
+- email/alert jobs, enqueued into background_jobs.
+
+Events are deleted in the same transaction that enqueues their jobs, so jobs
+are created exactly once. Cache clears and broadcasts happen before that
+commit and may repeat if the relay dies mid-batch, which is harmless because
+they are idempotent.
+"""
+import json
+import logging
+import threading
+from shared.models import execute_query, transaction
+from shared.job_queue import JobQueue
+
+logger = logging.getLogger(__name__)
+
+class Outbox:
+    wakeup = threading.Event()
+
+    @staticmethod
+    def add(tx, event_type, payload):
+        """Record an event in the caller's transaction"""
+        return tx.execute("""
+            INSERT INTO outbox (event_type, payload, created_at)
+            VALUES (%s, %s, NOW())
+        """, (event_type, json.dumps(payload, default=str)))
+
+    @staticmethod
+    def notify():
+        """Wake the local relay (call after committing a transaction that added events)"""
+        Outbox.wakeup.set()
+
+    @staticmethod
+    def load_reviews(review_ids):
+        """Reviews shaped for the review_added broadcast, in one query"""
+        placeholders = ', '.join(['%s'] * len(review_ids))
+        rows = execute_query(f"""
+            SELECT r.review_id, r.product_id, r.rating, r.title, r.comment,
+                   DATE_FORMAT(r.created_at, '%M %d, %Y') as created_at,
+                   CONCAT(u.first_name, ' ', LEFT(u.last_name, 1), '.') as user_name
+            FROM reviews r
+            JOIN users u ON r.user_id = u.user_id
+            WHERE r.review_id IN ({placeholders})
+        """, tuple(review_ids), fetch_all=True)
+        return {row['review_id']: row for row in rows}
+
+    @staticmethod
+    def relay_batch(batch_size=100):
+        """Publish one batch of events; returns how many were relayed"""
+        from flask import current_app
+        from cache_utils import invalidate_products_cache, invalidate_review_cache
+
+        with transaction() as tx:
+            rows = tx.execute("""
+                SELECT outbox_id, event_type, payload FROM outbox
+                ORDER BY outbox_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,), fetch_all=True)
+            if not rows:
+                return 0
+
+            stock = {}
+            touched_products = set()
+            review_products = set()
+            new_reviews = []
+
+            for row in rows:
+                payload = json.loads(row['payload'])
+                event_type = row['event_type']
+
+                if event_type == 'order_placed':
+                    # Later events overwrite earlier ones, so the newest level wins
+                    for product_id, quantity in payload['stock'].items():
+                        stock[int(product_id)] = quantity
+                    JobQueue.enqueue('low_stock_check', {'stock': payload['stock']}, tx=tx)
+                    JobQueue.enqueue('order_confirmation_email', {
+                        'order_id': payload['order_id'],
+                        'order_number': payload['order_number'],
+                        'user_id': payload['user_id']
+                    }, tx=tx)
+                elif event_type == 'product_updated':
+                    touched_products.add(int(payload['product_id']))
+                    if payload['quantity'] is not None:
+                        stock[int(payload['product_id'])] = payload['quantity']
+                elif event_type == 'review_added':
+                    review_products.add(int(payload['product_id']))
+                    new_reviews.append(int(payload['review_id']))
+                elif event_type == 'review_changed':
+                    review_products.add(int(payload['product_id']))
+                else:
+                    logger.warning(f"Unknown outbox event {event_type} ({row['outbox_id']}) dropped")
+
+            touched_products |= review_products
+            invalidate_products_cache(stock, touched_products)
+            for product_id in review_products:
+                invalidate_review_cache(product_id)
+
+            if new_reviews and hasattr(current_app, 'websocket_manager'):
+                reviews = Outbox.load_reviews(new_reviews)
+                for review_id in new_reviews:
+                    review = reviews.get(review_id)
+                    if review:
+                        current_app.websocket_manager.broadcast_review_added(review['product_id'], dict(review))
+
+            placeholders = ', '.join(['%s'] * len(rows))
+            tx.execute(f"""
+                DELETE FROM outbox WHERE outbox_id IN ({placeholders})
+            """, tuple(row['outbox_id'] for row in rows))
+
+        JobQueue.notify()
+        return len(rows)
+
+    @staticmethod
+    def get_backlog():
+        """Unrelayed events and the age of the oldest, for monitoring"""
+        return execute_query("""
+            SELECT COUNT(*) as events,
+                   TIMESTAMPDIFF(SECOND, MIN(created_at), NOW()) as oldest_seconds
+            FROM outbox
+        """, fetch_one=True)
+
+class OutboxRelay:
+    """Background thread that relays outbox events as soon as they are committed"""
+
+    def __init__(self, app, interval_seconds=1.0, batch_size=100):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run, name='outbox-relay', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        Outbox.notify()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            relayed = 0
+            try:
+                with self.app.app_context():
+                    relayed = Outbox.relay_batch(self.batch_size)
+            except Exception as e:
+                logger.error(f"Outbox relay failed: {str(e)}")
+
+            # A full batch means there is probably more waiting
+            if relayed < self.batch_size:
+                Outbox.wakeup.wait(self.interval_seconds)
+                Outbox.wakeup.clear()
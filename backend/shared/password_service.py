@@ -0,0 +1,121 @@
+"""
+Password hashing off the request threads
+
+Hashing is deliberately slow, so a burst of login attempts (credential
+stuffing) used to take all the CPU the request threads share with catalog
+traffic. Hashes are now computed in a small process pool. At most
+PASSWORD_HASH_MAX_PENDING hashing jobs may be queued or running; a request
+that cannot get a slot within PASSWORD_HASH_QUEUE_TIMEOUT seconds is turned
+away with 503 instead of piling up behind the others. A slot is only given
+back when the worker has finished, so a request that times out waiting for
+its result does not free room for another job while its own is still busy.
+
+Verifying a password also tells the caller when the stored hash was made
+with other parameters than PASSWORD_HASH_METHOD, and hands back a new hash
+computed in the same worker call, so login can upgrade it transparently.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+import logging
+import multiprocessing
+import os
+import threading
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+def hash_in_worker(password, method):
+    return generate_password_hash(password, method=method)
+
+def verify_in_worker(stored_hash, password, method):
+    """(valid, new_hash); new_hash is set when the stored one uses old parameters"""
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if stored_hash.split('$', 1)[0] != method:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+class PasswordServiceBusy(Exception):
+    """Too many hashing jobs are already waiting; the client should retry later"""
+
+class PasswordService:
+    lock = threading.Lock()
+    executor = None
+    executor_pid = None
+    slots = None
+
+    @staticmethod
+    def mp_context():
+        # Workers must not be forked from a threaded server process (copied
+        # locks, sockets and the app); forkserver starts them clean
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+    @staticmethod
+    def get_executor():
+        # A pool inherited through fork() is unusable, so each process makes its own
+        with PasswordService.lock:
+            if PasswordService.executor is None or PasswordService.executor_pid != os.getpid():
+                PasswordService.executor = ProcessPoolExecutor(
+                    max_workers=current_app.config.get('PASSWORD_HASH_WORKERS', 2),
+                    mp_context=PasswordService.mp_context()
+                )
+                PasswordService.executor_pid = os.getpid()
+                PasswordService.slots = threading.BoundedSemaphore(
+                    current_app.config.get('PASSWORD_HASH_MAX_PENDING', 16)
+                )
+            return PasswordService.executor, PasswordService.slots
+
+    @staticmethod
+    def reset():
+        with PasswordService.lock:
+            executor = PasswordService.executor
+            PasswordService.executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def run(func, *args):
+        executor, slots = PasswordService.get_executor()
+        if not slots.acquire(timeout=current_app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2)):
+            raise PasswordServiceBusy('Too many sign-in requests, please retry shortly')
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # Held until the worker is done, even if we stop waiting for it below
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', 10))
+        except BrokenProcessPool:
+            logger.error("Password hashing pool broke; starting a new one")
+            PasswordService.reset()
+            raise
+
+    @staticmethod
+    def method():
+        return current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+    @staticmethod
+    def hash(password):
+        return PasswordService.run(hash_in_worker, password, PasswordService.method())
+
+    @staticmethod
+    def verify(stored_hash, password):
+        """(valid, new_hash); store new_hash when it is not None"""
+        if not stored_hash:
+            return False, None
+        return PasswordService.run(verify_in_worker, stored_hash, password, PasswordService.method())
+
+    @staticmethod
+    def get_stats():
+        slots = PasswordService.slots
+        max_pending = current_app.config.get('PASSWORD_HASH_MAX_PENDING', 16)
+        return {
+            'workers': current_app.config.get('PASSWORD_HASH_WORKERS', 2),
+            'max_pending': max_pending,
+            # BoundedSemaphore keeps its free count in _value
+            'pending': max_pending - slots._value if slots is not None else 0
+        }
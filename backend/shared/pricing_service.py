@@ -0,0 +1,154 @@
+"""
+Server-side order pricing
+
+create_order prices every line from the catalog instead of trusting the
+amounts posted by the client. All lines are resolved with one IN query, and
+the rows are kept on flask.g for the rest of the request so later steps
+(order items, emails) reuse the same snapshot. Stock is not checked here:
+only InventoryService, under lock, knows about the shopper's own holds and
+the Redis counters of hot products.
+"""
+from flask import current_app, g
+from shared.models import execute_query
+from shared.utils import calculate_delivery_charge
+
+class PricingError(Exception):
+    """The order cannot be priced; message and lines are safe to show the user"""
+
+    def __init__(self, message, lines=None, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.lines = lines or []
+        self.status_code = status_code
+
+class PricingService:
+    @staticmethod
+    def get_snapshot(product_ids):
+        """Price and status for the products, cached for this request"""
+        snapshot = g.setdefault('price_snapshot', {})
+        missing = sorted(set(product_ids) - set(snapshot))
+
+        if missing:
+            placeholders = ', '.join(['%s'] * len(missing))
+            rows = execute_query(f"""
+                SELECT p.product_id, p.product_name, p.price, p.discount_price, p.status
+                FROM products p
+                WHERE p.product_id IN ({placeholders})
+            """, tuple(missing), fetch_all=True)
+            for row in rows:
+                snapshot[row['product_id']] = row
+
+        return {pid: snapshot[pid] for pid in product_ids if pid in snapshot}
+
+    @staticmethod
+    def unit_price(product):
+        """Selling price, matching how the cart shows it"""
+        if product['discount_price']:
+            return round(float(product['discount_price']), 2)
+        return round(float(product['price']), 2)
+
+    @staticmethod
+    def quote(lines):
+        """
+        Price order lines ({product_id, quantity}) from the catalog
+
+        Raises PricingError when a product is missing or inactive. Stock is
+        checked afterwards, under lock, by InventoryService.
+        """
+        quantities = {}
+        for line in lines:
+            quantities[line['product_id']] = quantities.get(line['product_id'], 0) + line['quantity']
+
+        products = PricingService.get_snapshot(list(quantities))
+
+        unavailable = []
+        for product_id, quantity in sorted(quantities.items()):
+            product = products.get(product_id)
+            if not product or product['status'] != 'active':
+                unavailable.append({'product_id': product_id, 'requested': quantity,
+                                    'available': 0, 'success': False})
+        if unavailable:
+            raise PricingError('Some items are unavailable', unavailable, 409)
+
+        items = []
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            unit_price = PricingService.unit_price(product)
+            items.append({
+                'product_id': product_id,
+                'product_name': product['product_name'],
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total_price': round(unit_price * quantity, 2)
+            })
+
+        subtotal = round(sum(item['total_price'] for item in items), 2)
+        shipping_amount = calculate_delivery_charge(subtotal)
+        return {
+            'items': items,
+            'subtotal': subtotal,
+            'shipping_amount': shipping_amount,
+            'tax_amount': 0,
+            'discount_amount': 0,
+            'total_amount': round(subtotal + shipping_amount, 2)
+        }
+
+    @staticmethod
+    def apply_wallet(tx, user_id, quote, amount=None, require_full=False):
+        """
+        Pay part (or all) of the order from the wallet inside the order transaction
+
+        Referral rewards are credited to the wallet (see ReferralModel), so this
+        is also how they are redeemed. `amount` caps the credit used; by default
+        as much as the balance covers. The wallet row is locked so two checkouts
+        cannot spend the same balance.
+        """
+        wallet = tx.execute("""
+            SELECT balance FROM wallet WHERE user_id = %s FOR UPDATE
+        """, (user_id,), fetch_one=True)
+        balance = float(wallet['balance']) if wallet else 0.0
+
+        due = quote['total_amount']
+        wanted = due if amount is None else min(max(float(amount), 0.0), due)
+        used = round(min(balance, wanted), 2)
+
+        if require_full and used < due:
+            raise PricingError('Insufficient wallet balance')
+        if used <= 0:
+            return quote
+
+        tx.execute("""
+            UPDATE wallet SET balance = balance - %s, updated_at = NOW()
+            WHERE user_id = %s
+        """, (used, user_id))
+
+        quote = dict(quote)
+        quote['discount_amount'] = used
+        quote['total_amount'] = round(due - used, 2)
+        quote['wallet_balance_after'] = round(balance - used, 2)
+        return quote
+
+    @staticmethod
+    def record_wallet_debit(tx, transaction_id, user_id, quote, order_number):
+        """Wallet ledger entry for credit spent on an order"""
+        if not quote.get('discount_amount'):
+            return
+        tx.execute("""
+            INSERT INTO wallet_transactions
+            (transaction_id, user_id, transaction_type, amount, balance_after,
+             description, reference_type, created_at)
+            VALUES (%s, %s, 'debit', %s, %s, %s, 'order', NOW())
+        """, (transaction_id, user_id, quote['discount_amount'], quote['wallet_balance_after'],
+              f"Used for order {order_number}"))
+
+    @staticmethod
+    def differs(quote, data):
+        """True when the client's own totals do not match the server's"""
+        try:
+            client_total = float(data.get('total_amount'))
+        except (TypeError, ValueError):
+            return False
+        tolerance = current_app.config.get('PRICE_MISMATCH_TOLERANCE', 0.01)
+        return abs(client_total - (quote['total_amount'] + quote['discount_amount'])) > tolerance
+
+pricing_service = PricingService()
@@ -0,0 +1,110 @@
+"""
+Cached lookup of the admin behind a token
+
+admin_token_required needs to know that the admin still exists, is active and
+what role they have. Instead of a MySQL query per request, active admins are
+cached in two layers: a small in-process dict with a very short TTL (no
+network at all on the hot path) and Redis with a longer TTL shared by all
+workers. PrincipalCache.invalidate drops both after a change; other
+processes notice within PRINCIPAL_LOCAL_TTL seconds.
+
+User tokens do not need a lookup: deactivated users have their tokens revoked
+instead (see shared/token_revocation.py).
+"""
+from flask import current_app
+import json
+import logging
+import threading
+import time
+from shared.models import execute_query
+from shared.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_QUERIES = {
+    'admin': """
+        SELECT admin_id, status, role FROM admin_users
+        WHERE admin_id = %s AND status = 'active'
+    """
+}
+
+class PrincipalCache:
+    lock = threading.Lock()
+    local = {}
+
+    @staticmethod
+    def redis_key(kind, principal_id):
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        return f"{prefix}principal:{kind}:{principal_id}"
+
+    @staticmethod
+    def get_local(kind, principal_id):
+        with PrincipalCache.lock:
+            entry = PrincipalCache.local.get((kind, str(principal_id)))
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    @staticmethod
+    def set_local(kind, principal_id, record):
+        ttl = current_app.config.get('PRINCIPAL_LOCAL_TTL', 5)
+        max_entries = current_app.config.get('PRINCIPAL_LOCAL_MAX_ENTRIES', 10000)
+        now = time.monotonic()
+        with PrincipalCache.lock:
+            if len(PrincipalCache.local) >= max_entries:
+                # Drop what has expired; if that is not enough, start over
+                PrincipalCache.local = {
+                    key: entry for key, entry in PrincipalCache.local.items() if entry[0] > now
+                }
+                if len(PrincipalCache.local) >= max_entries:
+                    PrincipalCache.local = {}
+            PrincipalCache.local[(kind, str(principal_id))] = (now + ttl, record)
+
+    @staticmethod
+    def get(kind, principal_id):
+        """The active row for this ID (kind 'admin'), or None"""
+        record = PrincipalCache.get_local(kind, principal_id)
+        if record is not None:
+            return record
+
+        redis_client = None
+        try:
+            redis_client = CacheService.get_redis()
+            raw = redis_client.get(PrincipalCache.redis_key(kind, principal_id))
+            if raw:
+                record = json.loads(raw)
+                PrincipalCache.set_local(kind, principal_id, record)
+                return record
+        except Exception as e:
+            logger.warning(f"Principal cache unavailable: {str(e)}")
+            redis_client = None
+
+        record = execute_query(PRINCIPAL_QUERIES[kind], (principal_id,), fetch_one=True)
+        if not record:
+            # Inactive or unknown principals are not cached, so re-activation is immediate
+            return None
+
+        PrincipalCache.set_local(kind, principal_id, record)
+        if redis_client is not None:
+            try:
+                redis_client.set(
+                    PrincipalCache.redis_key(kind, principal_id),
+                    json.dumps(record, default=str),
+                    ex=current_app.config.get('PRINCIPAL_CACHE_TTL', 60)
+                )
+            except Exception as e:
+                logger.warning(f"Principal cache write failed: {str(e)}")
+        return record
+
+    @staticmethod
+    def invalidate(kind, *principal_ids):
+        """Forget cached principals after a status or password change"""
+        with PrincipalCache.lock:
+            for principal_id in principal_ids:
+                PrincipalCache.local.pop((kind, str(principal_id)), None)
+        try:
+            keys = [PrincipalCache.redis_key(kind, principal_id) for principal_id in principal_ids]
+            if keys:
+                CacheService.get_redis().delete(*keys)
+        except Exception as e:
+            logger.warning(f"Principal cache invalidation failed: {str(e)}")
@@ -0,0 +1,96 @@
+"""
+Cost-weighted rate limits
+
+Besides the per-endpoint limits, every client has one request budget
+(RATELIMIT_WEIGHTED_BUDGET) shared by the endpoints decorated with
+weighted_limit. Each of those requests draws its cost from the budget, so a
+client can browse freely but cannot run a search or place an order as often
+as it can fetch a product. Costs live in RATELIMIT_COSTS.
+
+Counters are kept in Redis by flask-limiter (RATELIMIT_STORAGE_URI) with the
+sliding-window-counter strategy, so every worker sees the same counts; each
+check is a single Lua round trip. Breaches are counted per endpoint in Redis
+for the admin monitoring endpoint.
+"""
+from flask import current_app, request
+import logging
+import time
+from limits import parse
+from main import limiter
+from shared.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+WEIGHTED_SCOPE = 'weighted'
+
+def weighted_budget():
+    return current_app.config.get('RATELIMIT_WEIGHTED_BUDGET', '300 per minute')
+
+def endpoint_cost(name):
+    """Cost of the named action, from RATELIMIT_COSTS"""
+    return current_app.config.get('RATELIMIT_COSTS', {}).get(name, 1)
+
+def weighted_limit(cost):
+    """
+    Draw `cost` from the client's shared budget; cost is an action name in
+    RATELIMIT_COSTS or a callable returning one (evaluated per request)
+    """
+    if callable(cost):
+        resolve = lambda: endpoint_cost(cost())
+    else:
+        resolve = lambda: endpoint_cost(cost)
+    return limiter.shared_limit(
+        weighted_budget, scope=WEIGHTED_SCOPE, cost=resolve, override_defaults=False
+    )
+
+def search_or_listing():
+    """Product listings cost more when they run a text search"""
+    return 'search' if request.args.get('search', '').strip() else 'listing'
+
+class RateLimitMonitor:
+    @staticmethod
+    def breaches_key():
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        return f"{prefix}rate_limit_breaches"
+
+    @staticmethod
+    def record_breach(request_limit):
+        """on_breach hook: count the breach and keep the default 429 response"""
+        try:
+            pipe = CacheService.get_redis().pipeline()
+            pipe.hincrby(RateLimitMonitor.breaches_key(), request.endpoint or 'unknown', 1)
+            pipe.hincrby(RateLimitMonitor.breaches_key(), f"limit:{request_limit.limit}", 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Rate limit breach not recorded: {str(e)}")
+        return None
+
+    @staticmethod
+    def get_status(client_key=None):
+        """Storage health, configured limits, breach counts and one client's budget"""
+        breaches = {}
+        try:
+            raw = CacheService.get_redis().hgetall(RateLimitMonitor.breaches_key())
+            breaches = {field.decode(): int(value) for field, value in raw.items()}
+        except Exception as e:
+            logger.warning(f"Rate limit breaches unavailable: {str(e)}")
+
+        status = {
+            'storage_healthy': limiter.storage.check() if limiter.storage else False,
+            'strategy': current_app.config.get('RATELIMIT_STRATEGY'),
+            'default_limits': current_app.config.get('RATELIMIT_DEFAULT'),
+            'weighted_budget': weighted_budget(),
+            'costs': current_app.config.get('RATELIMIT_COSTS', {}),
+            'breaches': breaches
+        }
+
+        if client_key:
+            item = parse(weighted_budget())
+            reset_at, remaining = limiter.limiter.get_window_stats(item, client_key, WEIGHTED_SCOPE)
+            status['client'] = {
+                'key': client_key,
+                'remaining': remaining,
+                'limit': item.amount,
+                'reset_in_seconds': max(int(reset_at - time.time()), 0)
+            }
+        return status
@@ -0,0 +1,253 @@
+"""
+Precomputed product recommendations
+
+build_recommendations.py runs the offline job: it turns order_items into a
+sparse orders x products matrix, derives item-to-item co-purchase counts and
+cosine similarity from it, and stores the top-K neighbours per product in
+product_recommendations. The API only reads that table (through the cache).
+"""
+from flask import current_app
+from datetime import datetime, timedelta
+import logging
+import numpy as np
+from scipy import sparse
+from shared.models import execute_query, transaction
+from shared.image_utils import convert_image_url
+
+logger = logging.getLogger(__name__)
+
+KIND_BOUGHT_TOGETHER = 'bought_together'
+KIND_RELATED = 'related'
+
+class RecommendationService:
+    @staticmethod
+    def load_purchases(lookback_days=365):
+        """Get (order_id, product_id) pairs from non-cancelled orders in the lookback window"""
+        since = datetime.now() - timedelta(days=lookback_days)
+        return execute_query("""
+            SELECT oi.order_id, oi.product_id
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.order_id
+            WHERE o.created_at >= %s AND o.status NOT IN ('cancelled', 'refunded')
+        """, (since,), fetch_all=True)
+
+    @staticmethod
+    def load_products():
+        """Get the active catalog with categories"""
+        return execute_query("""
+            SELECT product_id, category_id FROM products WHERE status = 'active'
+        """, fetch_all=True)
+
+    @staticmethod
+    def top_k_per_row(matrix, k):
+        """Yield (row, [(col, value), ...]) for the k largest entries of each CSR row"""
+        matrix = matrix.tocsr()
+        for row in range(matrix.shape[0]):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            if start == end:
+                continue
+            cols = matrix.indices[start:end]
+            vals = matrix.data[start:end]
+            if len(vals) > k:
+                keep = np.argpartition(-vals, k)[:k]
+                cols, vals = cols[keep], vals[keep]
+            order = np.lexsort((cols, -vals))
+            yield row, list(zip(cols[order], vals[order]))
+
+    @staticmethod
+    def compute(purchase_rows, product_rows, top_k=8, block_size=1024):
+        """
+        Build both recommendation tables in memory
+
+        Related products are ranked block_size rows at a time, over only the
+        columns that can make a row's top-k, so a large category never needs
+        a dense members x members matrix.
+
+        Returns a list of (product_id, kind, rank_position, related_product_id, score).
+        """
+        product_ids = np.array([row['product_id'] for row in product_rows], dtype=np.int64)
+        if len(product_ids) == 0:
+            return []
+
+        product_index = {int(pid): i for i, pid in enumerate(product_ids)}
+        n_products = len(product_ids)
+
+        purchases = [
+            (row['order_id'], product_index[row['product_id']])
+            for row in purchase_rows if row['product_id'] in product_index
+        ]
+
+        if purchases:
+            order_keys = np.array([order_id for order_id, _ in purchases])
+            product_cols = np.array([col for _, col in purchases], dtype=np.int64)
+            _, order_rows = np.unique(order_keys, return_inverse=True)
+
+            # Binary incidence: a product counts once per order however many units were bought
+            incidence = sparse.csr_matrix(
+                (np.ones(len(product_cols), dtype=np.float32), (order_rows, product_cols)),
+                shape=(order_rows.max() + 1, n_products)
+            )
+            incidence.data[:] = 1
+
+            co_purchase = (incidence.T @ incidence).tocsr()
+            co_purchase.setdiag(0)
+            co_purchase.eliminate_zeros()
+            order_counts = np.asarray(incidence.sum(axis=0)).ravel()
+        else:
+            co_purchase = sparse.csr_matrix((n_products, n_products), dtype=np.float32)
+            order_counts = np.zeros(n_products, dtype=np.float32)
+
+        results = []
+
+        # Frequently bought together: raw co-occurrence counts
+        for row, neighbours in RecommendationService.top_k_per_row(co_purchase, top_k):
+            for rank, (col, value) in enumerate(neighbours, start=1):
+                results.append((
+                    int(product_ids[row]), KIND_BOUGHT_TOGETHER, rank,
+                    int(product_ids[col]), float(value)
+                ))
+
+        # Related: same category, ranked by cosine similarity of purchase vectors,
+        # with popularity as a small tie-breaker so cold products still get neighbours
+        norms = np.sqrt(order_counts)
+        inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms, dtype=np.float64), where=norms > 0)
+        scaling = sparse.diags(inverse_norms)
+        cosine = (scaling @ co_purchase @ scaling).tocsr()
+        popularity = order_counts / order_counts.max() if order_counts.max() > 0 else order_counts
+
+        categories = np.array([row['category_id'] or 0 for row in product_rows], dtype=np.int64)
+        for category in np.unique(categories):
+            members = np.flatnonzero(categories == category)
+            if len(members) < 2:
+                continue
+
+            k = min(top_k, len(members) - 1)
+            similarity = cosine[members][:, members].tocsr()
+            member_popularity = popularity[members]
+            # A column a row never co-occurs with scores only its popularity, so
+            # beyond its non-zeros a row can only pick from the k + 1 most popular
+            fallback = np.argsort(-member_popularity, kind='stable')[:k + 1]
+
+            for start in range(0, len(members), block_size):
+                block = similarity[start:start + block_size]
+                candidates = np.union1d(block.indices, fallback)
+                scores = block[:, candidates].toarray() + 1e-3 * member_popularity[candidates][None, :]
+
+                # Never recommend a product for itself
+                rows = np.arange(start, start + block.shape[0])
+                positions = np.minimum(np.searchsorted(candidates, rows), len(candidates) - 1)
+                own = np.flatnonzero(candidates[positions] == rows)
+                scores[own, positions[own]] = -np.inf
+
+                best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(scores, best, axis=1)
+                order = np.argsort(-best_scores, axis=1, kind='stable')
+                best = candidates[np.take_along_axis(best, order, axis=1)]
+                best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+                for i, row in enumerate(members[rows]):
+                    for rank in range(k):
+                        results.append((
+                            int(product_ids[row]), KIND_RELATED, rank + 1,
+                            int(product_ids[members[best[i, rank]]]), round(float(best_scores[i, rank]), 6)
+                        ))
+
+        return results
+
+    @staticmethod
+    def store(rows):
+        """Replace the stored recommendations in one transaction"""
+        with transaction() as tx:
+            tx.execute("DELETE FROM product_recommendations")
+            tx.execute_many("""
+                INSERT INTO product_recommendations
+                (product_id, kind, rank_position, related_product_id, score, created_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+            """, rows)
+        return len(rows)
+
+    @staticmethod
+    def rebuild(lookback_days=365, top_k=8):
+        """Run the whole job: load, compute, store"""
+        purchases = RecommendationService.load_purchases(lookback_days)
+        products = RecommendationService.load_products()
+        rows = RecommendationService.compute(purchases, products, top_k)
+        stored = RecommendationService.store(rows)
+        logger.info(f"Stored {stored} recommendations from {len(purchases)} order lines")
+        return stored
+
+    @staticmethod
+    def format_tiles(rows):
+        """Shape recommendation rows like the product cards used by listings"""
+        tiles = []
+        for row in rows:
+            stock_quantity = row.get('stock_quantity') or 0
+            if row.get('discount_price') and row.get('price') and float(row['price']) > float(row['discount_price']):
+                savings = round(float(row['price']) - float(row['discount_price']), 2)
+            else:
+                savings = 0
+
+            tiles.append({
+                'product_id': row['product_id'],
+                'product_name': row['product_name'],
+                'price': row['price'],
+                'discount_price': row['discount_price'],
+                'brand': row['brand'],
+                'category_name': row.get('category_name') or '',
+                'primary_image': convert_image_url(row.get('primary_image')),
+                'stock_quantity': stock_quantity,
+                'in_stock': stock_quantity > 0,
+                'savings': savings
+            })
+        return tiles
+
+    @staticmethod
+    def get_for_product(product_id):
+        """Get both recommendation lists for a product, ready to serve"""
+        top_k = current_app.config.get('RECOMMENDATIONS_TOP_K', 8)
+
+        rows = execute_query("""
+            SELECT r.kind, r.rank_position, r.score,
+                   p.product_id, p.product_name, p.price, p.discount_price, p.brand,
+                   c.category_name,
+                   (SELECT pi.image_url FROM product_images pi
+                    WHERE pi.product_id = p.product_id AND pi.is_primary = 1
+                    LIMIT 1) as primary_image,
+                   i.quantity as stock_quantity
+            FROM product_recommendations r
+            JOIN products p ON r.related_product_id = p.product_id
+            LEFT JOIN categories c ON p.category_id = c.category_id
+            LEFT JOIN inventory i ON p.product_id = i.product_id
+            WHERE r.product_id = %s AND p.status = 'active'
+            ORDER BY r.kind, r.rank_position
+        """, (product_id,), fetch_all=True)
+
+        bought_together = [row for row in rows if row['kind'] == KIND_BOUGHT_TOGETHER]
+        related = [row for row in rows if row['kind'] == KIND_RELATED]
+
+        # Products added since the last job run have no rows yet
+        if not related:
+            related = execute_query("""
+                SELECT p.product_id, p.product_name, p.price, p.discount_price, p.brand,
+                       c.category_name,
+                       (SELECT pi.image_url FROM product_images pi
+                        WHERE pi.product_id = p.product_id AND pi.is_primary = 1
+                        LIMIT 1) as primary_image,
+                       i.quantity as stock_quantity
+                FROM products p
+                JOIN products source ON source.product_id = %s
+                LEFT JOIN categories c ON p.category_id = c.category_id
+                LEFT JOIN inventory i ON p.product_id = i.product_id
+                WHERE p.category_id = source.category_id
+                  AND p.product_id != source.product_id AND p.status = 'active'
+                ORDER BY p.created_at DESC
+                LIMIT %s
+            """, (product_id, top_k), fetch_all=True)
+
+        return {
+            'product_id': product_id,
+            'frequently_bought_together': RecommendationService.format_tiles(bought_together[:top_k]),
+            'related': RecommendationService.format_tiles(related[:top_k])
+        }
+
+recommendation_service = RecommendationService()
@@ -1,5 +1,5 @@
-from flask import Blueprint, jsonify
-from shared.models import execute_query
+from flask import Blueprint, jsonify, current_app
+from shared.models import execute_query, ReviewModel
 from shared.image_utils import convert_products_images, convert_category_images, convert_product_images, convert_image_url
 from datetime import datetime
 
@@ -38,7 +38,7 @@ def public_featured_products():
         
         # Calculate savings if discount exists
         if product.get('discount_price') and product.get('price'):
-            product['savings'] = round(float(product['price']) - float(product['discount_price']), 2)
+            product['savings'] = product['price'] - product['discount_price']
         else:
             product['savings'] = 0
         
@@ -89,52 +89,32 @@ def public_product_detail(product_id):
         ORDER BY sort_order, is_primary DESC
     """, (product_id,), fetch_all=True)
     
-    # Get reviews and ratings
-    reviews = execute_query("""
-        SELECT r.review_id, r.rating, r.title, r.comment, r.created_at,
-               r.helpful_count, u.first_name, u.last_name,
-               CONCAT(u.first_name, ' ', u.last_name) as user_name
-        FROM reviews r
-        LEFT JOIN users u ON r.user_id = u.user_id
-        WHERE r.product_id = %s AND r.status = 'approved'
-        ORDER BY r.created_at DESC
-    """, (product_id,), fetch_all=True)
-    
-    # Calculate rating statistics
-    rating_stats = execute_query("""
-        SELECT 
-            COALESCE(AVG(rating), 0) as average,
-            COUNT(*) as total_reviews
-        FROM reviews 
-        WHERE product_id = %s AND status = 'approved'
-    """, (product_id,), fetch_one=True)
+    # Rating summary comes from the maintained aggregate row; only the first
+    # page of reviews is embedded, later pages come from the reviews endpoint
+    per_page = current_app.config.get('REVIEWS_PAGE_SIZE', 10)
+    rating = ReviewModel.get_rating_summary(product_id)
+    reviews = ReviewModel.get_approved_page(product_id, 1, per_page)
+    reviews_pagination = ReviewModel.build_pagination(1, per_page, rating['total_reviews'])
     
     # Convert image URLs to absolute URLs
     product = convert_product_images(product)
     for img in images:
         img['image_url'] = convert_image_url(img['image_url'])
     
-    # Format reviews dates
-    for review in reviews:
-        if review.get('created_at'):
-            review['created_at'] = review['created_at'].strftime('%B %d, %Y')
-    
     # Add stock status
     product['in_stock'] = (product.get('stock_quantity') or 0) > 0
     
     # Ensure proper data structure
     product['images'] = images
     product['reviews'] = reviews
-    product['rating'] = {
-        'average': round(float(rating_stats.get('average', 0)), 1),
-        'total_reviews': rating_stats.get('total_reviews', 0)
-    }
+    product['rating'] = rating
     
     return jsonify({
         'product': product,
         'images': images,
         'reviews': reviews,
-        'rating': product['rating']
+        'reviews_pagination': reviews_pagination,
+        'rating': rating
     }), 200
 
 @shared_bp.route('/states', methods=['GET'])
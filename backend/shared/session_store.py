@@ -0,0 +1,189 @@
+"""
+Per-user session/profile store
+
+One Redis hash per user holds what the profile, wallet and referral screens
+show about the user: profile fields, wallet balance and referral code. It is
+filled at login (or on first read, with one query) and every user endpoint
+reads it with a single HGETALL instead of re-querying users and wallet.
+
+Write paths run after their database change commits: profile changes update
+fields in place with set_fields, wallet movements drop the hash with
+invalidate so the next read takes the balance from MySQL. Both bump a
+per-user generation. A rebuild only stores its hash if the generation is the
+one it saw before reading MySQL, so a rebuild that raced a write cannot put
+the old values back.
+"""
+from flask import current_app
+import logging
+from shared.models import execute_query
+from shared.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = session hash, KEYS[2] = generation; ARGV = generation read
+# before the MySQL load ('' for none), ttl, then field, value pairs
+STORE_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS[1] = session hash, KEYS[2] = generation; ARGV = ttl, then field, value pairs
+UPDATE_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS[1] = session hash, KEYS[2] = generation; ARGV[1] = ttl
+INVALIDATE_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+PROFILE_FIELDS = ['user_id', 'email', 'first_name', 'last_name', 'phone',
+                  'referral_code', 'email_verified', 'created_at']
+
+class SessionStore:
+    @staticmethod
+    def key(user_id):
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        return f"{prefix}user_session:{user_id}"
+
+    @staticmethod
+    def generation_key(user_id):
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        return f"{prefix}user_session_gen:{user_id}"
+
+    @staticmethod
+    def ttl():
+        return current_app.config.get('CACHE_TIMEOUT_USER_SESSION', 1800)
+
+    @staticmethod
+    def load_from_db(user_id):
+        """Profile and wallet balance in one query, or None for an unknown user"""
+        return execute_query("""
+            SELECT u.user_id, u.email, u.first_name, u.last_name, u.phone,
+                   u.referral_code, u.email_verified, u.created_at,
+                   COALESCE(w.balance, 0) as wallet_balance
+            FROM users u
+            LEFT JOIN wallet w ON u.user_id = w.user_id
+            WHERE u.user_id = %s
+        """, (user_id,), fetch_one=True)
+
+    @staticmethod
+    def encode(session):
+        fields = {}
+        for name, value in session.items():
+            if value is None:
+                fields[name] = ''
+            elif name == 'created_at' and hasattr(value, 'isoformat'):
+                fields[name] = value.isoformat()
+            elif name == 'email_verified':
+                fields[name] = '1' if value else '0'
+            else:
+                fields[name] = str(value)
+        return fields
+
+    @staticmethod
+    def decode(raw):
+        session = {
+            (field.decode() if isinstance(field, bytes) else field):
+            (value.decode() if isinstance(value, bytes) else value)
+            for field, value in raw.items()
+        }
+        for name in PROFILE_FIELDS:
+            if session.get(name) == '':
+                session[name] = None
+        session['email_verified'] = session.get('email_verified') == '1'
+        session['wallet_balance'] = round(float(session.get('wallet_balance') or 0), 2)
+        return session
+
+    @staticmethod
+    def store(redis_client, user_id, session, generation):
+        """Write the hash unless a write path bumped the generation since `generation`"""
+        if isinstance(generation, bytes):
+            generation = generation.decode()
+        args = [generation or '', SessionStore.ttl()]
+        for name, value in SessionStore.encode(session).items():
+            args.extend([name, value])
+        redis_client.register_script(STORE_SCRIPT)(
+            keys=[SessionStore.key(user_id), SessionStore.generation_key(user_id)], args=args
+        )
+
+    @staticmethod
+    def refresh(user_id):
+        """Rebuild the hash from MySQL (login); returns the session or None"""
+        redis_client = None
+        generation = None
+        try:
+            redis_client = CacheService.get_redis()
+            generation = redis_client.get(SessionStore.generation_key(user_id))
+        except Exception as e:
+            logger.warning(f"Session store unavailable: {str(e)}")
+
+        session = SessionStore.load_from_db(user_id)
+        if not session:
+            return None
+        if redis_client is not None:
+            try:
+                SessionStore.store(redis_client, user_id, session, generation)
+            except Exception as e:
+                logger.warning(f"Session store unavailable: {str(e)}")
+        return SessionStore.decode(SessionStore.encode(session))
+
+    @staticmethod
+    def get(user_id):
+        """Profile, wallet_balance and referral_code for the user, or None"""
+        try:
+            raw = CacheService.get_redis().hgetall(SessionStore.key(user_id))
+        except Exception as e:
+            logger.warning(f"Session store unavailable, reading MySQL: {str(e)}")
+            raw = None
+        if raw:
+            return SessionStore.decode(raw)
+        return SessionStore.refresh(user_id)
+
+    @staticmethod
+    def set_fields(user_id, **fields):
+        """Update fields of a loaded session after the database change committed"""
+        args = [SessionStore.ttl()]
+        for name, value in SessionStore.encode(fields).items():
+            args.extend([name, value])
+        try:
+            redis_client = CacheService.get_redis()
+            redis_client.register_script(UPDATE_SCRIPT)(
+                keys=[SessionStore.key(user_id), SessionStore.generation_key(user_id)], args=args
+            )
+        except Exception as e:
+            # Drop it rather than leave it stale; the next read rebuilds it
+            logger.warning(f"Session update failed for user {user_id}: {str(e)}")
+            SessionStore.invalidate(user_id)
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop the hash after a committed change (wallet movements, logout)"""
+        try:
+            CacheService.get_redis().register_script(INVALIDATE_SCRIPT)(
+                keys=[SessionStore.key(user_id), SessionStore.generation_key(user_id)],
+                args=[SessionStore.ttl()]
+            )
+        except Exception as e:
+            logger.warning(f"Session invalidation failed for user {user_id}: {str(e)}")
+
+session_store = SessionStore()
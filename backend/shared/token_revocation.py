@@ -0,0 +1,215 @@
+"""
+Token revocation
+
+Tokens carry a `jti` claim. Logging out revokes that one token; deactivating
+a user or changing their password revokes every token the user was issued up
+to that moment. Revocations live in Redis with a TTL equal to the longest
+remaining token lifetime, so the list never outgrows the live tokens.
+
+Nearly every token checked is not revoked, so each process keeps a bloom
+filter of revoked jti values and user IDs. A miss in the filter (the common
+case) answers without any I/O; only a hit is confirmed against Redis, which
+also filters out false positives. RevocationListener keeps the filter in sync
+through Redis pub/sub and rebuilds it periodically to drop expired entries.
+"""
+from flask import current_app
+import logging
+import threading
+import time
+from shared.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """
+    Per-process set membership with false positives but no false negatives
+
+    Bit positions are slices of Python's built-in 64-bit string hash, which is
+    randomised per process; that is fine because every process builds its own
+    filter. `bits` is rounded up to a power of two so a slice is one mask.
+    """
+
+    def __init__(self, bits=1 << 20, hashes=3):
+        self.shift = max(int(bits - 1).bit_length(), 3)
+        self.bits = 1 << self.shift
+        self.mask = self.bits - 1
+        # Only as many slices as fit in the 64-bit hash
+        self.hashes = max(min(hashes, 64 // self.shift), 1)
+        self.array = bytearray(self.bits >> 3)
+
+    def positions(self, value):
+        h = hash(value) & 0xFFFFFFFFFFFFFFFF
+        positions = []
+        for _ in range(self.hashes):
+            positions.append(h & self.mask)
+            h >>= self.shift
+        return positions
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        # Inlined and stopping at the first unset bit: this is the hot path
+        h = hash(value) & 0xFFFFFFFFFFFFFFFF
+        mask = self.mask
+        shift = self.shift
+        array = self.array
+        for _ in range(self.hashes):
+            position = h & mask
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+            h >>= shift
+        return True
+
+class TokenRevocation:
+    bloom = BloomFilter()
+
+    @staticmethod
+    def prefix():
+        return current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+
+    @staticmethod
+    def channel():
+        return f"{TokenRevocation.prefix()}token_revocations"
+
+    @staticmethod
+    def index_key():
+        """Sorted set of every revocation entry, scored by when it can be forgotten"""
+        return f"{TokenRevocation.prefix()}revoked_tokens"
+
+    @staticmethod
+    def entry_key(entry):
+        return f"{TokenRevocation.prefix()}revoked:{entry}"
+
+    @staticmethod
+    def publish(entry, value, ttl):
+        redis_client = CacheService.get_redis()
+        pipe = redis_client.pipeline()
+        pipe.set(TokenRevocation.entry_key(entry), value, ex=ttl)
+        pipe.zadd(TokenRevocation.index_key(), {entry: time.time() + ttl})
+        pipe.publish(TokenRevocation.channel(), entry)
+        pipe.execute()
+        TokenRevocation.bloom.add(entry)
+
+    @staticmethod
+    def revoke_token(claims):
+        """Revoke one token (by its jti) until it would have expired anyway"""
+        jti = claims.get('jti')
+        if not jti:
+            return False
+        ttl = int(claims.get('exp', time.time()) - time.time()) + 1
+        if ttl <= 0:
+            return False
+        TokenRevocation.publish(f"jti:{jti}", 1, ttl)
+        return True
+
+    @staticmethod
+    def revoke_user(user_id):
+        """
+        Revoke every token issued to the user before this second
+
+        Token iat has one-second resolution, so a token issued right after
+        the revocation (a fresh login, or the new token handed out on a
+        password change) is still accepted; revoke the current one by jti.
+        """
+        ttl = current_app.config.get('JWT_MAX_LIFETIME_HOURS', 24 * 7) * 3600
+        TokenRevocation.publish(f"user:{user_id}", int(time.time()), ttl)
+
+    @staticmethod
+    def is_revoked(claims):
+        """True when the token or its user was revoked; costs no I/O for the common case"""
+        bloom = TokenRevocation.bloom
+        jti = claims.get('jti')
+        user_id = claims.get('user_id')
+
+        jti_entry = 'jti:' + jti if jti else None
+        user_entry = 'user:' + str(user_id) if user_id else None
+        candidates = []
+        if jti_entry and jti_entry in bloom:
+            candidates.append(jti_entry)
+        if user_entry and user_entry in bloom:
+            candidates.append(user_entry)
+        if not candidates:
+            return False
+
+        try:
+            values = CacheService.get_redis().mget(
+                [TokenRevocation.entry_key(entry) for entry in candidates]
+            )
+        except Exception as e:
+            # A filter hit we cannot confirm is treated as revoked
+            logger.warning(f"Token revocation store unavailable: {str(e)}")
+            return True
+
+        for entry, value in zip(candidates, values):
+            if value is None:
+                continue
+            if entry == jti_entry:
+                return True
+            if claims.get('iat', 0) < int(value):
+                return True
+        return False
+
+    @staticmethod
+    def rebuild():
+        """Fresh filter from the live revocation entries in Redis"""
+        redis_client = CacheService.get_redis()
+        index_key = TokenRevocation.index_key()
+        redis_client.zremrangebyscore(index_key, '-inf', time.time())
+        entries = redis_client.zrange(index_key, 0, -1)
+
+        bloom = BloomFilter(
+            current_app.config.get('TOKEN_REVOCATION_BLOOM_BITS', 1 << 20),
+            current_app.config.get('TOKEN_REVOCATION_BLOOM_HASHES', 3)
+        )
+        for entry in entries:
+            bloom.add(entry.decode())
+        TokenRevocation.bloom = bloom
+        return len(entries)
+
+class RevocationListener:
+    """Background thread that applies revocations published by other processes"""
+
+    def __init__(self, app, rebuild_interval=300):
+        self.app = app
+        self.rebuild_interval = rebuild_interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run, name='token-revocations', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            pubsub = None
+            try:
+                with self.app.app_context():
+                    pubsub = CacheService.get_redis().pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(TokenRevocation.channel())
+                    # Subscribe first, then load, so nothing revoked in between is missed
+                    TokenRevocation.rebuild()
+                    rebuilt_at = time.time()
+
+                    while not self.stop_event.is_set():
+                        message = pubsub.get_message(timeout=1.0)
+                        if message and message['type'] == 'message':
+                            TokenRevocation.bloom.add(message['data'].decode())
+                        if time.time() - rebuilt_at > self.rebuild_interval:
+                            TokenRevocation.rebuild()
+                            rebuilt_at = time.time()
+            except Exception as e:
+                logger.error(f"Token revocation listener failed: {str(e)}")
+                self.stop_event.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
@@ -0,0 +1,140 @@
+"""
+JWT verification with a cache of already verified tokens
+
+Clients send the same token with every request until it expires, so most
+verifications repeat work already done: base64 decoding, the HMAC check and
+JSON parsing. TokenVerifier keeps a bounded LRU of verified tokens (keyed by
+a digest, never the token itself) mapped to their claims, and answers repeats
+from it.
+
+A cached token is still checked against its `exp` and against the revocation
+epoch: revoke_all() records "tokens issued before now are invalid" in Redis,
+and every process picks that up within JWT_REVOCATION_REFRESH_SECONDS.
+Single tokens and single users are revoked through shared/token_revocation.py.
+"""
+from collections import OrderedDict
+from flask import current_app
+import hashlib
+import jwt
+import logging
+import threading
+import time
+from shared.cache_service import CacheService
+from shared.token_revocation import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+class TokenVerifier:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.secret = None
+        self.key = None
+        self.revoked_before = 0
+        self.revocation_checked_at = 0
+        self.hits = 0
+        self.misses = 0
+
+    def signing_key(self, secret):
+        """The secret as bytes, converted once instead of on every decode"""
+        if secret is not self.secret:
+            self.key = secret.encode() if isinstance(secret, str) else secret
+            self.secret = secret
+            self.clear()
+        return self.key
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def verify(self, token, key, revoked_before=0, now=None):
+        """
+        Claims of a valid token; raises the same jwt exceptions as jwt.decode
+
+        Tokens issued before `revoked_before` (a UNIX time) are rejected.
+        """
+        now = time.time() if now is None else now
+        digest = hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None:
+                self.entries.move_to_end(digest)
+
+        if entry is not None:
+            claims, exp, issued_at = entry
+            if exp is not None and exp <= now:
+                with self.lock:
+                    self.entries.pop(digest, None)
+                raise jwt.ExpiredSignatureError('Signature has expired')
+            if issued_at < revoked_before:
+                raise jwt.InvalidTokenError('Token has been revoked')
+            self.hits += 1
+            return dict(claims)
+
+        self.misses += 1
+        claims = jwt.decode(token, key, algorithms=['HS256'])
+        issued_at = claims.get('iat', 0)
+        if issued_at < revoked_before:
+            raise jwt.InvalidTokenError('Token has been revoked')
+
+        with self.lock:
+            self.entries[digest] = (claims, claims.get('exp'), issued_at)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return dict(claims)
+
+    @staticmethod
+    def revocation_key():
+        prefix = current_app.config.get('CACHE_KEY_PREFIX', 'ecommerce_v2_')
+        return f"{prefix}jwt_revoked_before"
+
+    def get_revoked_before(self):
+        """Revocation epoch from Redis, re-read at most every few seconds"""
+        now = time.monotonic()
+        refresh = current_app.config.get('JWT_REVOCATION_REFRESH_SECONDS', 2)
+        if now - self.revocation_checked_at < refresh:
+            return self.revoked_before
+
+        self.revocation_checked_at = now
+        try:
+            value = CacheService.get_redis().get(TokenVerifier.revocation_key())
+            self.revoked_before = int(value) if value else 0
+        except Exception as e:
+            # Keep the last known epoch rather than failing every request
+            logger.warning(f"JWT revocation epoch unavailable: {str(e)}")
+        return self.revoked_before
+
+    def revoke_all(self):
+        """Invalidate every token issued so far, in all processes"""
+        # iat has one-second resolution; tokens from this same second stay
+        # valid rather than also rejecting the admin's next login
+        revoked_before = int(time.time())
+        CacheService.get_redis().set(TokenVerifier.revocation_key(), revoked_before)
+        self.revoked_before = revoked_before
+        self.revocation_checked_at = time.monotonic()
+        self.clear()
+        return revoked_before
+
+    def get_stats(self):
+        with self.lock:
+            size = len(self.entries)
+        return {
+            'entries': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'revoked_before': self.revoked_before
+        }
+
+token_verifier = TokenVerifier()
+
+def verify_token(token):
+    """Verify a JWT with the app's secret; raises jwt exceptions like jwt.decode"""
+    token_verifier.max_entries = current_app.config.get('JWT_VERIFY_CACHE_SIZE', 10000)
+    key = token_verifier.signing_key(current_app.config['JWT_SECRET_KEY'])
+    claims = token_verifier.verify(token, key, token_verifier.get_revoked_before())
+    if TokenRevocation.is_revoked(claims):
+        raise jwt.InvalidTokenError('Token has been revoked')
+    return claims
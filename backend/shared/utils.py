@@ -8,6 +8,9 @@ from email.mime.multipart import MIMEMultipart
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask import current_app
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Password utilities
 def hash_password(password):
@@ -24,6 +27,7 @@ def generate_token(user_id, user_type='user', expiry_hours=24):
     payload = {
         'exp': datetime.utcnow() + timedelta(hours=expiry_hours),
         'iat': datetime.utcnow(),
+        'jti': uuid.uuid4().hex,
         'user_type': user_type
     }
     
@@ -40,12 +44,9 @@ def generate_token(user_id, user_type='user', expiry_hours=24):
 
 def decode_token(token):
     """Decode JWT token"""
+    from shared.token_verifier import verify_token
     try:
-        return jwt.decode(
-            token,
-            current_app.config['JWT_SECRET_KEY'],
-            algorithms=['HS256']
-        )
+        return verify_token(token)
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
@@ -78,7 +79,7 @@ def send_email(to_email, subject, html_content, text_content=None):
         from_email = current_app.config.get('MAIL_DEFAULT_SENDER', smtp_username)
         
         if not all([smtp_username, smtp_password, from_email]):
-            print("Email configuration missing")
+            logger.error("Email configuration missing")
             return False
         
         # Create message
@@ -105,7 +106,7 @@ def send_email(to_email, subject, html_content, text_content=None):
         
         return True
     except Exception as e:
-        print(f"Email sending failed: {str(e)}")
+        logger.error(f"Email sending failed: {str(e)}")
         return False
 
 # ID generation utilities
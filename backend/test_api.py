@@ -97,6 +97,9 @@ def test_user_endpoints(token):
     response = requests.get(f"{BASE_URL}/user/cart", headers=auth_headers)
     print_test("User Cart", response)
     
+    response = requests.get(f"{BASE_URL}/user/orders/history?limit=5", headers=auth_headers)
+    print_test("User Order History", response)
+    
     response = requests.get(f"{BASE_URL}/user/referrals", headers=auth_headers)
     print_test("User Referrals", response)
 
@@ -145,8 +148,14 @@ def test_product_endpoints():
     response = requests.get(f"{BASE_URL}/user/products/1")
     print_test("Get Product Detail", response)
     
+    response = requests.get(f"{BASE_URL}/user/products/1/related")
+    print_test("Get Related Products", response)
+    
     response = requests.get(f"{BASE_URL}/user/categories")
     print_test("Get Categories", response)
+    
+    response = requests.get(f"{BASE_URL}/user/home")
+    print_test("Get Home Page", response)
 
 def run_comprehensive_test():
     print("🚀 Starting Comprehensive API Test Suite")
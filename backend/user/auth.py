@@ -1,15 +1,23 @@
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 from shared.models import UserModel, execute_query
 from referral.models import ReferralModel
 from shared.email_service import email_service
+from shared.token_revocation import TokenRevocation
+from shared.password_service import PasswordService
+from shared.session_store import SessionStore
+from shared.token_verifier import verify_token
+from shared.utils import generate_token
 import jwt
+import uuid
 from datetime import datetime, timedelta
 import bleach
 import re
+import logging
 from email_validator import validate_email, EmailNotValidError
 from main import limiter
+from shared.rate_limits import weighted_limit
 user_auth_bp = Blueprint('user_auth', __name__)
+logger = logging.getLogger(__name__)
 def validate_password_strength(password):
     if len(password) < 6:
         return False, "Password must be at least 6 characters long"
@@ -21,18 +29,18 @@ def validate_password_strength(password):
     # if not re.search(r'\d', password):
     #     return False, "Password must contain at least one number"
     return True, "Password accepted"
-@limiter.limit("3 per minute")
 @user_auth_bp.route('/register', methods=['POST'])
+@limiter.limit("3 per minute")
 def register():
     data = request.get_json()
     
-    # Debug logging
-    print(f"Registration attempt with data: {data}")
+    # Field names only: the body carries the password
+    logger.debug("Registration attempt", extra={'fields': sorted(data or {})})
     
     required_fields = ['email', 'password', 'first_name', 'last_name', 'phone']
     missing_fields = [field for field in required_fields if field not in data or not data.get(field)]
     if missing_fields:
-        print(f"Missing required fields: {missing_fields}")
+        logger.debug("Registration rejected: missing fields", extra={'missing_fields': missing_fields})
         return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
     
     email = bleach.clean(data['email'].lower().strip(), tags=[], attributes={}, strip=True)
@@ -43,23 +51,23 @@ def register():
 
     # Add validation with debug logging:
     if len(email) > 254:
-        print(f"Email too long: {len(email)} characters")
+        logger.debug("Registration rejected: email too long", extra={'length': len(email)})
         return jsonify({'error': 'Email address too long'}), 400
     if len(first_name) < 2 or len(first_name) > 50:
-        print(f"Invalid first name length: '{first_name}' ({len(first_name)} chars)")
+        logger.debug("Registration rejected: first name length", extra={'length': len(first_name)})
         return jsonify({'error': 'First name must be 2-50 characters'}), 400
     if len(last_name) < 2 or len(last_name) > 50:
-        print(f"Invalid last name length: '{last_name}' ({len(last_name)} chars)")
+        logger.debug("Registration rejected: last name length", extra={'length': len(last_name)})
         return jsonify({'error': 'Last name must be 2-50 characters'}), 400
     if not re.match(r'^[6-9]\d{9}$', phone):
-        print(f"Invalid phone format: '{phone}'")
+        logger.debug("Registration rejected: phone format")
         return jsonify({'error': 'Invalid Indian phone number format'}), 400
 
     try:
         valid_email = validate_email(email)
         email = valid_email.email
     except EmailNotValidError as e:
-        print(f"Email validation failed: {email} - {str(e)}")
+        logger.debug("Registration rejected: invalid email", extra={'reason': str(e)})
         return jsonify({'error': 'Invalid email format'}), 400
     referral_code = data.get('referral_code', '').strip()
     
@@ -68,27 +76,25 @@ def register():
     
     is_strong, password_error = validate_password_strength(password)
     if not is_strong:
-        print(f"Password validation failed: {password_error}")
+        logger.debug("Registration rejected: weak password", extra={'reason': password_error})
         return jsonify({'error': password_error}), 400
     
-    existing_user = UserModel.get_by_email(email)
-    if existing_user:
-        return jsonify({'error': 'Email already registered'}), 409
-    
     if referral_code:
         referrer = ReferralModel.validate_code(referral_code)
         if not referrer:
             return jsonify({'error': 'Invalid referral code'}), 400
     
-    password_hash = generate_password_hash(password)
+    password_hash = PasswordService.hash(password)
     user_id = UserModel.create(email, password_hash, first_name, last_name, phone, referral_code)
+    if not user_id:
+        return jsonify({'error': 'Email already registered'}), 409
     
     # Generate referral code with error handling
     try:
         generated_code = ReferralModel.generate_code(user_id)
-        print(f"Referral code generated: {generated_code}")
+        logger.debug("Referral code generated", extra={'user_id': user_id})
     except Exception as e:
-        print(f"Failed to generate referral code for user {user_id}: {str(e)}")
+        logger.error("Referral code generation failed", extra={'user_id': user_id, 'error': str(e)})
         # Continue with registration even if referral code generation fails
     
     # Send verification email asynchronously (don't make user wait)
@@ -97,9 +103,9 @@ def register():
     def send_email_async():
         try:
             email_service.send_verification_email(email, first_name, user_id)
-            print(f"Verification email sent successfully to {email}")
+            logger.info("Verification email sent", extra={'user_id': user_id})
         except Exception as e:
-            print(f"Background email error for {email}: {str(e)}")
+            logger.error("Verification email failed", extra={'user_id': user_id, 'error': str(e)})
     
     # Start email sending in background thread
     threading.Thread(target=send_email_async, daemon=True).start()
@@ -111,22 +117,18 @@ def register():
         'verification_email_sent': email_sent,
         'referral_applied': bool(referral_code)
     }), 201
-@limiter.limit("5 per minute")
 @user_auth_bp.route('/login', methods=['POST'])
+@limiter.limit("5 per minute")
+@weighted_limit('login')
 def login():
     data = request.get_json()
     
-    # Debug logging
-    print(f"Login attempt - Raw data received: {data}")
-    
     if not data.get('email') or not data.get('password'):
-        print("Missing email or password in request")
         return jsonify({'error': 'Email and password required'}), 400
     
     email = bleach.clean(data['email'].lower().strip(), tags=[], attributes={}, strip=True)
     password = data.get('password', '')
     
-    print(f"Processed email: '{email}', password length: {len(password)}")
     if len(email) > 254:
         return jsonify({'error': 'Email too long'}), 400
     try:
@@ -136,19 +138,23 @@ def login():
         return jsonify({'error': 'Invalid email format'}), 400
     remember_me = data.get('remember_me', False)
     
-    user = UserModel.get_by_email(email)
+    user = UserModel.get_credentials(email)
+    if user and user['status'] != 'active':
+        user = None
     
-    print(f"User found: {bool(user)}")
-    if user:
-        print(f"User email: {user['email']}, status: {user['status']}")
-        password_valid = check_password_hash(user['password_hash'], password)
-        print(f"Password valid: {password_valid}")
-        print(f"Hash starts with: {user['password_hash'][:20]}...")
+    password_valid, new_hash = PasswordService.verify(user['password_hash'], password) if user else (False, None)
     
-    if not user or not check_password_hash(user['password_hash'], password):
-        print("Authentication failed - returning 401")
+    if not password_valid:
+        logger.debug("Login failed", extra={'user_found': bool(user), 'sampled': True})
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    if new_hash:
+        # Hash parameters changed since this password was set; upgrade it quietly
+        execute_query("""
+            UPDATE users SET password_hash = %s
+            WHERE user_id = %s AND password_hash = %s
+        """, (new_hash, user['user_id'], user['password_hash']))
+    
     # Temporarily bypass email verification for testing
     # if not user.get('email_verified', False):
     #     return jsonify({
@@ -160,25 +166,38 @@ def login():
     expiry_hours = 24 * 7 if remember_me else 24
     token = jwt.encode({
         'user_id': user['user_id'],
+        'jti': uuid.uuid4().hex,
+        'iat': datetime.utcnow(),
         'exp': datetime.utcnow() + timedelta(hours=expiry_hours)
     }, current_app.config['JWT_SECRET_KEY'], algorithm='HS256')
     
+    # Profile, wallet balance and referral code for the other user endpoints
+    session = SessionStore.refresh(user['user_id'])
+    
     user_data = {
         'user_id': user['user_id'],
-        'email': user['email'],
-        'first_name': user['first_name'],
-        'last_name': user['last_name'],
-        'phone': user['phone']
+        'email': session['email'],
+        'first_name': session['first_name'],
+        'last_name': session['last_name'],
+        'phone': session['phone']
     }
     
-    cache_key = f'user_session_{user["user_id"]}'
-    current_app.cache.set(cache_key, user_data, timeout=86400)
-    
-    return jsonify({
+    response = {
         'message': 'Login successful',
         'token': token,
         'user': user_data
-    }), 200
+    }
+    
+    # Carry over the cart built before logging in
+    guest_cart = data.get('guest_cart')
+    if isinstance(guest_cart, list) and guest_cart:
+        from shared.cart_service import CartService
+        try:
+            response['merged_cart_items'] = CartService.merge(user['user_id'], guest_cart)
+        except Exception as e:
+            current_app.logger.error(f"Guest cart merge failed: {str(e)}")
+    
+    return jsonify(response), 200
 
 @user_auth_bp.route('/me', methods=['GET'])
 def get_current_user():
@@ -187,22 +206,16 @@ def get_current_user():
         return jsonify({'error': 'Token required'}), 401
     
     token = token[7:]
-    data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    try:
+        data = verify_token(token)
+    except jwt.InvalidTokenError:
+        return jsonify({'error': 'Invalid or expired token'}), 401
     user_id = data['user_id']
     
-    cache_key = f'user_session_{user_id}'
-    cached_user = current_app.cache.get(cache_key)
-    
-    if cached_user:
-        return jsonify({'user': cached_user}), 200
-    
-    user = UserModel.get_by_id(user_id)
+    user = SessionStore.get(user_id)
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    user.pop('password_hash', None)
-    current_app.cache.set(cache_key, user, timeout=86400)
-    
     return jsonify({'user': user}), 200
 
 @user_auth_bp.route('/change-password', methods=['POST'])
@@ -212,7 +225,10 @@ def change_password():
         return jsonify({'error': 'Token required'}), 401
     
     token = token[7:]
-    data_token = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    try:
+        data_token = verify_token(token)
+    except jwt.InvalidTokenError:
+        return jsonify({'error': 'Invalid or expired token'}), 401
     user_id = data_token['user_id']
     
     data = request.get_json()
@@ -227,31 +243,45 @@ def change_password():
     if not is_strong:
         return jsonify({'error': password_error}), 400
     user = UserModel.get_by_id(user_id)
-    if not user or not check_password_hash(user['password_hash'], current_password):
+    if not user or not PasswordService.verify(user['password_hash'], current_password)[0]:
         return jsonify({'error': 'Current password is incorrect'}), 400
     
-    new_password_hash = generate_password_hash(new_password)
+    new_password_hash = PasswordService.hash(new_password)
     execute_query("""
         UPDATE users SET password_hash = %s, updated_at = %s 
         WHERE user_id = %s
     """, (new_password_hash, datetime.now(), user_id))
     
-    cache_key = f'user_session_{user_id}'
-    current_app.cache.delete(cache_key)
+    SessionStore.invalidate(user_id)
+    # Sign out every other session; this one continues with a fresh token
+    TokenRevocation.revoke_user(user_id)
+    TokenRevocation.revoke_token(data_token)
     
-    return jsonify({'message': 'Password changed successfully'}), 200
+    return jsonify({
+        'message': 'Password changed successfully',
+        'token': generate_token(user_id, 'user')
+    }), 200
 
 @user_auth_bp.route('/logout', methods=['POST'])
 def logout():
     token = request.headers.get('Authorization')
     if token and token.startswith('Bearer '):
         token = token[7:]
-        data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        try:
+            data = verify_token(token)
+        except jwt.InvalidTokenError:
+            # Already revoked or expired: nothing left to log out
+            data = {}
         user_id = data.get('user_id')
         
         if user_id:
-            cache_key = f'user_session_{user_id}'
-            current_app.cache.delete(cache_key)
+            SessionStore.invalidate(user_id)
+        
+        if data:
+            try:
+                TokenRevocation.revoke_token(data)
+            except Exception as e:
+                logger.warning("Token revocation failed on logout", extra={'error': str(e)})
     
     return jsonify({'message': 'Logged out successfully'}), 200
 
@@ -388,12 +418,7 @@ def forgot_password():
     if not user or user['status'] != 'active':
         return jsonify(success_message), 200
     
-    recent_requests = execute_query("""
-        SELECT COUNT(*) as count FROM password_reset_tokens 
-        WHERE user_id = %s AND created_at > DATE_SUB(NOW(), INTERVAL 1 HOUR)
-    """, (user['user_id'],), fetch_one=True)
-    
-    if recent_requests['count'] >= 3:
+    if email_service.recent_password_reset_requests(user['user_id']) >= 3:
         return jsonify(success_message), 200
     
     email_sent = email_service.send_password_reset_email(
@@ -450,7 +475,7 @@ def reset_password():
     if not is_strong:
         return jsonify({'error': password_error}), 400
     
-    new_password_hash = generate_password_hash(new_password)
+    new_password_hash = PasswordService.hash(new_password)
     success = email_service.reset_password(token, new_password_hash)
     
     if success:
@@ -1,18 +1,33 @@
 from flask import Blueprint, request, jsonify, current_app
-from shared.models import execute_query
+from shared.models import execute_query, transaction, ReviewModel, UserModel
 from shared.auth import user_token_required
+from shared.idempotency import idempotent
 from shared.utils import APIResponse, validate_email, send_email
 from shared.image_utils import convert_products_images, convert_product_images, convert_category_images, convert_image_url
 from datetime import datetime, timedelta
 import uuid
 import json
-from cache_utils import invalidate_product_cache
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cache_utils import get_home_section_versions
+from shared.recommendation_service import RecommendationService
+from shared.catalog_sync_service import CatalogSyncService
+from shared.inventory_service import InventoryService
+from shared.pricing_service import PricingService, PricingError
+from shared.outbox import Outbox
+from shared.cart_service import CartService
+from shared.password_service import PasswordService
+from shared.session_store import SessionStore
+from shared.rate_limits import weighted_limit, search_or_listing
+from shared.order_history_service import OrderHistoryService, InvalidCursor
 user_bp = Blueprint('user', __name__)
+logger = logging.getLogger(__name__)
 
 # Authentication Routes
 @user_bp.route('/auth/register', methods=['POST'])
 def user_register():
-    from shared.utils import generate_token, hash_password
+    from shared.utils import generate_token
     
     data = request.get_json()
     email = data.get('email', '').strip().lower()
@@ -31,14 +46,6 @@ def user_register():
     if len(password) < 6:
         return APIResponse.error('Password must be at least 6 characters', 400)
     
-    # Check if user already exists
-    existing_user = execute_query("""
-        SELECT user_id FROM users WHERE email = %s
-    """, (email,), fetch_one=True)
-    
-    if existing_user:
-        return APIResponse.error('Email already registered', 400)
-    
     # Handle referral
     referral_bonus = 0
     referrer_user_id = None
@@ -52,30 +59,35 @@ def user_register():
     
     # Create user
     user_id = str(uuid.uuid4())
-    password_hash = hash_password(password)
+    password_hash = PasswordService.hash(password)
     user_referral_code = f"REF{uuid.uuid4().hex[:8].upper()}"
     
-    execute_query("""
-        INSERT INTO users (
-            user_id, email, password_hash, first_name, last_name, phone,
-            referral_code, referred_by, status, email_verified, created_at
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'active', FALSE, %s)
-    """, (user_id, email, password_hash, first_name, last_name, phone,
-          user_referral_code, referrer_user_id, datetime.now()))
-    
-    # Create wallet with referral bonus
-    execute_query("""
-        INSERT INTO wallet (user_id, balance, created_at)
-        VALUES (%s, %s, %s)
-    """, (user_id, referral_bonus, datetime.now()))
-    
-    # Record referral transaction if applicable
-    if referral_bonus > 0:
-        execute_query("""
-            INSERT INTO wallet_transactions (
-                user_id, transaction_type, amount, description, created_at
-            ) VALUES (%s, 'credit', %s, 'Referral signup bonus', %s)
+    with transaction() as tx:
+        # The unique key on email rejects a second signup; no lookup first
+        tx.execute("""
+            INSERT INTO users (
+                user_id, email, password_hash, first_name, last_name, phone,
+                referral_code, referred_by, status, email_verified, created_at
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'active', FALSE, %s)
+            ON DUPLICATE KEY UPDATE user_id = user_id
+        """, (user_id, email, password_hash, first_name, last_name, phone,
+              user_referral_code, referrer_user_id, datetime.now()))
+        if not UserModel.inserted(tx):
+            return APIResponse.error('Email already registered', 400)
+        
+        # Create wallet with referral bonus
+        tx.execute("""
+            INSERT INTO wallet (user_id, balance, created_at)
+            VALUES (%s, %s, %s)
         """, (user_id, referral_bonus, datetime.now()))
+        
+        # Record referral transaction if applicable
+        if referral_bonus > 0:
+            tx.execute("""
+                INSERT INTO wallet_transactions (
+                    user_id, transaction_type, amount, description, created_at
+                ) VALUES (%s, 'credit', %s, 'Referral signup bonus', %s)
+            """, (user_id, referral_bonus, datetime.now()))
     
     token = generate_token(user_id, 'user')
     
@@ -90,9 +102,10 @@ def user_register():
         }
     }, 'Registration successful', 201)
 
+# Shadowed by user_auth_bp's /api/user/auth/login, which is registered first
 @user_bp.route('/auth/login', methods=['POST'])
 def user_login():
-    from shared.utils import generate_token, verify_password
+    from shared.utils import generate_token
     
     data = request.get_json()
     email = data.get('email', '').strip().lower()
@@ -101,42 +114,46 @@ def user_login():
     if not email or not password:
         return APIResponse.error('Email and password required', 400)
     
-    user = execute_query("""
-        SELECT user_id, email, password_hash, first_name, last_name, 
-               referral_code, status, email_verified
-        FROM users 
-        WHERE email = %s
-    """, (email,), fetch_one=True)
+    user = UserModel.get_credentials(email)
     
     if not user or user['status'] != 'active':
         return APIResponse.error('User not found or inactive', 404)
     
-    if not verify_password(password, user['password_hash']):
+    password_valid, new_hash = PasswordService.verify(user['password_hash'], password)
+    if not password_valid:
         return APIResponse.error('Invalid credentials', 401)
     
+    if new_hash:
+        execute_query("""
+            UPDATE users SET password_hash = %s
+            WHERE user_id = %s AND password_hash = %s
+        """, (new_hash, user['user_id'], user['password_hash']))
+    
     token = generate_token(user['user_id'], 'user')
+    session = SessionStore.refresh(user['user_id'])
     
     return APIResponse.success({
         'token': token,
         'user': {
             'user_id': user['user_id'],
-            'email': user['email'],
-            'first_name': user['first_name'],
-            'last_name': user['last_name'],
-            'referral_code': user['referral_code'],
-            'email_verified': bool(user['email_verified'])
+            'email': session['email'],
+            'first_name': session['first_name'],
+            'last_name': session['last_name'],
+            'referral_code': session['referral_code'],
+            'email_verified': session['email_verified']
         }
     }, 'Login successful')
 
 @user_bp.route('/auth/me', methods=['GET'])
 @user_token_required
 def get_current_user(user_id):
-    user = execute_query("""
-        SELECT user_id, email, first_name, last_name, phone, 
-               referral_code, email_verified, created_at
-        FROM users 
-        WHERE user_id = %s
-    """, (user_id,), fetch_one=True)
+    session = SessionStore.get(user_id)
+    user = {
+        name: session[name] for name in (
+            'user_id', 'email', 'first_name', 'last_name', 'phone',
+            'referral_code', 'email_verified', 'created_at'
+        )
+    } if session else None
     
     if not user:
         return APIResponse.not_found('User not found')
@@ -147,12 +164,14 @@ def get_current_user(user_id):
 # UPDATE THE EXISTING get_products FUNCTION IN user/routes.py
 
 @user_bp.route('/products', methods=['GET'])
+@weighted_limit(search_or_listing)
 def get_products():
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
     category_id = request.args.get('category_id')
     search_query = request.args.get('search', '').strip()
     sort_by = request.args.get('sort_by', 'created_at')
+    min_rating = request.args.get('min_rating', type=float)
     
     if category_id:
         try:
@@ -163,7 +182,7 @@ def get_products():
     offset = (page - 1) * per_page
     
     # Cache key includes sort_by
-    cache_key = f'user_products_{page}_{per_page}_{category_id}_{search_query}_{sort_by}'
+    cache_key = f'user_products_{page}_{per_page}_{category_id}_{search_query}_{sort_by}_{min_rating}'
     cached_data = current_app.cache.get(cache_key)
     if cached_data:
         return jsonify(cached_data), 200
@@ -176,9 +195,12 @@ def get_products():
                 WHERE pi.product_id = p.product_id AND pi.is_primary = 1 
                 LIMIT 1) as primary_image,
                (SELECT i.quantity FROM inventory i 
-                WHERE i.product_id = p.product_id) as stock_quantity
+                WHERE i.product_id = p.product_id) as stock_quantity,
+               COALESCE(prs.rating_avg, 0) as avg_rating,
+               COALESCE(prs.rating_count, 0) as review_count
         FROM products p 
         LEFT JOIN categories c ON p.category_id = c.category_id
+        LEFT JOIN product_rating_summary prs ON p.product_id = prs.product_id
         WHERE p.status = 'active' AND c.status = 'active'
     """
     
@@ -192,13 +214,19 @@ def get_products():
         query += " AND (p.product_name LIKE %s OR p.description LIKE %s)"
         params.extend([f'%{search_query}%', f'%{search_query}%'])
     
+    if min_rating:
+        query += " AND prs.rating_avg >= %s"
+        params.append(min_rating)
+    
     # SORTING LOGIC
     sort_mapping = {
         'name': 'p.product_name ASC',
         'price_low': 'p.discount_price ASC, p.price ASC',
         'price_high': 'p.discount_price DESC, p.price DESC',
         'newest': 'p.created_at DESC',
-        'created_at': 'p.created_at DESC'
+        'created_at': 'p.created_at DESC',
+        'rating': 'prs.rating_avg DESC, prs.rating_count DESC, p.created_at DESC',
+        'most_reviewed': 'prs.rating_count DESC, prs.rating_avg DESC'
     }
     
     order_clause = sort_mapping.get(sort_by, 'p.created_at DESC')
@@ -209,6 +237,7 @@ def get_products():
         SELECT COUNT(*) as total
         FROM products p 
         LEFT JOIN categories c ON p.category_id = c.category_id
+        LEFT JOIN product_rating_summary prs ON p.product_id = prs.product_id
         WHERE p.status = 'active' AND c.status = 'active'
     """
     
@@ -221,6 +250,10 @@ def get_products():
         count_query += " AND (p.product_name LIKE %s OR p.description LIKE %s)"
         count_params.extend([f'%{search_query}%', f'%{search_query}%'])
     
+    if min_rating:
+        count_query += " AND prs.rating_avg >= %s"
+        count_params.append(min_rating)
+    
     total_count = execute_query(count_query, count_params, fetch_one=True)['total']
     
     # PAGINATION
@@ -237,15 +270,12 @@ def get_products():
         
         # Calculate savings if discount exists
         if product.get('discount_price') and product.get('price'):
-            discount_price = float(product['discount_price'])
-            price = float(product['price'])
-            if price > discount_price:
-                product['savings'] = round(price - discount_price, 2)
-            else:
-                product['savings'] = 0
+            product['savings'] = max(product['price'] - product['discount_price'], 0)
         else:
             product['savings'] = 0
         
+        product['avg_rating'] = round(product['avg_rating'], 1)
+        
         # Convert image URL to absolute
         if product.get('primary_image'):
             product['primary_image'] = convert_image_url(product['primary_image'])
@@ -270,13 +300,8 @@ def get_products():
 
 # REPLACE THIS FUNCTION in backend/user/routes.py (around line 200-220)
 
-@user_bp.route('/products/featured', methods=['GET'])
-def get_featured_products():
-    cache_key = 'user_featured_products'
-    cached_data = current_app.cache.get(cache_key)
-    if cached_data:
-        return jsonify({'products': cached_data, 'cached': True}), 200
-    
+def build_featured_products():
+    """Featured product tiles, shared by /products/featured and /home"""
     # FIXED: Added stock_quantity and better data structure
     products = execute_query("""
         SELECT p.product_id, p.product_name, p.price, p.discount_price, p.brand,
@@ -301,12 +326,7 @@ def get_featured_products():
         
         # Calculate savings if discount exists
         if product.get('discount_price') and product.get('price'):
-            discount_price = float(product['discount_price'])
-            price = float(product['price'])
-            if price > discount_price:
-                product['savings'] = round(price - discount_price, 2)
-            else:
-                product['savings'] = 0
+            product['savings'] = max(product['price'] - product['discount_price'], 0)
         else:
             product['savings'] = 0
         
@@ -315,7 +335,16 @@ def get_featured_products():
             product['category_name'] = ''
     
     # Convert image URLs to absolute URLs
-    products = convert_products_images(products)
+    return convert_products_images(products)
+
+@user_bp.route('/products/featured', methods=['GET'])
+def get_featured_products():
+    cache_key = 'user_featured_products'
+    cached_data = current_app.cache.get(cache_key)
+    if cached_data:
+        return jsonify({'products': cached_data, 'cached': True}), 200
+    
+    products = build_featured_products()
     
     # Cache for 10 minutes
     current_app.cache.set(cache_key, products, timeout=600)
@@ -328,26 +357,19 @@ def get_product_detail(product_id):
     if cached_data:
         return jsonify({**cached_data, 'cached': True}), 200
     
-    # OPTIMIZED: Single query instead of 4 separate queries
     product = execute_query("""
         SELECT 
             p.product_id, p.product_name, p.description, p.price, p.discount_price,
             p.brand, p.sku, p.weight, p.created_at,
             c.category_name,
             i.quantity as stock,
-            -- Get primary image
             (SELECT pi.image_url FROM product_images pi 
              WHERE pi.product_id = p.product_id AND pi.is_primary = 1 
-             LIMIT 1) as primary_image,
-            -- Get review stats in same query
-            COALESCE(AVG(r.rating), 0) as avg_rating,
-            COUNT(r.review_id) as total_reviews
+             LIMIT 1) as primary_image
         FROM products p 
         LEFT JOIN categories c ON p.category_id = c.category_id
         LEFT JOIN inventory i ON p.product_id = i.product_id
-        LEFT JOIN reviews r ON p.product_id = r.product_id AND r.status = 'approved'
         WHERE p.product_id = %s AND p.status = 'active'
-        GROUP BY p.product_id, c.category_name, i.quantity
     """, (product_id,), fetch_one=True)
     
     if not product:
@@ -361,16 +383,11 @@ def get_product_detail(product_id):
         ORDER BY is_primary DESC, sort_order ASC
     """, (product_id,), fetch_all=True)
     
-    # Get recent reviews separately
-    reviews = execute_query("""
-        SELECT r.review_id, r.rating, r.comment, 
-               DATE_FORMAT(r.created_at, '%M %d, %Y') as created_at,
-               CONCAT(u.first_name, ' ', LEFT(u.last_name, 1), '.') as user_name
-        FROM reviews r
-        JOIN users u ON r.user_id = u.user_id
-        WHERE r.product_id = %s AND r.status = 'approved'
-        ORDER BY r.created_at DESC LIMIT 10
-    """, (product_id,), fetch_all=True)
+    # Rating summary from the aggregate row plus only the first page of reviews;
+    # clients fetch further pages from get_product_reviews
+    per_page = current_app.config.get('REVIEWS_PAGE_SIZE', 10)
+    rating = ReviewModel.get_rating_summary(product_id)
+    reviews = ReviewModel.get_approved_page(product_id, 1, per_page)
     
     # Process product data
     product = dict(product)
@@ -383,18 +400,18 @@ def get_product_detail(product_id):
     # Calculate stock and savings
     product['in_stock'] = (product.get('stock') or 0) > 0
     if product.get('discount_price') and product.get('price'):
-        product['savings'] = round(float(product['price']) - float(product['discount_price']), 2)
+        product['savings'] = product['price'] - product['discount_price']
     else:
         product['savings'] = 0
+    product['avg_rating'] = rating['average']
+    product['total_reviews'] = rating['total_reviews']
     
     product_data = {
         'product': product,
         'images': images,
         'reviews': reviews,
-        'rating': {
-            'average': round(float(product['avg_rating']), 1),
-            'total_reviews': product['total_reviews']
-        },
+        'reviews_pagination': ReviewModel.build_pagination(1, per_page, rating['total_reviews']),
+        'rating': rating,
         'cached': False
     }
     
@@ -403,13 +420,21 @@ def get_product_detail(product_id):
     return jsonify(product_data), 200
 
 
-@user_bp.route('/categories', methods=['GET'])
-def get_categories():
-    cache_key = 'user_categories'
+@user_bp.route('/products/<int:product_id>/related', methods=['GET'])
+def get_related_products(product_id):
+    cache_key = f'user_product_related_{product_id}'
     cached_data = current_app.cache.get(cache_key)
     if cached_data:
-        return jsonify({'categories': cached_data, 'cached': True}), 200
+        return jsonify({**cached_data, 'cached': True}), 200
+    
+    # Lists are precomputed by build_recommendations.py; this is a single indexed read
+    related_data = RecommendationService.get_for_product(product_id)
     
+    current_app.cache.set(cache_key, related_data, timeout=current_app.config.get('CACHE_TIMEOUT_RELATED', 600))
+    return jsonify({**related_data, 'cached': False}), 200
+
+def build_categories():
+    """Active categories with product counts, shared by /categories and /home"""
     categories = execute_query("""
         SELECT c.*, 
                (SELECT COUNT(*) FROM products p 
@@ -420,28 +445,178 @@ def get_categories():
     """, fetch_all=True)
     
     # Convert image URLs to absolute URLs
-    categories = convert_category_images(categories)
+    return convert_category_images(categories)
+
+def build_category_top_sellers():
+    """Best selling products per category over the recent sales window"""
+    since = datetime.now() - timedelta(days=current_app.config.get('HOME_TOP_SELLERS_DAYS', 90))
+    per_category = current_app.config.get('HOME_TOP_SELLERS_PER_CATEGORY', 4)
+    
+    products = execute_query("""
+        SELECT * FROM (
+            SELECT p.product_id, p.product_name, p.price, p.discount_price, p.brand,
+                   c.category_id, c.category_name, s.units_sold,
+                   (SELECT pi.image_url FROM product_images pi 
+                    WHERE pi.product_id = p.product_id AND pi.is_primary = 1 
+                    LIMIT 1) as primary_image,
+                   i.quantity as stock_quantity,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY p.category_id
+                       ORDER BY s.units_sold DESC, p.product_id
+                   ) as category_rank
+            FROM (
+                SELECT oi.product_id, SUM(oi.quantity) as units_sold
+                FROM order_items oi
+                JOIN orders o ON oi.order_id = o.order_id
+                WHERE o.created_at >= %s AND o.status NOT IN ('cancelled', 'refunded')
+                GROUP BY oi.product_id
+            ) s
+            JOIN products p ON s.product_id = p.product_id
+            JOIN categories c ON p.category_id = c.category_id
+            LEFT JOIN inventory i ON p.product_id = i.product_id
+            WHERE p.status = 'active' AND c.status = 'active'
+        ) ranked
+        WHERE category_rank <= %s
+        ORDER BY category_id, category_rank
+    """, (since, per_category), fetch_all=True)
+    
+    top_sellers = {}
+    for product in products:
+        product['in_stock'] = (product.get('stock_quantity') or 0) > 0
+        product['units_sold'] = int(product['units_sold'] or 0)
+        product.pop('category_rank', None)
+        
+        category = top_sellers.setdefault(product['category_id'], {
+            'category_id': product['category_id'],
+            'category_name': product['category_name'],
+            'products': []
+        })
+        category['products'].append(convert_product_images(product))
+    
+    return list(top_sellers.values())
+
+@user_bp.route('/categories', methods=['GET'])
+def get_categories():
+    cache_key = 'user_categories'
+    cached_data = current_app.cache.get(cache_key)
+    if cached_data:
+        return jsonify({'categories': cached_data, 'cached': True}), 200
+    
+    categories = build_categories()
     
     current_app.cache.set(cache_key, categories, timeout=3600)
     return jsonify({'categories': categories, 'cached': False}), 200
 
+# Home page sections: (cache key, builder, timeout in seconds)
+HOME_SECTIONS = {
+    'featured': ('user_featured_products', build_featured_products, 600),
+    'categories': ('user_categories', build_categories, 3600),
+    'top_sellers': ('user_category_top_sellers', build_category_top_sellers, 900)
+}
+
+@user_bp.route('/home', methods=['GET'])
+def get_home():
+    """
+    Landing page data in one request
+    
+    Every section carries a version that cache_utils bumps when that section is
+    invalidated, and is rebuilt once its own timeout has passed, so only stale
+    sections are rebuilt. The ETag names each section's version and build time,
+    so unchanged clients get a 304 and a rebuilt section always changes it.
+    """
+    versions = get_home_section_versions(HOME_SECTIONS.keys())
+    cache = current_app.cache
+    document = cache.get('user_home') or {'sections': {}, 'versions': {}}
+    document.setdefault('built_at', {})
+    
+    now = int(time.time())
+    stale = [
+        name for name in HOME_SECTIONS
+        if document['versions'].get(name) != versions[name]
+        or now - document['built_at'].get(name, 0) >= HOME_SECTIONS[name][2]
+    ]
+    
+    if not stale:
+        etag = home_etag(document)
+        if etag in request.if_none_match:
+            return '', 304
+    else:
+        app = current_app._get_current_object()
+        
+        def load_section(name):
+            cache_key, builder, timeout = HOME_SECTIONS[name]
+            with app.app_context():
+                # A section that timed out is rebuilt even if its cache key survived
+                expired = document['versions'].get(name) == versions[name]
+                data = None if expired else app.cache.get(cache_key)
+                if data is None:
+                    data = builder()
+                    app.cache.set(cache_key, data, timeout=timeout)
+                return data
+        
+        # Sections come from separate caches (or queries on a miss); load them side by side
+        with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+            for name, data in zip(stale, executor.map(load_section, stale)):
+                document['sections'][name] = data
+                document['versions'][name] = versions[name]
+                document['built_at'][name] = now
+        
+        cache.set('user_home', document, timeout=current_app.config.get('CACHE_TIMEOUT_HOME', 900))
+        etag = home_etag(document)
+    
+    response = jsonify({
+        'sections': document['sections'],
+        'versions': document['versions'],
+        'cached': not stale
+    })
+    response.set_etag(etag)
+    return response, 200
+
+def home_etag(document):
+    return '-'.join(
+        f"{name}.{document['versions'][name]}.{document['built_at'][name]}"
+        for name in HOME_SECTIONS
+    )
+
+@user_bp.route('/catalog/changes', methods=['GET'])
+def get_catalog_changes():
+    """Products, prices, stock and images changed since a client's last sync"""
+    since = request.args.get('since', 0, type=int)
+    if since is None or since < 0:
+        return APIResponse.error('since must be a non-negative change sequence', 400)
+    
+    limit = request.args.get('limit', current_app.config.get('CATALOG_SYNC_BATCH_SIZE', 200), type=int)
+    limit = max(min(limit, current_app.config.get('CATALOG_SYNC_MAX_BATCH_SIZE', 1000)), 1)
+    
+    changes = CatalogSyncService.get_changes(
+        since, limit, current_app.config.get('CATALOG_SYNC_SETTLE_SECONDS', 5)
+    )
+    
+    return jsonify(changes), 200
+
 # Cart Routes
 @user_bp.route('/cart', methods=['GET'])
 @user_token_required
 def get_cart(user_id):
-    cart_items = execute_query("""
-        SELECT c.*, p.product_name, p.price, p.discount_price,
-               (SELECT pi.image_url FROM product_images pi 
-                WHERE pi.product_id = p.product_id AND pi.is_primary = 1 
-                LIMIT 1) as image_url
-        FROM cart c 
-        JOIN products p ON c.product_id = p.product_id 
-        WHERE c.user_id = %s AND p.status = 'active'
-    """, (user_id,), fetch_all=True)
-    
-    # Convert image URLs to absolute URLs
-    for item in cart_items:
-        item['image_url'] = convert_image_url(item['image_url'])
+    quantities = CartService.get_items(user_id)
+    tiles = CartService.get_product_tiles(quantities.keys())
+    
+    cart_items = []
+    for product_id, quantity in quantities.items():
+        tile = tiles.get(product_id)
+        if not tile:
+            continue
+        cart_items.append({
+            # Carts are keyed by product, so the product ID doubles as the line ID
+            'cart_id': product_id,
+            'user_id': user_id,
+            'product_id': product_id,
+            'quantity': quantity,
+            'product_name': tile['product_name'],
+            'price': tile['price'],
+            'discount_price': tile['discount_price'],
+            'image_url': tile['image_url']
+        })
     
     subtotal = sum([
         (float(item['discount_price']) if item['discount_price'] else float(item['price'])) * item['quantity']
@@ -458,6 +633,7 @@ def get_cart(user_id):
 
 @user_bp.route('/cart/add', methods=['POST'])
 @user_token_required
+@idempotent
 def add_to_cart(user_id):
     data = request.get_json()
     product_id = data.get('product_id')
@@ -466,30 +642,10 @@ def add_to_cart(user_id):
     if not product_id or quantity <= 0:
         return APIResponse.error('Invalid product or quantity', 400)
     
-    product = execute_query("""
-        SELECT product_id FROM products 
-        WHERE product_id = %s AND status = 'active'
-    """, (product_id,), fetch_one=True)
-    
-    if not product:
+    if not CartService.get_product_tiles([product_id]):
         return APIResponse.error('Product not found', 404)
     
-    existing = execute_query("""
-        SELECT cart_id, quantity FROM cart 
-        WHERE user_id = %s AND product_id = %s
-    """, (user_id, product_id), fetch_one=True)
-    
-    if existing:
-        new_quantity = existing['quantity'] + quantity
-        execute_query("""
-            UPDATE cart SET quantity = %s, updated_at = %s 
-            WHERE cart_id = %s
-        """, (new_quantity, datetime.now(), existing['cart_id']))
-    else:
-        execute_query("""
-            INSERT INTO cart (user_id, product_id, quantity, created_at)
-            VALUES (%s, %s, %s, %s)
-        """, (user_id, product_id, quantity, datetime.now()))
+    CartService.add(user_id, product_id, quantity)
     
     return APIResponse.success(None, 'Item added to cart')
 
@@ -503,26 +659,59 @@ def update_cart(user_id):
     if not product_id or quantity < 0:
         return APIResponse.error('Invalid product or quantity', 400)
     
-    if quantity == 0:
-        execute_query("""
-            DELETE FROM cart WHERE user_id = %s AND product_id = %s
-        """, (user_id, product_id))
-    else:
-        execute_query("""
-            UPDATE cart SET quantity = %s, updated_at = %s 
-            WHERE user_id = %s AND product_id = %s
-        """, (quantity, datetime.now(), user_id, product_id))
+    if quantity > 0 and not CartService.get_product_tiles([product_id]):
+        return APIResponse.error('Product not found', 404)
+    
+    CartService.set_quantity(user_id, product_id, quantity)
     
     return APIResponse.success(None, 'Cart updated')
 
 @user_bp.route('/cart/remove/<int:product_id>', methods=['DELETE'])
 @user_token_required
 def remove_from_cart(user_id, product_id):
-    execute_query("""
-        DELETE FROM cart WHERE user_id = %s AND product_id = %s
-    """, (user_id, product_id))
+    CartService.remove(user_id, product_id)
     
     return APIResponse.success(None, 'Item removed from cart')
+
+@user_bp.route('/cart/merge', methods=['POST'])
+@user_token_required
+def merge_guest_cart(user_id):
+    """Add the items a visitor put in their cart before logging in"""
+    data = request.get_json() or {}
+    items = data.get('items', [])
+    
+    if not isinstance(items, list):
+        return APIResponse.error('Items must be a list', 400)
+    
+    merged = CartService.merge(user_id, items)
+    return APIResponse.success({'merged_items': merged}, 'Cart merged')
+
+@user_bp.route('/cart/hold', methods=['POST'])
+@user_token_required
+def hold_cart(user_id):
+    """Set aside stock for everything in the cart while the user checks out"""
+    cart_items = [
+        {'product_id': product_id, 'quantity': quantity}
+        for product_id, quantity in CartService.get_items(user_id).items()
+    ]
+    
+    if not cart_items:
+        return APIResponse.error('Cart is empty', 400)
+    
+    ttl_seconds = current_app.config.get('CART_HOLD_TTL_SECONDS', 900)
+    result = InventoryService.hold(user_id, cart_items, ttl_seconds)
+    
+    return jsonify({
+        'success': all(line['success'] for line in result['lines']),
+        'expires_at': result['expires_at'],
+        'items': result['lines']
+    }), 200
+
+@user_bp.route('/cart/hold', methods=['DELETE'])
+@user_token_required
+def release_cart_hold(user_id):
+    released = InventoryService.release_holds(user_id)
+    return APIResponse.success({'released': released}, 'Cart hold released')
 # Address Routes
 @user_bp.route('/addresses', methods=['GET'])
 @user_token_required
@@ -684,19 +873,16 @@ def add_to_wishlist(user_id):
     if not product_id:
         return APIResponse.error('Product ID required', 400)
     
-    # Check if already in wishlist
-    existing = execute_query("""
-        SELECT wishlist_id FROM wishlist 
-        WHERE user_id = %s AND product_id = %s
-    """, (user_id, product_id), fetch_one=True)
-    
-    if existing:
-        return APIResponse.error('Product already in wishlist', 400)
-    
-    execute_query("""
-        INSERT INTO wishlist (user_id, product_id, created_at)
-        VALUES (%s, %s, %s)
-    """, (user_id, product_id, datetime.now()))
+    # One statement on the unique (user_id, product_id) key; a duplicate is a
+    # no-op update
+    with transaction() as tx:
+        tx.execute("""
+            INSERT INTO wishlist (user_id, product_id, created_at)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE wishlist_id = wishlist_id
+        """, (user_id, product_id, datetime.now()))
+        if not UserModel.inserted(tx):
+            return APIResponse.error('Product already in wishlist', 400)
     
     return APIResponse.success(None, 'Added to wishlist')
 
@@ -723,15 +909,32 @@ def get_orders(user_id):
     """, (user_id,), fetch_all=True)
     
     return jsonify({'orders': orders}), 200
+
+@user_bp.route('/orders/history', methods=['GET'])
+@user_token_required
+def get_order_history(user_id):
+    """Orders with their items and thumbnails, newest first, paged by cursor"""
+    limit = request.args.get('limit', current_app.config.get('ORDER_HISTORY_PAGE_SIZE', 10), type=int)
+    limit = max(min(limit, current_app.config.get('ORDER_HISTORY_MAX_PAGE_SIZE', 50)), 1)
+    
+    try:
+        page = OrderHistoryService.get_page(user_id, request.args.get('cursor'), limit)
+    except InvalidCursor:
+        return APIResponse.error('Invalid cursor', 400)
+    
+    return jsonify(page), 200
+
 @user_bp.route('/orders', methods=['POST'])
+@weighted_limit('create_order')
 @user_token_required
+@idempotent
 def create_order(user_id):
     """Create a new order"""
     try:
         data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['items', 'shipping_address', 'payment_method', 'subtotal', 'total_amount']
+        # Validate required fields; amounts sent by the client are not trusted
+        required_fields = ['items', 'shipping_address', 'payment_method']
         for field in required_fields:
             if field not in data:
                 return APIResponse.error(f'Missing required field: {field}', 400)
@@ -739,10 +942,6 @@ def create_order(user_id):
         items = data['items']
         shipping_address = data['shipping_address']
         payment_method = data['payment_method']
-        subtotal = float(data['subtotal'])
-        shipping_amount = float(data.get('shipping_amount', 0))
-        tax_amount = float(data.get('tax_amount', 0))
-        total_amount = float(data['total_amount'])
         
         # Validate items
         if not items or len(items) == 0:
@@ -756,102 +955,106 @@ def create_order(user_id):
         order_id = str(uuid.uuid4())
         order_number = f"ORD{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
         
-        # Create the order
-        execute_query("""
-            INSERT INTO orders (
-                order_id, user_id, order_number, status, subtotal, 
-                tax_amount, shipping_amount, total_amount, payment_method, 
-                payment_status, shipping_address, created_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            order_id, user_id, order_number, 'pending',
-            subtotal, tax_amount, shipping_amount, total_amount, 
-            payment_method, 'pending', json.dumps(shipping_address), 
-            datetime.now()
-        ))
-        updated_products = []
-        # Create order items - simplified version to avoid encoding issues
-        for item in items:
-            product_id = item['product_id']
-            quantity = int(item['quantity'])
-            unit_price = float(item['price'])
-            total_price = unit_price * quantity
-            product_name = item.get('product_name', f'Product {product_id}')
-            
-            execute_query("""
-                INSERT INTO order_items (
-                    order_id, product_id, product_name, quantity, 
-                    unit_price, total_price, created_at
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                order_id, product_id, product_name, quantity, 
-                unit_price, total_price, datetime.now()
-            ))
-            
-            
-            execute_query("""
-            UPDATE inventory SET quantity = quantity - %s 
-            WHERE product_id = %s AND quantity >= %s
-            """, (quantity, product_id, quantity))
-        
-            updated_products.append(product_id)
-            
-        for product_id in updated_products:
-            new_stock = execute_query("""
-                SELECT quantity FROM inventory WHERE product_id = %s
-            """, (product_id,), fetch_one=True)
-            
-            new_quantity = new_stock['quantity'] if new_stock else 0
-            invalidate_product_cache(product_id, new_quantity)
-            
-            # Check for low stock and send alerts if needed
-            try:
-                from shared.inventory_alerts import send_low_stock_alert_for_product
-                send_low_stock_alert_for_product(product_id, new_quantity)
-            except Exception as e:
-                current_app.logger.error(f"Low stock alert error for product {product_id}: {str(e)}")
-
+        try:
+            order_lines = [
+                {'product_id': int(item['product_id']), 'quantity': int(item['quantity'])}
+                for item in items
+            ]
+        except (KeyError, TypeError, ValueError):
+            return APIResponse.error('Invalid product or quantity', 400)
         
+        if any(line['quantity'] <= 0 for line in order_lines):
+            return APIResponse.error('Invalid product or quantity', 400)
         
-        # Clear the user's cart
-        execute_query("""
-            DELETE FROM cart WHERE user_id = %s
-        """, (user_id,))
+        # Price every line from the catalog in one query
+        quote = PricingService.quote(order_lines)
+        price_changed = PricingService.differs(quote, data)
         
-        # Send order confirmation email
+        # Stock, order rows and cart clean-up commit together or not at all
+        reservation = None
         try:
-            from shared.email_service import email_service
-            
-            # Get user details for email
-            user = execute_query("""
-                SELECT email, first_name, last_name FROM users WHERE user_id = %s
-            """, (user_id,), fetch_one=True)
-            
-            if user and current_app.config.get('SEND_ORDER_EMAILS', True):
-                # Send order confirmation email
-                email_sent = email_service.send_order_confirmation(
-                    order_id=order_id,
-                    user_email=user['email'],
-                    user_name=f"{user['first_name']} {user['last_name']}"
-                )
+            with transaction() as tx:
+                reservation = InventoryService.reserve_order_lines(tx, user_id, order_lines)
+                if not reservation['success']:
+                    failed = [line for line in reservation['lines'] if not line['success']]
+                    return APIResponse.error('Some items are out of stock', 409, failed)
                 
-                if email_sent:
-                    current_app.logger.info(f"Order confirmation email sent for order {order_number}")
-                else:
-                    current_app.logger.warning(f"Failed to send confirmation email for order {order_number}")
-            
-        except Exception as e:
-            # Don't let email failure break the order process
-            current_app.logger.error(f"Email notification error for order {order_number}: {str(e)}")
+                if payment_method == 'wallet' or data.get('use_wallet'):
+                    quote = PricingService.apply_wallet(
+                        tx, user_id, quote,
+                        amount=data.get('wallet_amount'),
+                        require_full=payment_method == 'wallet'
+                    )
+                
+                tx.execute("""
+                    INSERT INTO orders (
+                        order_id, user_id, order_number, status, subtotal, 
+                        tax_amount, shipping_amount, discount_amount, total_amount, 
+                        payment_method, payment_status, shipping_address, created_at
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    order_id, user_id, order_number, 'pending',
+                    quote['subtotal'], quote['tax_amount'], quote['shipping_amount'],
+                    quote['discount_amount'], quote['total_amount'],
+                    payment_method, 'pending',
+                    json.dumps(shipping_address), datetime.now()
+                ))
+                
+                PricingService.record_wallet_debit(tx, str(uuid.uuid4()), user_id, quote, order_number)
+                
+                created_at = datetime.now()
+                tx.execute_many("""
+                    INSERT INTO order_items (
+                        order_id, product_id, product_name, quantity, 
+                        unit_price, total_price, created_at
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, [
+                    (
+                        order_id, item['product_id'], item['product_name'], item['quantity'],
+                        item['unit_price'], item['total_price'], created_at
+                    )
+                    for item in quote['items']
+                ])
+                
+                # Clear the user's cart
+                tx.execute("""
+                    DELETE FROM cart WHERE user_id = %s
+                """, (user_id,))
+                
+                # Cache, socket and email side effects are relayed from the outbox
+                Outbox.add(tx, 'order_placed', {
+                    'order_id': order_id,
+                    'order_number': order_number,
+                    'user_id': user_id,
+                    'stock': {str(product_id): quantity for product_id, quantity in reservation['stock'].items()}
+                })
+        except Exception:
+            # Hot-product stock lives in Redis, outside the rolled back transaction
+            InventoryService.release_hot_lines(reservation)
+            raise
+        
+        CartService.clear(user_id)
+        if quote['discount_amount']:
+            SessionStore.invalidate(user_id)
+        OrderHistoryService.invalidate(user_id)
+        Outbox.notify()
         
         return APIResponse.success({
             'order_id': order_id,
             'order_number': order_number,
             'status': 'pending',
-            'total_amount': total_amount,
-            'confirmation_email_sent': True
+            'subtotal': quote['subtotal'],
+            'shipping_amount': quote['shipping_amount'],
+            'discount_amount': quote['discount_amount'],
+            'total_amount': quote['total_amount'],
+            'price_changed': price_changed,
+            # Kept for existing clients; the email is sent by a background job
+            'confirmation_email_sent': True,
+            'confirmation_email_queued': True
         }, 'Order created successfully')
         
+    except PricingError as e:
+        return APIResponse.error(e.message, e.status_code, e.lines)
     except Exception as e:
         # Avoid any Unicode characters in error logging
         current_app.logger.error("Order creation failed due to encoding error")
@@ -881,9 +1084,7 @@ def validate_referral():
 @user_bp.route('/referrals', methods=['GET'])
 @user_token_required
 def get_user_referrals(user_id):
-    user = execute_query("""
-        SELECT referral_code FROM users WHERE user_id = %s
-    """, (user_id,), fetch_one=True)
+    user = SessionStore.get(user_id) or {'referral_code': None}
     
     referrals = execute_query("""
         SELECT u.first_name, u.last_name, u.created_at
@@ -902,9 +1103,8 @@ def get_user_referrals(user_id):
 @user_bp.route('/wallet', methods=['GET'])
 @user_token_required
 def get_wallet(user_id):
-    wallet = execute_query("""
-        SELECT * FROM wallet WHERE user_id = %s
-    """, (user_id,), fetch_one=True)
+    session = SessionStore.get(user_id)
+    wallet = {'user_id': user_id, 'balance': session['wallet_balance']} if session else None
     
     transactions = execute_query("""
         SELECT * FROM wallet_transactions 
@@ -967,8 +1167,6 @@ def get_order_details(user_id, order_id):
         **order,
         'items': order_items,
         'total_items': len(order_items),
-        'created_at': order['created_at'].isoformat() if order['created_at'] else None,
-        'updated_at': order['updated_at'].isoformat() if order['updated_at'] else None,
     }
     
     return APIResponse.success({'order': order_details}, 'Order details retrieved successfully')
@@ -976,6 +1174,7 @@ def get_order_details(user_id, order_id):
 
 @user_bp.route('/products/<int:product_id>/reviews', methods=['POST'])
 @user_token_required
+@idempotent
 def add_review(user_id, product_id):
     try:
         data = request.get_json()
@@ -983,38 +1182,34 @@ def add_review(user_id, product_id):
         title = data.get('title', '')
         comment = data.get('comment', '')
         
-        if not rating or not (1 <= rating <= 5):
+        if not isinstance(rating, int) or not (1 <= rating <= 5):
             return APIResponse.error('Rating must be between 1 and 5', 400)
         
         if not comment or len(comment.strip()) < 10:
             return APIResponse.error('Comment must be at least 10 characters', 400)
         
-        # Insert the review
-        execute_query("""
-            INSERT INTO reviews (product_id, user_id, rating, title, comment, status, created_at) 
-            VALUES (%s, %s, %s, %s, %s, 'approved', NOW())
-        """, (product_id, user_id, rating, title.strip(), comment.strip()))
+        # Insert the review and fold it into the rating summary in one transaction
+        with transaction() as tx:
+            review_id = tx.execute("""
+                INSERT INTO reviews (product_id, user_id, rating, title, comment, status, created_at) 
+                VALUES (%s, %s, %s, %s, %s, 'approved', NOW())
+            """, (product_id, user_id, rating, title.strip(), comment.strip()), get_insert_id=True)
+            
+            ReviewModel.apply_rating_change(tx, product_id, rating, 1)
+            
+            # Cache invalidation and the review broadcast are relayed from the outbox
+            Outbox.add(tx, 'review_added', {'product_id': product_id, 'review_id': review_id})
+        
+        Outbox.notify()
         
-        # Get the fresh review data for real-time broadcast
         fresh_review = execute_query("""
             SELECT r.review_id, r.rating, r.title, r.comment, 
                    DATE_FORMAT(r.created_at, '%M %d, %Y') as created_at,
                    CONCAT(u.first_name, ' ', LEFT(u.last_name, 1), '.') as user_name
             FROM reviews r
             JOIN users u ON r.user_id = u.user_id
-            WHERE r.product_id = %s AND r.user_id = %s
-            ORDER BY r.created_at DESC LIMIT 1
-        """, (product_id, user_id), fetch_one=True)
-        
-        # INSTANT CACHE INVALIDATION
-        invalidate_product_cache(product_id)
-        
-        # REAL-TIME REVIEW BROADCAST
-        if hasattr(current_app, 'websocket_manager') and fresh_review:
-            current_app.websocket_manager.broadcast_review_added(
-                product_id, 
-                dict(fresh_review)
-            )
+            WHERE r.review_id = %s
+        """, (review_id,), fetch_one=True)
         
         return APIResponse.success({
             'message': 'Review added successfully',
@@ -1024,55 +1219,31 @@ def add_review(user_id, product_id):
         })
         
     except Exception as e:
-        print(f"Add review error: {str(e)}")
+        logger.error(f"Add review error: {str(e)}")
         return APIResponse.error('Failed to add review', 500)
 
 
 @user_bp.route('/products/<int:product_id>/reviews', methods=['GET'])
 def get_product_reviews(product_id):
-    """Get all approved reviews for a product"""
+    """Get a page of approved reviews for a product"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 50)
-        offset = (page - 1) * per_page
-        
-        # Get reviews with user info
-        reviews = execute_query("""
-            SELECT r.review_id, r.rating, r.title, r.comment, r.created_at,
-                   u.first_name, u.last_name,
-                   CONCAT(u.first_name, ' ', u.last_name) as user_name
-            FROM reviews r 
-            JOIN users u ON r.user_id = u.user_id 
-            WHERE r.product_id = %s AND r.status = 'approved'
-            ORDER BY r.created_at DESC 
-            LIMIT %s OFFSET %s
-        """, (product_id, per_page, offset), fetch_all=True)
-        
-        # Get total count
-        count_result = execute_query("""
-            SELECT COUNT(*) as total FROM reviews 
-            WHERE product_id = %s AND status = 'approved'
-        """, (product_id,), fetch_one=True)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = request.args.get('per_page', current_app.config.get('REVIEWS_PAGE_SIZE', 10), type=int)
+        per_page = max(min(per_page, current_app.config.get('REVIEWS_MAX_PAGE_SIZE', 50)), 1)
         
-        total_reviews = count_result['total'] if count_result else 0
+        reviews = ReviewModel.get_approved_page(product_id, page, per_page)
         
-        # Format reviews
-        for review in reviews:
-            if review['created_at']:
-                review['created_at'] = review['created_at'].strftime('%B %d, %Y')
+        # Total comes from the aggregate row instead of a COUNT(*) over reviews
+        rating = ReviewModel.get_rating_summary(product_id)
         
         return APIResponse.success({
             'reviews': reviews,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total_reviews,
-                'pages': (total_reviews + per_page - 1) // per_page
-            }
+            'rating': rating,
+            'pagination': ReviewModel.build_pagination(page, per_page, rating['total_reviews'])
         })
         
     except Exception as e:
-        print(f"Get reviews error: {str(e)}")
+        logger.error(f"Get reviews error: {str(e)}")
         return APIResponse.error('Failed to get reviews', 500)
 
 @user_bp.route('/reviews/<int:review_id>/helpful', methods=['POST'])
@@ -1097,5 +1268,5 @@ def mark_review_helpful(user_id, review_id):
         return APIResponse.success({'message': 'Review marked as helpful'})
         
     except Exception as e:
-        print(f"Mark helpful error: {str(e)}")
+        logger.error(f"Mark helpful error: {str(e)}")
         return APIResponse.error('Failed to mark review as helpful', 500)
\ No newline at end of file
@@ -3,6 +3,9 @@ from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request
 from datetime import datetime
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 class WebSocketManager:
     def __init__(self, app):
@@ -21,7 +24,7 @@ class WebSocketManager:
             self.connected_clients[client_id] = {
                 'connected_at': datetime.now().isoformat()
             }
-            print(f"✅ WebSocket Client connected: {client_id}")
+            logger.debug("WebSocket client connected", extra={'client_id': client_id, 'sampled': True})
             emit('connection_established', {
                 'message': 'Real-time updates enabled',
                 'client_id': client_id
@@ -32,7 +35,7 @@ class WebSocketManager:
             client_id = request.sid
             if client_id in self.connected_clients:
                 del self.connected_clients[client_id]
-            print(f"❌ WebSocket Client disconnected: {client_id}")
+            logger.debug("WebSocket client disconnected", extra={'client_id': client_id, 'sampled': True})
         
         @self.socketio.on('join_product')
         def handle_join_product(data):
@@ -40,7 +43,7 @@ class WebSocketManager:
             if product_id:
                 room = f"product_{product_id}"
                 join_room(room)
-                print(f"🔍 Client {request.sid} joined product room: {room}")
+                logger.debug("WebSocket client joined room", extra={'client_id': request.sid, 'room': room, 'sampled': True})
                 emit('joined_room', {
                     'product_id': product_id,
                     'message': f'Watching product {product_id} for updates'
@@ -58,7 +61,7 @@ class WebSocketManager:
             'type': 'stock_update'
         }
         
-        print(f"📦 Broadcasting stock update for product {product_id}: {update_data['stock']} units")
+        logger.debug("Broadcasting stock update", extra={'product_id': product_id, 'stock': update_data['stock'], 'sampled': True})
         
         # Send to all clients watching this product
         self.socketio.emit('stock_updated', update_data, room=room)
@@ -77,7 +80,7 @@ class WebSocketManager:
             'type': 'new_review'
         }
         
-        print(f"⭐ Broadcasting new review for product {product_id}")
+        logger.debug("Broadcasting new review", extra={'product_id': product_id})
         
         self.socketio.emit('review_added', update_data, room=room)
     